@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+'''Compare the cold import time of a bot deployed with and without .pyc files.
+
+A synthetic bot of many modules is packaged with make_dist_package, once as
+plain sources and once with bytecode compiled by this interpreter. Each run
+extracts the package into a fresh directory, like a restarted container,
+and times "import bot" in a new interpreter. PYTHONDONTWRITEBYTECODE keeps
+runs of the plain package from leaving .pyc files behind for the next run.
+"python -c pass" is the interpreter startup baseline.
+
+Usage: python -m benchmarks.bench_bytecode [-m MODULES] [-f FUNCTIONS] [-r RUNS]
+'''
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from bothub_cli.utils import make_dist_package
+from bothub_cli.utils import extract_dist_package
+
+
+FUNCTION_TEMPLATE = '''
+def handle_{index}(event, context):
+    text = event.get('content', '')
+    words = [word.strip('.,!?').lower() for word in text.split() if word]
+    if not words:
+        return {{'reply': 'empty', 'index': {index}}}
+    counts = {{}}
+    for word in words:
+        counts[word] = counts.get(word, 0) + 1
+    return {{'reply': max(counts, key=counts.get), 'index': {index}}}
+'''
+
+
+def make_bot(target_dir, modules, functions):
+    package_dir = os.path.join(target_dir, 'handlers')
+    os.makedirs(package_dir)
+    with open(os.path.join(package_dir, '__init__.py'), 'w') as fout:
+        fout.write('')
+    for module_index in range(modules):
+        with open(os.path.join(package_dir, 'module{}.py'.format(module_index)), 'w') as fout:
+            fout.write(''.join(FUNCTION_TEMPLATE.format(index=index) for index in range(functions)))
+    with open(os.path.join(target_dir, 'bot.py'), 'w') as fout:
+        for module_index in range(modules):
+            fout.write('import handlers.module{}\n'.format(module_index))
+
+
+def time_command(args, cwd):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    started = time.time()
+    subprocess.check_call(args, cwd=cwd, env=env)
+    return time.time() - started
+
+
+def time_import(dist_file_path, work_dir, runs):
+    elapsed = []
+    for _ in range(runs):
+        run_dir = tempfile.mkdtemp(dir=work_dir)
+        extract_dist_package(dist_file_path, run_dir)
+        elapsed.append(time_command([sys.executable, '-c', 'import bot'], run_dir))
+        shutil.rmtree(run_dir)
+    return min(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-m', '--modules', type=int, default=200)
+    parser.add_argument('-f', '--functions', type=int, default=40)
+    parser.add_argument('-r', '--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_bytecode')
+    try:
+        source_dir = os.path.join(work_dir, 'bot')
+        make_bot(source_dir, args.modules, args.functions)
+        print('bot: {} modules, {} functions each, best of {} runs'.format(
+            args.modules, args.functions, args.runs))
+
+        baseline = min(time_command([sys.executable, '-c', 'pass'], work_dir) for _ in range(args.runs))
+        print('  {:<16} {:8.3f} s'.format('startup', baseline))
+        dist_file_path = os.path.join(work_dir, 'bot.tgz')
+        for label, bytecode in [('sources', None), ('bytecode', sys.executable)]:
+            make_dist_package(dist_file_path, source_dir, bytecode=bytecode)
+            elapsed = time_import(dist_file_path, work_dir, args.runs)
+            print('  {:<16} {:8.3f} s  import {:8.3f} s  package {:6.0f} KB'.format(
+                label, elapsed, elapsed - baseline, os.path.getsize(dist_file_path) / 1024.0))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+'''Compare dist package compression on a synthetic bot tree.
+
+The tree mixes source-like text, which compresses well, with random "model"
+files, which do not, like bots that carry data files. "tarfile w:gz" is the
+former single-threaded make_dist_package; the other rows go through
+make_dist_package with each package format.
+
+Usage: python -m benchmarks.bench_compression [-s SIZE_MB] [-w WORKERS]
+'''
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import time
+import shutil
+import tarfile
+import argparse
+import tempfile
+
+from bothub_cli import compress
+from bothub_cli import exceptions as exc
+from bothub_cli.utils import list_package_files
+from bothub_cli.utils import make_dist_package
+
+
+FILE_SIZE = 4 * 1024 * 1024
+
+
+def make_tree(target_dir, size):
+    words = [os.urandom(3).hex() for _ in range(512)]
+    text = ' '.join(words[index % 509] + '_' + words[index % 31] for index in range(FILE_SIZE // 14))
+    text = text.encode('ascii')[:FILE_SIZE]
+    written = 0
+    index = 0
+    while written < size:
+        if index % 3 == 2:
+            path = os.path.join(target_dir, 'models', 'model{}.bin'.format(index))
+            content = os.urandom(FILE_SIZE)
+        else:
+            path = os.path.join(target_dir, 'src', 'module{}.py'.format(index))
+            content = text
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as fout:
+            fout.write(content)
+        written += len(content)
+        index += 1
+    return written
+
+
+def tarfile_gzip(dist_file_path, source_dir, workers):
+    with tarfile.open(dist_file_path, 'w:gz') as tout:
+        for path in list_package_files(source_dir):
+            tout.add(os.path.join(source_dir, path), arcname=path)
+
+
+def package(package_format):
+    def func(dist_file_path, source_dir, workers):
+        make_dist_package(dist_file_path, source_dir, package_format=package_format, workers=workers)
+    return func
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--size-mb', type=int, default=500)
+    parser.add_argument('-w', '--workers', type=int, default=compress.get_default_workers())
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_compression')
+    try:
+        source_dir = os.path.join(work_dir, 'bot')
+        size = make_tree(source_dir, args.size_mb * 1024 * 1024)
+        print('tree: {:.0f} MB, workers: {}'.format(size / 1024.0 / 1024.0, args.workers))
+
+        cases = [('tarfile w:gz', tarfile_gzip), ('parallel gzip', package(compress.GZIP))]
+        try:
+            compress.check_format(compress.ZSTD)
+            cases.append(('zstd', package(compress.ZSTD)))
+        except exc.PackageFormatNotSupported:
+            print('zstandard is not installed; skipping zstd')
+
+        dist_file_path = os.path.join(work_dir, 'bot.pkg')
+        for label, func in cases:
+            started = time.time()
+            func(dist_file_path, source_dir, args.workers)
+            elapsed = time.time() - started
+            ratio = os.path.getsize(dist_file_path) / float(size)
+            print('  {:<16} {:8.2f} s {:8.1f} MB/s  ratio {:.3f}'.format(
+                label, elapsed, size / 1024.0 / 1024.0 / elapsed, ratio))
+            os.remove(dist_file_path)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+'''Compare response parsing of large list_projects and logs payloads.
+
+"double parse" mimics the former ApiBase behaviour of decoding a body once
+for the status check and again to read 'data'. The other rows parse once
+through ApiResponse with each JSON codec.
+
+Usage: python -m benchmarks.bench_json [-n ENTRIES] [-r ROUNDS]
+'''
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import json
+import time
+import argparse
+
+from bothub_cli import codec
+from bothub_cli.api import ApiResponse
+
+
+class RawResponse(object):
+    def __init__(self, content):
+        self.content = content
+        self.status_code = 200
+
+    def json(self):
+        return json.loads(self.content.decode('utf8'))
+
+
+def make_projects_payload(count):
+    projects = [{
+        'id': index,
+        'name': 'ci-bot-{}'.format(index),
+        'short_name': 'ci-bot-{}'.format(index),
+        'description': 'ephemeral project created by pipeline {}'.format(index),
+        'status': 'online',
+        'regdate': '2018-06-01 12:00:00',
+    } for index in range(count)]
+    return json.dumps({'data': projects}).encode('utf8')
+
+
+def make_logs_payload(count):
+    trace = 'Traceback (most recent call last):\n' + '  File "bothub/bot.py", line 42\n' * 20
+    logs = [{
+        'id': index,
+        'regdate': '2018-06-01 12:00:{:02d}'.format(index % 60),
+        'log': json.dumps({'error': 'KeyError: {}'.format(index), 'trace': trace}),
+    } for index in range(count)]
+    return json.dumps({'data': logs}).encode('utf8')
+
+
+def double_parse(content):
+    response = RawResponse(content)
+    response.json().get('cause')
+    return response.json()['data']
+
+
+def single_parse(content):
+    response = ApiResponse(RawResponse(content))
+    response.body.get('cause')
+    return response.data
+
+
+def measure(func, content, rounds):
+    best = None
+    for _ in range(rounds):
+        started = time.time()
+        func(content)
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--entries', type=int, default=20000)
+    parser.add_argument('-r', '--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    payloads = [
+        ('list_projects', make_projects_payload(args.entries)),
+        ('logs', make_logs_payload(args.entries)),
+    ]
+    backends = ['json']
+    try:
+        codec.make_codec('orjson')
+        backends.append('orjson')
+    except ImportError:
+        print('orjson is not installed; skipping it')
+
+    for name, content in payloads:
+        print('{} payload: {:.1f} MB'.format(name, len(content) / 1024.0 / 1024.0))
+        print('  {:<24} {:8.2f} ms'.format('double parse (json)', measure(double_parse, content, args.rounds) * 1000))
+        for backend in backends:
+            codec.set_codec(codec.make_codec(backend))
+            label = 'single parse ({})'.format(backend)
+            print('  {:<24} {:8.2f} ms'.format(label, measure(single_parse, content, args.rounds) * 1000))
+
+
+if __name__ == '__main__':
+    main()
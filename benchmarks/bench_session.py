@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+'''Compare Api request latency with and without connection reuse.
+
+Runs against a local stub server, so it measures connection setup overhead
+only. Over TLS against the real API the difference is larger.
+
+Usage: python -m benchmarks.bench_session [-n REQUESTS]
+'''
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import time
+import argparse
+
+from bothub_cli.api import Api
+from tests.stubserver import StubServer
+
+
+def measure(api, count):
+    latencies = []
+    for _ in range(count):
+        started = time.time()
+        api.list_projects()
+        latencies.append(time.time() - started)
+    api.close()
+    return sorted(latencies)
+
+
+def report(label, latencies):
+    mean = sum(latencies) / len(latencies)
+    median = latencies[len(latencies) // 2]
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print('{:<12} mean {:7.3f} ms  median {:7.3f} ms  p95 {:7.3f} ms'.format(
+        label, mean * 1000, median * 1000, p95 * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    with StubServer() as server:
+        server.route('GET', '/users/self/projects', lambda request: (200, {'data': []}))
+        for label, keep_alive in [('reuse', True), ('no reuse', False)]:
+            api = Api(base_url=server.base_url, auth_token='benchtoken',
+                      verify_token_expire=False, keep_alive=keep_alive)
+            connections_before = server.connections
+            latencies = measure(api, args.requests)
+            report(label, latencies)
+            print('{:<12} {} connections opened'.format('', server.connections - connections_before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import asyncio
+import logging
+
+import aiohttp
+
+from bothub_cli import exceptions as exc
+from bothub_cli.api import ApiBase
+from bothub_cli.api import ApiResponse
+from bothub_cli.api import DEFAULT_POOL_MAXSIZE
+
+
+logger = logging.getLogger('bothub.cli.aio')
+
+
+class AsyncResponse(object):
+    '''Fully read aiohttp response, shaped like a requests response for ApiResponse'''
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+
+class AsyncApi(ApiBase):
+    '''Communicate with BotHub.Studio server on asyncio.
+
+    Mirrors Api method by method and shares its error mapping and retry
+    policy. At most max_concurrency requests are in flight at once; the
+    aiohttp session is created on first use inside the running loop.'''
+
+    def __init__(self, base_url=None, auth_token=None, verify_token_expire=True,
+                 max_concurrency=DEFAULT_POOL_MAXSIZE, retry_policy=None, session=None):
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        super(AsyncApi, self).__init__(
+            base_url=base_url,
+            transport=session,
+            auth_token=auth_token,
+            verify_token_expire=verify_token_expire,
+            retry_policy=retry_policy
+        )
+
+    def _make_transport(self, **kwargs):
+        return None
+
+    def _get_session(self):
+        if self.transport is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self.transport = aiohttp.ClientSession(connector=connector)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.transport
+
+    async def close(self):
+        if self.transport is not None:
+            await self.transport.close()
+            self.transport = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @staticmethod
+    def _make_form(fields):
+        form = aiohttp.FormData()
+        for name, value in fields.items():
+            if isinstance(value, tuple):
+                filename, content = value
+                form.add_field(name, content, filename=filename)
+            else:
+                form.add_field(name, value)
+        return form
+
+    async def _send_request(self, url, method='get', headers=None, json=None, form=None, data=None,
+                            idempotent=None, retry_policy=None):
+        '''Send a request with the same retry rules as ApiBase._send_request.
+
+        form is a dict of multipart fields; a (filename, bytes) tuple makes
+        a file field. It is rebuilt on every attempt. data is a raw body.'''
+        session = self._get_session()
+        retry_policy = retry_policy or self.retry_policy
+        retryable = retry_policy.is_retryable_method(method) if idempotent is None else idempotent
+
+        retries = 0
+        while True:
+            try:
+                body = self._make_form(form) if form is not None else data
+                # a slot is held per attempt, so backing off frees it for other requests
+                async with self._semaphore:
+                    async with session.request(method.upper(), url, headers=headers,
+                                               json=json, data=body) as response:
+                        result = AsyncResponse(response.status, response.headers,
+                                               await response.read())
+            except aiohttp.ClientConnectionError as ex:
+                if not retryable or retries >= retry_policy.max_retries:
+                    self.request_retries.append((method, url, retries))
+                    raise
+                logger.debug('Connection error on %s %s: %s', method, url, ex)
+                result = None
+            else:
+                if not retryable or retries >= retry_policy.max_retries or \
+                   not retry_policy.is_retryable_status(result.status_code):
+                    self.request_retries.append((method, url, retries))
+                    return result
+                logger.debug('Got %s on %s %s', result.status_code, method, url)
+
+            backoff = retry_policy.get_backoff(retries, result)
+            retries += 1
+            logger.debug('Retry %s/%s after %.2fs', retries, retry_policy.max_retries, backoff)
+            await asyncio.sleep(backoff)
+
+    async def _request(self, *args, **kwargs):
+        response = ApiResponse(await self._send_request(*args, **kwargs))
+        self._check_response(response)
+        return response
+
+    async def authenticate(self, username, password):
+        url = self._gen_url('users', 'access-token')
+        data = {'username': username, 'password': password}
+        response = ApiResponse(await self._send_request(url, form=data, method='post'))
+
+        if response.status_code == 404:
+            raise exc.UserNotFound(username)
+
+        if response.status_code == 401:
+            raise exc.AuthenticationFailed()
+
+        self._check_response(response)
+        return response.data['access_token']
+
+    def get_webhook_url(self, channel, project_id):
+        return self._gen_url('projects', project_id, 'webhooks', channel)
+
+    async def list_projects(self):
+        url = self._gen_url('users', 'self', 'projects')
+        headers = self._get_auth_headers()
+        return (await self._request(url, headers=headers)).data
+
+    async def create_project(self, name, description):
+        try:
+            url = self._gen_url('projects')
+            data = {'name': name, 'short_name': name, 'description': description}
+            headers = self._get_auth_headers()
+            return (await self._request(url, json=data, headers=headers, method='post')).data
+        except exc.Duplicated:
+            raise exc.ProjectNameDuplicated(name)
+
+    async def get_project(self, project_id):
+        try:
+            url = self._gen_url('projects', project_id)
+            headers = self._get_auth_headers()
+            return (await self._request(url, headers=headers)).data
+        except exc.NotFound:
+            raise exc.ProjectIdNotFound(project_id)
+
+    async def delete_project(self, project_id):
+        url = self._gen_url('projects', project_id)
+        headers = self._get_auth_headers()
+        await self._request(url, headers=headers, method='delete')
+
+    async def add_project_channel(self, project_id, channel, credentials):
+        url = self._gen_url('projects', project_id, 'channels', channel)
+        data = {'credentials': credentials}
+        headers = self._get_auth_headers()
+        return (await self._request(url, json=data, headers=headers, method='post')).data
+
+    async def get_project_channels(self, project_id):
+        url = self._gen_url('projects', project_id, 'channels')
+        headers = self._get_auth_headers()
+        return (await self._request(url, headers=headers)).data
+
+    async def delete_project_channels(self, project_id, channel):
+        url = self._gen_url('projects', project_id, 'channels', channel)
+        headers = self._get_auth_headers()
+        await self._request(url, headers=headers, method='delete')
+
+    async def upload_code(self, project_id, language, code=None, dependency=None, package_format=None,
+                          dependency_layer=None):
+        url = self._gen_url('projects', project_id, 'bot')
+        form = dict(self._upload_fields(language, dependency, package_format, dependency_layer))
+        if code:
+            content = code.read() if hasattr(code, 'read') else code
+            form['code'] = (getattr(code, 'name', 'bot.tgz'), content)
+        headers = self._get_auth_headers()
+        response = await self._request(url, form=form, headers=headers, method='post', idempotent=True)
+        return response.data
+
+    async def get_missing_blobs(self, project_id, digests):
+        url = self._gen_url('projects', project_id, 'bot', 'blobs', 'missing')
+        headers = self._get_auth_headers()
+        response = await self._request(url, json={'digests': digests}, headers=headers,
+                                       method='post', idempotent=True)
+        return response.data
+
+    async def upload_blob(self, project_id, digest, content):
+        url = self._gen_url('projects', project_id, 'bot', 'blobs', digest)
+        headers = self._get_auth_headers()
+        headers['Content-Type'] = 'application/octet-stream'
+        await self._request(url, data=content, headers=headers, method='put', idempotent=True)
+
+    async def commit_manifest(self, project_id, manifest):
+        url = self._gen_url('projects', project_id, 'bot', 'manifest')
+        headers = self._get_auth_headers()
+        data = {
+            'language': manifest.language,
+            'dependency': manifest.dependency,
+            'files': manifest.files,
+        }
+        if manifest.dependency_layer:
+            data['dependency_layer'] = manifest.dependency_layer
+        response = await self._request(url, json=data, headers=headers, method='post', idempotent=True)
+        return response.data
+
+    async def get_code(self, project_id):
+        url = self._gen_url('projects', project_id, 'bot')
+        headers = self._get_auth_headers()
+        return (await self._request(url, headers=headers)).data
+
+    async def set_project_property(self, project_id, key, value):
+        url = self._gen_url('projects', project_id, 'properties')
+        headers = self._get_auth_headers()
+        data = {key: value}
+        return (await self._request(url, json={'data': data}, headers=headers, method='post')).data
+
+    async def get_project_property(self, project_id):
+        url = self._gen_url('projects', project_id, 'properties')
+        headers = self._get_auth_headers()
+        return (await self._request(url, headers=headers)).data
+
+    async def delete_project_property(self, project_id, key):
+        url = self._gen_url('projects', project_id, 'properties', key)
+        headers = self._get_auth_headers()
+        await self._request(url, headers=headers, method='delete')
+
+    async def add_project_nlu(self, project_id, nlu, credentials):
+        url = self._gen_url('projects', project_id, 'nlus')
+        data = {'credentials': credentials, 'nlu': nlu}
+        headers = self._get_auth_headers()
+        return (await self._request(url, json=data, headers=headers, method='post')).data
+
+    async def get_project_nlus(self, project_id):
+        url = self._gen_url('projects', project_id, 'nlus')
+        headers = self._get_auth_headers()
+        return (await self._request(url, headers=headers)).data
+
+    async def get_project_nlu(self, project_id, nlu):
+        url = self._gen_url('projects', project_id, 'nlus', nlu)
+        headers = self._get_auth_headers()
+        return (await self._request(url, headers=headers)).data
+
+    async def delete_project_nlu(self, project_id, nlu):
+        url = self._gen_url('projects', project_id, 'nlus', nlu)
+        headers = self._get_auth_headers()
+        await self._request(url, headers=headers, method='delete')
+
+    async def get_project_execution_logs(self, project_id):
+        url = self._gen_url('projects', project_id, 'logs')
+        headers = self._get_auth_headers()
+        return (await self._request(url, headers=headers)).data
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import zlib
+import posixpath
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from bothub_cli.compress import get_default_workers
+from bothub_cli.manifest import BLOCK_SIZE
+from bothub_cli.manifest import hash_file
+from bothub_cli.utils import list_package_files
+
+
+# files which deflate to more than this share of their size are not worth
+# compressing; smaller files than MIN_INCOMPRESSIBLE_SIZE never shrink much
+INCOMPRESSIBLE_RATIO = 0.95
+MIN_INCOMPRESSIBLE_SIZE = 1024
+
+
+def measure_file(path, level=6):
+    '''Return the size and the deflated size of a file'''
+    compressor = zlib.compressobj(level)
+    size = compressed_size = 0
+    with open(path, 'rb') as fin:
+        for block in iter(lambda: fin.read(BLOCK_SIZE), b''):
+            size += len(block)
+            compressed_size += len(compressor.compress(block))
+    compressed_size += len(compressor.flush())
+    return size, compressed_size
+
+
+def analyze_package(source_dir='.', ignores=None, files=None, level=6, workers=None):
+    '''Measure the files a dist package of source_dir would carry.
+
+    Files are selected like make_dist_package does, deflated one by one on
+    a thread pool and hashed. Returns a dict of the total size and
+    compressed size, the files and directories with their sizes, largest
+    compressed first, and the groups of files with the same content.
+    compressed_size of a file is what it adds to a gzip package, close to
+    but not exactly its share of the real package.'''
+    if files is None:
+        files = list_package_files(source_dir, ignores)
+
+    def measure(path):
+        file_path = os.path.join(source_dir, path)
+        size, compressed_size = measure_file(file_path, level)
+        return OrderedDict([
+            ('path', path),
+            ('size', size),
+            ('compressed_size', compressed_size),
+            ('incompressible', size >= MIN_INCOMPRESSIBLE_SIZE and compressed_size >= size * INCOMPRESSIBLE_RATIO),
+            ('digest', hash_file(file_path)),
+        ])
+
+    with ThreadPoolExecutor(max_workers=workers or get_default_workers()) as executor:
+        file_stats = list(executor.map(measure, files))
+
+    dir_stats = OrderedDict()
+    by_digest = OrderedDict()
+    for file_stat in file_stats:
+        dir_path = posixpath.dirname(file_stat['path'])
+        while dir_path:
+            dir_stat = dir_stats.setdefault(dir_path, OrderedDict([
+                ('path', dir_path), ('files', 0), ('size', 0), ('compressed_size', 0)]))
+            dir_stat['files'] += 1
+            dir_stat['size'] += file_stat['size']
+            dir_stat['compressed_size'] += file_stat['compressed_size']
+            dir_path = posixpath.dirname(dir_path)
+        by_digest.setdefault(file_stat['digest'], []).append(file_stat)
+
+    duplicates = [
+        OrderedDict([
+            ('digest', digest),
+            ('size', same[0]['size']),
+            ('paths', [file_stat['path'] for file_stat in same]),
+            ('wasted', same[0]['compressed_size'] * (len(same) - 1)),
+        ])
+        for digest, same in by_digest.items() if len(same) > 1
+    ]
+
+    def largest_first(stat):
+        return (-stat['compressed_size'], stat['path'])
+
+    return OrderedDict([
+        ('size', sum(file_stat['size'] for file_stat in file_stats)),
+        ('compressed_size', sum(file_stat['compressed_size'] for file_stat in file_stats)),
+        ('incompressible_size', sum(file_stat['size'] for file_stat in file_stats if file_stat['incompressible'])),
+        ('files', sorted(file_stats, key=largest_first)),
+        ('dirs', sorted(dir_stats.values(), key=largest_first)),
+        ('duplicates', sorted(duplicates, key=lambda duplicate: (-duplicate['wasted'], duplicate['digest']))),
+    ])
+
+
+def estimate_upload_time(size, bandwidth):
+    '''Return the seconds to upload size bytes at bandwidth Mbit/s'''
+    return size * 8 / (bandwidth * 1000 * 1000)
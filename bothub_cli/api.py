@@ -4,32 +4,298 @@ from __future__ import (absolute_import, division, print_function, unicode_liter
 
 import os
 import time
+import uuid
+import random
+import hashlib
 import logging
+import threading
+from collections import deque
 from datetime import datetime
+from email.utils import parsedate_tz
+from email.utils import mktime_tz
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 import jwt
+from requests.adapters import HTTPAdapter
+from bothub_cli import codec
 from bothub_cli import exceptions as exc
+from bothub_cli.httpcache import CachedResponse
+from bothub_cli.manifest import hash_file
 from bothub_cli.utils import timestamp
 
 
 logger = logging.getLogger('bothub.cli.api')
 
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_UPLOAD_JOBS = 4
+
+
+def make_session(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 pool_block=False, keep_alive=True):
+    '''Make a requests session which keeps connections alive and reuses them.
+
+    pool_connections is the number of hosts to keep pools for, and
+    pool_maxsize is the number of connections kept per host. With pool_block,
+    pool_maxsize becomes a hard per-host limit instead of a cache size.'''
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+class RetryPolicy(object):
+    '''Decide which requests are retried and how long to back off between attempts.
+
+    Requests of idempotent methods are retried on connection errors, 5xx and
+    429 responses with exponential backoff and full jitter. A Retry-After
+    header of the response takes precedence over the computed backoff.'''
+
+    def __init__(self, max_retries=3, backoff_factor=0.5, max_backoff=30,
+                 methods=('get', 'delete'), sleep=time.sleep):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.methods = frozenset(methods)
+        self.sleep = sleep
+
+    def is_retryable_method(self, method):
+        return method.lower() in self.methods
+
+    def is_retryable_status(self, status_code):
+        return status_code is not None and (status_code == 429 or status_code // 100 == 5)
+
+    def get_backoff(self, retries, response=None):
+        retry_after = self._get_retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** retries)))
+
+    def _get_retry_after(self, response):
+        headers = getattr(response, 'headers', None) or {}
+        value = headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            parsed = parsedate_tz(value)
+            if parsed is None:
+                return None
+            return max(mktime_tz(parsed) - time.time(), 0)
+
+
+DEFAULT_MAX_RETRIES = 3
+
+
+def get_default_retry_policy():
+    '''Return a RetryPolicy with max_retries from BOTHUB_API_MAX_RETRIES,
+    falling back to DEFAULT_MAX_RETRIES if it is not a number'''
+    value = os.environ.get('BOTHUB_API_MAX_RETRIES')
+    max_retries = DEFAULT_MAX_RETRIES
+    if value is not None:
+        try:
+            max_retries = max(int(value), 0)
+        except ValueError:
+            logger.warning('Ignore BOTHUB_API_MAX_RETRIES=%r, which is not a number', value)
+    return RetryPolicy(max_retries=max_retries)
+
+
+def iter_multipart(boundary, fields, file_field, filename, chunks):
+    '''Yield a multipart/form-data body of text fields and one file field
+    whose content comes from an iterator of chunks'''
+    delimiter = '--{}\r\n'.format(boundary).encode('ascii')
+    for name, value in fields:
+        yield delimiter + 'Content-Disposition: form-data; name="{}"\r\n\r\n'.format(name).encode('utf8')
+        yield value.encode('utf8') + b'\r\n'
+    yield delimiter + (
+        'Content-Disposition: form-data; name="{}"; filename="{}"\r\n'
+        'Content-Type: application/octet-stream\r\n\r\n'
+    ).format(file_field, filename).encode('utf8')
+    for chunk in chunks:
+        yield chunk
+    yield '\r\n--{}--\r\n'.format(boundary).encode('ascii')
+
+
+def iter_events(lines):
+    '''Yield the data of server-sent events from an iterator of lines, and
+    None for each comment line, which servers send as a heartbeat'''
+    data = []
+    for line in lines:
+        if not line:
+            if data:
+                yield '\n'.join(data)
+                data = []
+        elif line.startswith(':'):
+            yield None
+        elif line.startswith('data:'):
+            data.append(line[5:].lstrip(' '))
+
+
+def read_file_range(path, offset, length):
+    with open(path, 'rb') as fin:
+        fin.seek(offset)
+        return fin.read(length)
+
+
+class ApiResponse(object):
+    '''Wrap a transport response and parse its JSON body at most once'''
+    _unparsed = object()
+
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = getattr(response, 'headers', None) or {}
+        self._body = self._unparsed
+
+    @property
+    def body(self):
+        if self._body is self._unparsed:
+            self._body = self._parse()
+        return self._body
+
+    @property
+    def data(self):
+        '''The data field of the body. Raises ValueError if the body is not a
+        JSON object, e.g. an HTML page of a proxy.'''
+        body = self.body
+        if not isinstance(body, dict):
+            raise ValueError('Invalid response body of status {}'.format(self.status_code))
+        return body['data']
+
+    def json(self):
+        return self.body
+
+    def _parse(self):
+        content = getattr(self.response, 'content', None)
+        if content is None:
+            return self.response.json()
+        if not content:
+            return None
+        try:
+            return codec.loads(content)
+        except ValueError:
+            return None
+
 
 class ApiBase(object):
-    def __init__(self, base_url=None, transport=None, auth_token=None, verify_token_expire=True):
+    def __init__(self, base_url=None, transport=None, auth_token=None, verify_token_expire=True,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 pool_block=False, keep_alive=True, retry_policy=None, response_cache=None):
         env_base_url = os.environ.get('BOTHUB_API_BASE_URL',
                                       'https://api.bothub.studio/api')
         self.base_url = base_url if base_url is not None else env_base_url
-        self.transport = transport or requests
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self._pool_lock = threading.Lock()
+        self.transport = transport or self._make_transport(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            keep_alive=keep_alive
+        )
         self.auth_token = auth_token
         self.verify_token_expire = verify_token_expire
+        # (token, exp claim) of the last decoded auth token
+        self._auth_token_exp = None
+        self.retry_policy = retry_policy or get_default_retry_policy()
+        self.response_cache = response_cache
+        # (method, url, retries) of recent requests
+        self.request_retries = deque(maxlen=1000)
+
+    def _make_transport(self, **kwargs):
+        return make_session(**kwargs)
+
+    def reserve_connections(self, count):
+        '''Grow the connection pool of an owned session to keep count
+        connections per host, for callers sending count requests at once'''
+        with self._pool_lock:
+            if count <= self.pool_maxsize or not isinstance(self.transport, requests.Session):
+                return
+            self.pool_maxsize = count
+            adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=count,
+                                  pool_block=self.pool_block)
+            self.transport.mount('http://', adapter)
+            self.transport.mount('https://', adapter)
+
+    def load_auth(self, config):
+        auth_token = config.get('auth_token')
+        if auth_token != self.auth_token:
+            self.auth_token = auth_token
+            self._auth_token_exp = None
+
+    def close(self):
+        close = getattr(self.transport, 'close', None)
+        if close:
+            close()
 
     def _send_request(self, *args, **kwargs):
+        '''Send a request through the transport, retrying it as the retry policy allows.
+
+        idempotent overrides whether the method is safe to retry. Requests
+        that replace the whole bot code or put a resource under its content
+        digest, chunk index or layer key leave the same state when repeated,
+        so they pass True; bodies that cannot be replayed pass False.
+        retry_policy overrides the policy of this instance for one call.'''
         method = kwargs.pop('method', 'get')
+        idempotent = kwargs.pop('idempotent', None)
+        retry_policy = kwargs.pop('retry_policy', None) or self.retry_policy
         func = getattr(self.transport, method)
-        result = func(*args, **kwargs)
-        return result
+        retryable = retry_policy.is_retryable_method(method) if idempotent is None else idempotent
+
+        retries = 0
+        while True:
+            try:
+                result = func(*args, **kwargs)
+            except requests.exceptions.ConnectionError as ex:
+                if not retryable or retries >= retry_policy.max_retries:
+                    self.request_retries.append((method, args[0] if args else None, retries))
+                    raise
+                logger.debug('Connection error on %s %s: %s', method, args[:1], ex)
+                result = None
+            else:
+                status_code = getattr(result, 'status_code', None)
+                if not retryable or retries >= retry_policy.max_retries or \
+                   not retry_policy.is_retryable_status(status_code):
+                    self.request_retries.append((method, args[0] if args else None, retries))
+                    return result
+                logger.debug('Got %s on %s %s', status_code, method, args[:1])
+
+            backoff = retry_policy.get_backoff(retries, result)
+            retries += 1
+            logger.debug('Retry %s/%s after %.2fs', retries, retry_policy.max_retries, backoff)
+            retry_policy.sleep(backoff)
+            self._rewind_files(kwargs.get('files'))
+            if hasattr(kwargs.get('data'), 'seek'):
+                kwargs['data'].seek(0)
+
+    @staticmethod
+    def _upload_fields(language, dependency=None, package_format=None, dependency_layer=None):
+        '''Return the (name, value) form fields describing a dist package upload'''
+        fields = [('language', language)]
+        if dependency:
+            fields.append(('dependency', dependency))
+        if package_format:
+            fields.append(('format', package_format))
+        if dependency_layer:
+            fields.append(('dependency_layer', dependency_layer))
+        return fields
+
+    @staticmethod
+    def _rewind_files(files):
+        for fileobj in (files or {}).values():
+            if hasattr(fileobj, 'seek'):
+                fileobj.seek(0)
 
     def _check_auth_token_expired(self):
         logger.debug('Check auth token expiraration')
@@ -37,19 +303,27 @@ class ApiBase(object):
             logger.debug('Skip token expiraration check on debug mode')
             return
 
-        content = jwt.decode(self.auth_token, verify=False)
+        expires = self._get_auth_token_exp()
         now_timestamp = timestamp()
-        if now_timestamp > content['exp']:
-            logger.debug('Token is expired: exp[%s] < now[%s]', content['exp'], now_timestamp)
+        if now_timestamp > expires:
+            logger.debug('Token is expired: exp[%s] < now[%s]', expires, now_timestamp)
             raise exc.AuthTokenExpired()
 
+    def _get_auth_token_exp(self):
+        '''Decode the auth token once per token value and return its exp claim'''
+        if self._auth_token_exp is None or self._auth_token_exp[0] != self.auth_token:
+            content = jwt.decode(self.auth_token, verify=False)
+            self._auth_token_exp = (self.auth_token, content['exp'])
+        return self._auth_token_exp[1]
+
     def _gen_url(self, *args):
         return '{}/{}'.format(self.base_url, '/'.join([str(arg) for arg in args]))
 
     def _get_response_cause(self, response):
-        if response.json() == '':
+        body = self._wrap_response(response).body
+        if not isinstance(body, dict):
             return
-        return response.json().get('cause')
+        return body.get('cause')
 
     def _check_auth_token(self):
         if not self.auth_token:
@@ -57,7 +331,42 @@ class ApiBase(object):
 
         self._check_auth_token_expired()
 
+    @staticmethod
+    def _wrap_response(response):
+        return response if isinstance(response, ApiResponse) else ApiResponse(response)
+
+    def _request(self, *args, **kwargs):
+        '''Send a request, check its status and return the wrapped response'''
+        response = ApiResponse(self._send_request(*args, **kwargs))
+        self._check_response(response)
+        return response
+
+    def _request_cached(self, url, headers):
+        '''GET a resource, revalidating a cached copy of it if there is one'''
+        if self.response_cache is None:
+            return self._request(url, headers=headers)
+
+        entry = self.response_cache.get(url, self.auth_token)
+        _headers = dict(headers)
+        if entry and entry['etag']:
+            _headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            _headers['If-Modified-Since'] = entry['last_modified']
+
+        raw_response = self._send_request(url, headers=_headers)
+        if entry and raw_response.status_code == 304:
+            logger.debug('Not modified: %s', url)
+            return ApiResponse(CachedResponse(entry['content'], raw_response.headers))
+
+        response = ApiResponse(raw_response)
+        self._check_response(response)
+        content = getattr(raw_response, 'content', None)
+        if content:
+            self.response_cache.set(url, self.auth_token, response.headers, content)
+        return response
+
     def _check_response(self, response):
+        response = self._wrap_response(response)
         if response.status_code // 100 in [2, 3]:
             return
 
@@ -74,6 +383,9 @@ class ApiBase(object):
         if response.status_code == 409:
             raise exc.Duplicated(self._get_response_cause(response))
 
+        if response.status_code == 415:
+            raise exc.UnsupportedMediaType(self._get_response_cause(response))
+
         raise exc.CliException(self._get_response_cause(response))
 
     def _get_auth_headers(self):
@@ -85,13 +397,10 @@ class ApiBase(object):
 class Api(ApiBase):
     '''Communicate with BotHub.Studio server'''
 
-    def load_auth(self, config):
-        self.auth_token = config.get('auth_token')
-
     def authenticate(self, username, password):
         url = self._gen_url('users', 'access-token')
         data = {'username': username, 'password': password}
-        response = self._send_request(url, data, method='post')
+        response = ApiResponse(self._send_request(url, data, method='post'))
 
         if response.status_code == 404:
             raise exc.UserNotFound(username)
@@ -100,8 +409,7 @@ class Api(ApiBase):
             raise exc.AuthenticationFailed()
 
         self._check_response(response)
-        response_dict = response.json()['data']
-        return response_dict['access_token']
+        return response.data['access_token']
 
     def get_webhook_url(self, channel, project_id):
         url = self._gen_url('projects', project_id, 'webhooks', channel)
@@ -110,18 +418,14 @@ class Api(ApiBase):
     def list_projects(self):
         url = self._gen_url('users', 'self', 'projects')
         headers = self._get_auth_headers()
-        response = self._send_request(url, headers=headers)
-        self._check_response(response)
-        return response.json()['data']
+        return self._request_cached(url, headers).data
 
     def create_project(self, name, description):
         try:
             url = self._gen_url('projects')
             data = {'name': name, 'short_name': name, 'description': description}
             headers = self._get_auth_headers()
-            response = self._send_request(url, json=data, headers=headers, method='post')
-            self._check_response(response)
-            return response.json()['data']
+            return self._request(url, json=data, headers=headers, method='post').data
         except exc.Duplicated:
             raise exc.ProjectNameDuplicated(name)
 
@@ -129,113 +433,268 @@ class Api(ApiBase):
         try:
             url = self._gen_url('projects', project_id)
             headers = self._get_auth_headers()
-            response = self._send_request(url, headers=headers)
-            self._check_response(response)
-            return response.json()['data']
+            return self._request_cached(url, headers).data
         except exc.NotFound:
             raise exc.ProjectIdNotFound(project_id)
 
+    def watch_project_status(self, project_id, timeout=None):
+        '''Yield the status of a project from a server-sent events stream as
+        it changes, and None on each heartbeat, until the stream ends or
+        nothing arrives for timeout seconds. Raises NotFound if the server
+        does not stream statuses.'''
+        url = self._gen_url('projects', project_id, 'status')
+        headers = self._get_auth_headers()
+        headers['Accept'] = 'text/event-stream'
+        response = self._send_request(url, headers=headers, stream=True, timeout=timeout)
+        try:
+            self._check_response(response)
+            response.encoding = 'utf-8'
+            for event in iter_events(response.iter_lines(decode_unicode=True)):
+                if event is None:
+                    yield None
+                    continue
+                try:
+                    status = codec.loads(event)['status']
+                except (ValueError, KeyError, TypeError):
+                    logger.debug('Ignore malformed status event: %s', event)
+                    continue
+                yield status
+        except requests.exceptions.RequestException as ex:
+            logger.debug('Status stream of project %s is closed: %s', project_id, ex)
+        finally:
+            response.close()
+
     def delete_project(self, project_id):
         url = self._gen_url('projects', project_id)
         headers = self._get_auth_headers()
-        response = self._send_request(url, headers=headers, method='delete')
-        self._check_response(response)
+        self._request(url, headers=headers, method='delete')
 
     def add_project_channel(self, project_id, channel, credentials):
         url = self._gen_url('projects', project_id, 'channels', channel)
         data = {'credentials': credentials}
         headers = self._get_auth_headers()
-        response = self._send_request(url, json=data, headers=headers, method='post')
-        self._check_response(response)
-        return response.json()['data']
+        return self._request(url, json=data, headers=headers, method='post').data
 
     def get_project_channels(self, project_id):
         url = self._gen_url('projects', project_id, 'channels')
         headers = self._get_auth_headers()
-        response = self._send_request(url, headers=headers, method='get')
-        self._check_response(response)
-        return response.json()['data']
+        return self._request_cached(url, headers).data
 
     def delete_project_channels(self, project_id, channel):
         url = self._gen_url('projects', project_id, 'channels', channel)
         headers = self._get_auth_headers()
-        response = self._send_request(url, headers=headers, method='delete')
-        self._check_response(response)
-
-    def upload_code(self, project_id, language, code=None, dependency=None):
+        self._request(url, headers=headers, method='delete')
+
+    def upload_code(self, project_id, language, code=None, dependency=None, package_format=None,
+                    dependency_layer=None):
+        '''Upload a dist package. package_format names its compression when it
+        is not gzip; servers answer 415 to formats they do not support.
+        dependency_layer is the key of an uploaded dependency layer to
+        install instead of resolving dependency.'''
         url = self._gen_url('projects', project_id, 'bot')
-        data = {'language': language}
-        if dependency:
-            data['dependency'] = dependency
+        data = dict(self._upload_fields(language, dependency, package_format, dependency_layer))
         files = {'code': code} if code else None
         headers = self._get_auth_headers()
-        response = self._send_request(
-            url, data=data, files=files, headers=headers, method='post'
+        response = self._request(
+            url, data=data, files=files, headers=headers, method='post', idempotent=True
         )
-        self._check_response(response)
-        return response.json()['data']
+        return response.data
+
+    def upload_code_stream(self, project_id, language, chunks, dependency=None, filename='bot.tgz',
+                           package_format=None, dependency_layer=None):
+        '''Upload code from an iterator of chunks as a chunked multipart body.
+        The body is sent while it is produced, so it is never retried.'''
+        url = self._gen_url('projects', project_id, 'bot')
+        fields = self._upload_fields(language, dependency, package_format, dependency_layer)
+        boundary = uuid.uuid4().hex
+        headers = self._get_auth_headers()
+        headers['Content-Type'] = 'multipart/form-data; boundary={}'.format(boundary)
+        body = iter_multipart(boundary, fields, 'code', filename, chunks)
+        response = self._request(url, data=body, headers=headers, method='post', idempotent=False)
+        return response.data
+
+    def start_upload(self, project_id, language, size, digest, dependency=None, package_format=None,
+                     chunk_size=DEFAULT_CHUNK_SIZE, dependency_layer=None):
+        '''Open an upload session for a dist package of size bytes and sha256 digest.
+        Returns the session as a dict of id, digest, chunk_size and received
+        chunk indexes. Raises NotFound if the server does not support upload
+        sessions.'''
+        url = self._gen_url('projects', project_id, 'bot', 'uploads')
+        data = dict(self._upload_fields(language, dependency, package_format, dependency_layer))
+        data.update(size=size, digest=digest, chunk_size=chunk_size)
+        headers = self._get_auth_headers()
+        response = self._request(url, json=data, headers=headers, method='post', idempotent=False)
+        return response.data
+
+    def get_upload(self, project_id, upload_id):
+        url = self._gen_url('projects', project_id, 'bot', 'uploads', upload_id)
+        headers = self._get_auth_headers()
+        return self._request(url, headers=headers, method='get').data
+
+    def upload_chunk(self, project_id, upload_id, index, content):
+        url = self._gen_url('projects', project_id, 'bot', 'uploads', upload_id, 'chunks', index)
+        headers = self._get_auth_headers()
+        headers['Content-Type'] = 'application/octet-stream'
+        headers['X-Chunk-Sha256'] = hashlib.sha256(content).hexdigest()
+        self._request(url, data=content, headers=headers, method='put', idempotent=True)
+
+    def complete_upload(self, project_id, upload_id):
+        '''Deploy the package of an upload session whose chunks are all received'''
+        url = self._gen_url('projects', project_id, 'bot', 'uploads', upload_id, 'complete')
+        headers = self._get_auth_headers()
+        response = self._request(url, headers=headers, method='post', idempotent=True)
+        return response.data
+
+    def upload_code_chunked(self, project_id, language, path, dependency=None, package_format=None,
+                            chunk_size=DEFAULT_CHUNK_SIZE, jobs=DEFAULT_UPLOAD_JOBS, upload_id=None,
+                            on_start=None, dependency_layer=None):
+        '''Upload a dist package file in chunks through an upload session.
+
+        Chunks are sent jobs at a time, each with its sha256 digest, and the
+        server checks the digest of the whole package when the session is
+        completed. Given the upload_id of an interrupted session of the same
+        package, only the chunks the server has not received are sent.
+        on_start is called with a new session so that it can be resumed
+        later. Falls back to upload_code if the server does not support
+        upload sessions.'''
+        size = os.path.getsize(path)
+        digest = hash_file(path)
+        session = None
+        if upload_id:
+            try:
+                session = self.get_upload(project_id, upload_id)
+            except exc.NotFound:
+                logger.debug('Upload session %s is gone', upload_id)
+            if session and session.get('digest') != digest:
+                session = None
+
+        if session is None:
+            try:
+                session = self.start_upload(project_id, language, size, digest, dependency, package_format,
+                                            chunk_size, dependency_layer)
+            except exc.NotFound:
+                logger.debug('Upload sessions are not supported; upload the whole package')
+                with open(path, 'rb') as code:
+                    return self.upload_code(project_id, language, code, dependency, package_format,
+                                            dependency_layer)
+            if on_start:
+                on_start(session)
+
+        chunk_size = session['chunk_size']
+        received = set(session.get('received') or [])
+        count = max(1, -(-size // chunk_size))
+        missing = [index for index in range(count) if index not in received]
+        logger.debug('Upload %s of %s chunks of session %s', len(missing), count, session['id'])
+
+        def upload(index):
+            content = read_file_range(path, index * chunk_size, chunk_size)
+            self.upload_chunk(project_id, session['id'], index, content)
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for _ in executor.map(upload, missing):
+                pass
+        return self.complete_upload(project_id, session['id'])
+
+    def get_manifest(self, project_id):
+        '''Return the committed manifest of a project as a dict of files,
+        language, dependency and dependency_layer. Raises NotFound if the
+        project has none or the server does not support incremental deploys.'''
+        url = self._gen_url('projects', project_id, 'bot', 'manifest')
+        headers = self._get_auth_headers()
+        return self._request(url, headers=headers).data
+
+    def get_missing_blobs(self, project_id, digests):
+        '''Return the digests the server does not have yet.
+        Raises NotFound if the server does not support incremental deploys.'''
+        url = self._gen_url('projects', project_id, 'bot', 'blobs', 'missing')
+        headers = self._get_auth_headers()
+        response = self._request(url, json={'digests': digests}, headers=headers, method='post', idempotent=True)
+        return response.data
+
+    def upload_blob(self, project_id, digest, content):
+        url = self._gen_url('projects', project_id, 'bot', 'blobs', digest)
+        headers = self._get_auth_headers()
+        headers['Content-Type'] = 'application/octet-stream'
+        self._request(url, data=content, headers=headers, method='put', idempotent=True)
+
+    def commit_manifest(self, project_id, manifest):
+        '''Deploy a bot from a manifest whose blobs are all uploaded'''
+        url = self._gen_url('projects', project_id, 'bot', 'manifest')
+        headers = self._get_auth_headers()
+        data = {
+            'language': manifest.language,
+            'dependency': manifest.dependency,
+            'files': manifest.files,
+        }
+        if manifest.dependency_layer:
+            data['dependency_layer'] = manifest.dependency_layer
+        response = self._request(url, json=data, headers=headers, method='post', idempotent=True)
+        return response.data
+
+    def get_dependency_layer(self, key):
+        '''Return the uploaded dependency layer of a key.
+        Raises NotFound if it is not uploaded yet.'''
+        url = self._gen_url('dependency-layers', key)
+        headers = self._get_auth_headers()
+        return self._request(url, headers=headers, method='get').data
+
+    def upload_dependency_layer(self, key, path):
+        '''Upload a dependency layer file under its key. Raises NotFound if
+        the server does not support dependency layers.'''
+        url = self._gen_url('dependency-layers', key)
+        headers = self._get_auth_headers()
+        headers['Content-Type'] = 'application/x-tar'
+        headers['X-Content-Sha256'] = hash_file(path)
+        with open(path, 'rb') as layer:
+            response = self._request(url, data=layer, headers=headers, method='put', idempotent=True)
+        return response.data
 
     def get_code(self, project_id):
         url = self._gen_url('projects', project_id, 'bot')
         headers = self._get_auth_headers()
-        response = self._send_request(url, headers=headers, method='get')
-        self._check_response(response)
-        return response.json()['data']
+        return self._request(url, headers=headers, method='get').data
 
     def set_project_property(self, project_id, key, value):
         url = self._gen_url('projects', project_id, 'properties')
         headers = self._get_auth_headers()
         data = {key: value}
-        response = self._send_request(
+        response = self._request(
             url, json={'data': data}, headers=headers, method='post'
         )
-        self._check_response(response)
-        return response.json()['data']
+        return response.data
 
     def get_project_property(self, project_id):
         url = self._gen_url('projects', project_id, 'properties')
         headers = self._get_auth_headers()
-        response = self._send_request(url, headers=headers, method='get')
-        self._check_response(response)
-        return response.json()['data']
+        return self._request_cached(url, headers).data
 
     def delete_project_property(self, project_id, key):
         url = self._gen_url('projects', project_id, 'properties', key)
         headers = self._get_auth_headers()
-        response = self._send_request(url, headers=headers, method='delete')
-        self._check_response(response)
+        self._request(url, headers=headers, method='delete')
 
     def add_project_nlu(self, project_id, nlu, credentials):
         url = self._gen_url('projects', project_id, 'nlus')
         data = {'credentials': credentials, 'nlu': nlu}
         headers = self._get_auth_headers()
-        response = self._send_request(url, json=data, headers=headers, method='post')
-        self._check_response(response)
-        return response.json()['data']
+        return self._request(url, json=data, headers=headers, method='post').data
 
     def get_project_nlus(self, project_id):
         url = self._gen_url('projects', project_id, 'nlus')
         headers = self._get_auth_headers()
-        response = self._send_request(url, headers=headers)
-        self._check_response(response)
-        return response.json()['data']
+        return self._request_cached(url, headers).data
 
     def get_project_nlu(self, project_id, nlu):
         url = self._gen_url('projects', project_id, 'nlus', nlu)
         headers = self._get_auth_headers()
-        response = self._send_request(url, headers=headers)
-        self._check_response(response)
-        return response.json()['data']
+        return self._request(url, headers=headers).data
 
     def delete_project_nlu(self, project_id, nlu):
         url = self._gen_url('projects', project_id, 'nlus', nlu)
         headers = self._get_auth_headers()
-        response = self._send_request(url, headers=headers, method='delete')
-        self._check_response(response)
+        self._request(url, headers=headers, method='delete')
 
     def get_project_execution_logs(self, project_id):
         url = self._gen_url('projects', project_id, 'logs')
         headers = self._get_auth_headers()
-        response = self._send_request(url, headers=headers)
-        self._check_response(response)
-        return response.json()['data']
+        return self._request(url, headers=headers).data
@@ -5,6 +5,8 @@ from __future__ import (absolute_import, division, print_function, unicode_liter
 import os
 import requests
 
+from bothub_cli.api import ApiResponse
+
 
 class ConsoleChannelClient(object):
     def send_message(self, chat_id, message, channel=None, event=None, extra=None):
@@ -71,13 +73,13 @@ class ExternalHttpStorageClient(object):
             json={'data': data},
             headers=headers
         )
-        return response.json()['data']
+        return ApiResponse(response).data
 
     def get_project_data(self):
         url = '{}/projects/{}/properties'.format(self.base_url, self.project_id)
         headers = self.get_headers()
         response = requests.get(url, headers=headers)
-        return response.json()['data']
+        return ApiResponse(response).data
 
     def set_user_data(self, channel, user_id, data):
         headers = self.get_headers()
@@ -88,7 +90,7 @@ class ExternalHttpStorageClient(object):
             json={'data': data},
             headers=headers,
         )
-        return response.json()['data']
+        return ApiResponse(response).data
 
     def get_user_data(self, channel, user_id, key=None):
         url = '{}/projects/{}/user-properties/channels/{}/users/{}'.format(
@@ -98,7 +100,7 @@ class ExternalHttpStorageClient(object):
             url += '/{}'.format(key)
         headers = self.get_headers()
         response = requests.get(url, headers=headers)
-        return response.json()['data']
+        return ApiResponse(response).data
 
     def set_current_user_data(self, data):
         channel, user_id = self.current_user
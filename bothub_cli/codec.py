@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import json
+
+
+class JsonCodec(object):
+    '''JSON codec on the standard library'''
+    name = 'json'
+
+    def loads(self, content):
+        if isinstance(content, bytes):
+            content = content.decode('utf8')
+        return json.loads(content)
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf8')
+
+
+class OrjsonCodec(JsonCodec):
+    '''JSON codec on orjson, several times faster on large payloads'''
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self.orjson = orjson
+
+    def loads(self, content):
+        return self.orjson.loads(content)
+
+    def dumps(self, obj):
+        return self.orjson.dumps(obj)
+
+
+CODECS = {
+    'json': JsonCodec,
+    'orjson': OrjsonCodec,
+}
+
+_codec = None
+
+
+def make_codec(name=None):
+    '''Make a codec by name. Without a name, use BOTHUB_JSON_BACKEND or
+    orjson if it is installed, falling back to the standard library.'''
+    _name = name or os.environ.get('BOTHUB_JSON_BACKEND')
+    if _name:
+        return CODECS[_name]()
+    try:
+        return OrjsonCodec()
+    except ImportError:
+        return JsonCodec()
+
+
+def get_codec():
+    global _codec
+    if _codec is None:
+        _codec = make_codec()
+    return _codec
+
+
+def set_codec(codec):
+    global _codec
+    _codec = codec
+
+
+def loads(content):
+    return get_codec().loads(content)
+
+
+def dumps(obj):
+    return get_codec().dumps(obj)
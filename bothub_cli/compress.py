@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import zlib
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from bothub_cli import exceptions as exc
+
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+FORMATS = (GZIP, ZSTD)
+
+DEFAULT_BLOCK_SIZE = 128 * 1024
+DICT_SIZE = 32 * 1024
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+
+def get_default_workers():
+    return os.cpu_count() or 1
+
+
+def _deflate_block(data, dictionary, level, last):
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL,
+                                      zlib.Z_DEFAULT_STRATEGY, dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class ParallelGzipWriter(object):
+    '''A file-like gzip compressor which deflates blocks on a thread pool, like pigz.
+
+    Each block is deflated independently, primed with the last 32 KB of the
+    previous block as a dictionary, and ended on a byte boundary with a sync
+    flush, so the blocks concatenate into one deflate stream that any gunzip
+    reads. zlib releases the GIL while compressing, so blocks are compressed
+    on all cores. At most two blocks per worker are in flight at once.'''
+
+    def __init__(self, fileobj, level=6, block_size=DEFAULT_BLOCK_SIZE, workers=None):
+        self.fileobj = fileobj
+        self.level = level
+        self.block_size = block_size
+        self.workers = workers or get_default_workers()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = deque()
+        self.buffer = bytearray()
+        self.dictionary = None
+        self.crc = 0
+        self.size = 0
+        self.closed = False
+        self.fileobj.write(GZIP_HEADER)
+
+    def _submit(self, data, last=False):
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        self.pending.append(self.executor.submit(_deflate_block, data, self.dictionary, self.level, last))
+        self.dictionary = data[-DICT_SIZE:] if data else self.dictionary
+        while len(self.pending) > self.workers * 2:
+            self.fileobj.write(self.pending.popleft().result())
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            self._submit(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._submit(bytes(self.buffer), last=True)
+            del self.buffer[:]
+            while self.pending:
+                self.fileobj.write(self.pending.popleft().result())
+            self.fileobj.write(struct.pack('<II', self.crc & 0xffffffff, self.size & 0xffffffff))
+        finally:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def check_format(package_format):
+    if package_format not in FORMATS:
+        raise exc.PackageFormatNotSupported(package_format)
+    if package_format == ZSTD:
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            raise exc.PackageFormatNotSupported('{} (install zstandard)'.format(package_format))
+
+
+def open_compressor(fileobj, package_format=GZIP, workers=None):
+    '''Return a file-like compressor writing to fileobj in the package format.
+    Closing it finishes the compressed stream but leaves fileobj open.'''
+    check_format(package_format)
+    workers = workers or get_default_workers()
+    if package_format == ZSTD:
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=3, threads=workers if workers > 1 else 0)
+        return compressor.stream_writer(fileobj, closefd=False)
+    return ParallelGzipWriter(fileobj, workers=workers)
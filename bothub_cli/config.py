@@ -16,6 +16,8 @@ class ConfigBase(object):
     def __init__(self, path=None):
         self.config = {}
         self.path = Config.determine_path(path)
+        # stat of the file when self.config was last in sync with it
+        self._synced_stat = None
 
     @staticmethod
     def determine_path(path):
@@ -41,12 +43,25 @@ class ConfigBase(object):
         if len(parent_dir) > 0 and not os.path.isdir(parent_dir):
             os.makedirs(parent_dir)
 
+    def _get_stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (getattr(stat, 'st_mtime_ns', stat.st_mtime), stat.st_size, stat.st_ino)
+
     def load(self):
+        '''Parse the config file, unless it is unchanged since the last load
+        or save and there are no local modifications'''
+        stat = self._get_stat()
+        if stat is not None and stat == self._synced_stat:
+            return
         try:
             with open(self.path, encoding='utf8') as fin:
                 self.config = yaml.load(fin)
         except IOError:
             raise exc.ImproperlyConfigured()
+        self._synced_stat = stat
 
     def save(self, target_dir=None):
         _path = os.path.join(target_dir, self.path) if target_dir else self.path
@@ -54,9 +69,12 @@ class ConfigBase(object):
         with codecs.open(_path, 'wb', encoding='utf8') as fout:
             content = yaml.dump(self.config, default_flow_style=False)
             fout.write(content)
+        if not target_dir:
+            self._synced_stat = self._get_stat()
 
     def set(self, key, value):
         self.config[key] = value
+        self._synced_stat = None
 
     def get(self, key):
         return self.config.get(key)
@@ -72,6 +90,7 @@ class ConfigBase(object):
 
     def __delitem__(self, key):
         del self.config[key]
+        self._synced_stat = None
 
     def is_exists(self):
         return os.path.isfile(self.path)
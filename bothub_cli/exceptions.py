@@ -1,8 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import (absolute_import, division, print_function, unicode_literals)
-import google.auth.exceptions as g_auth_exc
-import google.api_core.exceptions as g_core_exc
+
 
 class CliException(Exception):
     pass
@@ -154,3 +153,61 @@ class TargetDirectoryDuplicated(CliException):
 
 class IgnorePatternMatched(CliException):
     pass
+
+
+class PackageFormatNotSupported(CliException):
+    def __init__(self, package_format):
+        msg = 'Package format {} is not supported'.format(package_format)
+        super(PackageFormatNotSupported, self).__init__(msg)
+
+
+class UnsupportedMediaType(CliException):
+    pass
+
+
+class ProjectNotFound(CliException):
+    def __init__(self, root):
+        msg = 'No project is found under {}'.format(root)
+        super(ProjectNotFound, self).__init__(msg)
+
+
+class BytecodeCompileFailed(CliException):
+    def __init__(self, python, cause):
+        msg = 'Failed to compile bytecode with {}: {}'.format(python, cause)
+        super(BytecodeCompileFailed, self).__init__(msg)
+
+
+class DependencyBuildFailed(CliException):
+    def __init__(self, cause):
+        msg = 'Failed to build wheels of requirements.txt: {}'.format(cause)
+        super(DependencyBuildFailed, self).__init__(msg)
+
+
+class AllowListNotFound(CliException):
+    def __init__(self, path):
+        msg = "No allow-list at {}. Run 'bothub package trace' first".format(path)
+        super(AllowListNotFound, self).__init__(msg)
+
+
+class InvalidDeployTarget(CliException):
+    def __init__(self, spec):
+        msg = 'Invalid deploy target {}. Give PROJECT_ID or PROJECT_ID@BASE_URL'.format(spec)
+        super(InvalidDeployTarget, self).__init__(msg)
+
+
+class InvalidNamePattern(CliException):
+    def __init__(self, pattern, cause):
+        msg = 'Invalid name pattern {}: {}'.format(pattern, cause)
+        super(InvalidNamePattern, self).__init__(msg)
+
+
+class ServerNotAuthenticated(CliException):
+    def __init__(self, base_url):
+        msg = "No credentials for {}. Run 'bothub configure --api-base-url {}' first".format(base_url, base_url)
+        super(ServerNotAuthenticated, self).__init__(msg)
+
+
+class PackagingFailed(CliException):
+    def __init__(self, cause):
+        msg = 'Failed to make the dist package: {}'.format(cause)
+        super(PackagingFailed, self).__init__(msg)
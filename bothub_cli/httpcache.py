@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import zlib
+import hashlib
+import logging
+
+from bothub_cli import codec
+
+
+logger = logging.getLogger('bothub.cli.httpcache')
+
+DEFAULT_MAX_SIZE = 16 * 1024 * 1024
+
+
+class CachedResponse(object):
+    '''A response replayed from the cache after a 304 Not Modified'''
+    def __init__(self, content, headers=None):
+        self.status_code = 200
+        self.content = content
+        self.headers = headers or {}
+
+
+class ResponseCache(object):
+    '''On-disk cache of GET response bodies with their validators.
+
+    Entries are keyed by URL and a digest of the auth token, so tokens are
+    never written to disk and different accounts never share entries.
+    Entries carry no freshness lifetime: they are always revalidated with
+    If-None-Match/If-Modified-Since. Bodies are stored zlib-compressed and
+    the least recently used entries are evicted beyond max_size bytes.
+    The directory is scanned once per process; after that a running size
+    estimate decides when to scan and evict again.'''
+
+    def __init__(self, path=None, max_size=DEFAULT_MAX_SIZE):
+        self.path = path or os.path.expanduser(os.path.join('~', '.bothub', 'http-cache'))
+        self.max_size = max_size
+        self.size = None
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path, 0o700)
+
+    def _get_entry_path(self, url, auth_token):
+        token_digest = hashlib.sha256((auth_token or '').encode('utf8')).hexdigest()
+        key = hashlib.sha256('{}\n{}'.format(token_digest, url).encode('utf8')).hexdigest()
+        return os.path.join(self.path, key)
+
+    def get(self, url, auth_token):
+        '''Return a dict of etag, last_modified and content, or None'''
+        entry_path = self._get_entry_path(url, auth_token)
+        try:
+            with open(entry_path, 'rb') as fin:
+                payload = zlib.decompress(fin.read())
+            os.utime(entry_path, None)
+        except (IOError, OSError, zlib.error):
+            return None
+        header, _, content = payload.partition(b'\n')
+        entry = codec.loads(header)
+        entry['content'] = content
+        return entry
+
+    def set(self, url, auth_token, headers, content):
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        header = codec.dumps({'etag': etag, 'last_modified': last_modified})
+        payload = zlib.compress(header + b'\n' + content)
+        entry_path = self._get_entry_path(url, auth_token)
+        try:
+            replaced_size = os.path.getsize(entry_path)
+        except OSError:
+            replaced_size = 0
+        temp_path = '{}.{}.tmp'.format(entry_path, os.getpid())
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as fout:
+            fout.write(payload)
+        os.replace(temp_path, entry_path)
+        if self.size is not None:
+            self.size += len(payload) - replaced_size
+        if self.size is None or self.size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.path):
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total_size += stat.st_size
+
+        for _, size, name in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            logger.debug('Evict cached response %s', name)
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+            total_size -= size
+        self.size = total_size
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            os.remove(os.path.join(self.path, name))
+        self.size = 0
+
+
+def get_default_response_cache():
+    '''Return the user's response cache unless BOTHUB_HTTP_CACHE is "0"'''
+    if os.environ.get('BOTHUB_HTTP_CACHE') == '0':
+        return None
+    return ResponseCache()
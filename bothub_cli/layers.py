@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import re
+import sys
+import shutil
+import hashlib
+import logging
+import tarfile
+import tempfile
+import sysconfig
+import subprocess
+
+from bothub_cli import exceptions as exc
+
+
+logger = logging.getLogger('bothub.cli.layers')
+
+INTERPRETER_TAG_SCRIPT = 'import sys, sysconfig; print(sys.implementation.cache_tag + "-" + sysconfig.get_platform())'
+# the platform of bot runtimes, for layers of downloaded wheels
+DEFAULT_PLATFORM = 'manylinux2014_x86_64'
+# like pip, a "#" starts a comment only at the line start or after whitespace,
+# so URL fragments such as "#egg=pkg" are kept
+COMMENT_PATTERN = re.compile(r'(^|\s)#.*$')
+
+
+def get_interpreter_tag(python=None):
+    '''Return the cache tag and platform of a python interpreter, like
+    "cpython-37-linux-x86_64", which wheels built by it are bound to'''
+    if not python or python == sys.executable:
+        return '{}-{}'.format(sys.implementation.cache_tag, sysconfig.get_platform())
+    try:
+        output = subprocess.check_output([python, '-c', INTERPRETER_TAG_SCRIPT])
+    except (OSError, subprocess.CalledProcessError) as ex:
+        raise exc.DependencyBuildFailed(ex)
+    return output.decode('utf8').strip()
+
+
+def get_layer_key(requirements, interpreter_tag):
+    '''Return the sha256 key of the dependency layer of requirements.txt
+    content. Comments and blank lines do not change the key.'''
+    lines = [COMMENT_PATTERN.sub('', line).strip() for line in requirements.splitlines()]
+    content = '\n'.join([interpreter_tag] + [line for line in lines if line])
+    return hashlib.sha256(content.encode('utf8')).hexdigest()
+
+
+class LayerTarget(object):
+    '''The bot runtime a dependency layer is made for.
+
+    With python, the path of an interpreter matching the runtime, wheels
+    are built by its pip. With python_version, like "3.7", binary wheels
+    for that version and platform are downloaded by the pip of this
+    interpreter, and packages without one fail the build.'''
+
+    def __init__(self, python=None, python_version=None, platform=DEFAULT_PLATFORM):
+        if not python and not python_version:
+            raise ValueError('python or python_version is required')
+        self.python = python
+        self.python_version = python_version
+        self.platform = platform
+
+    def get_tag(self):
+        '''Return the tag wheels for this target are bound to, which keys
+        its layers'''
+        if self.python_version:
+            return 'cpython-{}-{}'.format(self.python_version.replace('.', ''), self.platform)
+        return get_interpreter_tag(self.python)
+
+
+def _run_pip(args):
+    try:
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as ex:
+        raise exc.DependencyBuildFailed(ex)
+    _, stderr = process.communicate()
+    if process.returncode != 0:
+        lines = stderr.decode('utf8', 'replace').strip().splitlines()
+        return lines[-1] if lines else process.returncode
+
+
+def build_wheels(requirements_path, wheel_dir, target):
+    '''Resolve a requirements file and put wheels of every package it
+    needs for a LayerTarget into wheel_dir'''
+    if not target.python_version:
+        error = _run_pip([target.python, '-m', 'pip', 'wheel', '--quiet', '--requirement', requirements_path,
+                          '--wheel-dir', wheel_dir])
+        if error is not None:
+            raise exc.DependencyBuildFailed(error)
+        return
+
+    error = _run_pip([sys.executable, '-m', 'pip', 'download', '--quiet', '--only-binary=:all:',
+                      '--implementation', 'cp', '--python-version', target.python_version,
+                      '--platform', target.platform, '--requirement', requirements_path, '--dest', wheel_dir])
+    if error is not None:
+        raise exc.DependencyBuildFailed('no binary wheels for python {} on {}: {}'.format(
+            target.python_version, target.platform, error))
+
+
+def pack_layer(wheel_dir, layer_path):
+    '''Pack the wheels of wheel_dir into an uncompressed tarball, as wheels
+    are compressed already. Names are sorted and owners and mtimes pinned,
+    so the same wheels always make the same layer.'''
+    with tarfile.open(layer_path, 'w') as tout:
+        for name in sorted(os.listdir(wheel_dir)):
+            tarinfo = tout.gettarinfo(os.path.join(wheel_dir, name), arcname=name)
+            tarinfo.mtime = 0
+            tarinfo.uid = tarinfo.gid = 0
+            tarinfo.uname = tarinfo.gname = ''
+            with open(os.path.join(wheel_dir, name), 'rb') as fin:
+                tout.addfile(tarinfo, fin)
+
+
+class LayerCache(object):
+    '''Dependency layers built on this machine, under ~/.bothub/layers.
+
+    A layer is a tarball of the wheels of a requirements file, keyed by the
+    hash of the requirements and the tag of its LayerTarget, so it is built
+    once per requirements file and target and reused until they change.
+    builder is called with the requirements path, a directory for the
+    wheels and the target.'''
+
+    def __init__(self, path=None, builder=build_wheels):
+        self.path = path or os.path.expanduser(os.path.join('~', '.bothub', 'layers'))
+        self.builder = builder
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def get_path(self, key):
+        return os.path.join(self.path, '{}.tar'.format(key))
+
+    def build(self, requirements_path, target):
+        '''Return the key and path of the layer of a requirements file for a
+        LayerTarget, building it unless it is cached'''
+        with open(requirements_path) as fin:
+            key = get_layer_key(fin.read(), target.get_tag())
+        layer_path = self.get_path(key)
+        if os.path.isfile(layer_path):
+            logger.debug('Reuse dependency layer %s', key)
+            return key, layer_path
+
+        wheel_dir = tempfile.mkdtemp(prefix='bothub-wheels')
+        try:
+            self.builder(requirements_path, wheel_dir, target)
+            temp_path = '{}.tmp'.format(layer_path)
+            pack_layer(wheel_dir, temp_path)
+            os.replace(temp_path, layer_path)
+        finally:
+            shutil.rmtree(wheel_dir, ignore_errors=True)
+        logger.debug('Built dependency layer %s', key)
+        return key, layer_path
@@ -3,25 +3,39 @@
 from __future__ import (absolute_import, division, print_function, unicode_literals)
 
 import os
+import re
 import sys
+import copy
 import json
 import time
+import threading
 import traceback
 import yaml
+import requests
 import zipfile, shutil
-import dialogflow
 import io
-import google.auth.exceptions
-import google.api_core.exceptions
-
-from prompt_toolkit import prompt
-from prompt_toolkit import PromptSession
-from prompt_toolkit.history import FileHistory
-
-from bothub_client.clients import NluClientFactory
-
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+
+from bothub_cli import compress
+from bothub_cli.analyze import analyze_package
 from bothub_cli import exceptions as exc
 from bothub_cli.api import Api
+from bothub_cli.api import DEFAULT_CHUNK_SIZE
+from bothub_cli.httpcache import get_default_response_cache
+from bothub_cli.layers import LayerCache
+from bothub_cli.trace import ALLOW_LIST_FILE
+from bothub_cli.trace import FileTracer
+from bothub_cli.trace import make_allow_list
+from bothub_cli.trace import save_allow_list
+from bothub_cli.trace import load_allow_list
+from bothub_cli.manifest import Manifest
+from bothub_cli.manifest import Snapshot
+from bothub_cli.manifest import save_json
+from bothub_cli.manifest import load_json
 from bothub_cli.config import Config
 from bothub_cli.config import ProjectConfig
 from bothub_cli.config import ProjectMeta
@@ -31,10 +45,15 @@ from bothub_cli.clients import ExternalHttpStorageClient
 from bothub_cli.utils import safe_mkdir
 from bothub_cli.utils import read_content_from_file
 from bothub_cli.utils import make_dist_package
+from bothub_cli.utils import stream_dist_package
 from bothub_cli.utils import extract_dist_package
 from bothub_cli.utils import make_event
 from bothub_cli.utils import tabulate_dict
 from bothub_cli.utils import get_bot_class
+from bothub_cli.utils import make_name_matcher
+from bothub_cli.utils import find_projects
+from bothub_cli.utils import list_package_files
+from bothub_cli.utils import IgnoreMatcher
 from bothub_cli.utils import make_intents_json
 from bothub_cli.utils import make_intents_yml
 from bothub_cli.utils import make_entities_json
@@ -42,11 +61,175 @@ from bothub_cli.utils import make_entities_yml
 from bothub_cli.utils import make_etc_json
 from bothub_cli.utils import make_etc_yml
 
+DEFAULT_JOBS = 8
+MAX_JOBS = 32
+# files of one project uploaded at once
+UPLOAD_JOBS = 8
+DEPLOY_TIMEOUT = 300
+POLL_INTERVAL = 0.25
+# longest wait for a line of the status stream, heartbeats included
+STREAM_READ_TIMEOUT = 10
+POLL_BACKOFF = 1.5
+MAX_POLL_INTERVAL = 5
+# errors which fail one deploy of a batch rather than the whole batch
+DEPLOY_ERRORS = (exc.CliException, requests.exceptions.RequestException, OSError)
+
+logger = logging.getLogger('bothub.cli.lib')
+
+
+class StatusTimer(object):
+    '''Seconds spent in each deploy status, in the order they were seen'''
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.started = clock()
+        self.durations = OrderedDict()
+        self.status = None
+        self.since = self.started
+
+    def update(self, status):
+        '''Account the time up to now to the current status and move to
+        status. Returns whether the status changed.'''
+        now = self.clock()
+        if self.status is not None:
+            self.durations[self.status] = self.durations.get(self.status, 0) + now - self.since
+        self.since = now
+        changed = status != self.status
+        self.status = status
+        if changed:
+            self.durations.setdefault(status, 0)
+        return changed
+
+    @property
+    def elapsed(self):
+        return self.clock() - self.started
+
+    def format(self):
+        return ', '.join('{} {:.1f}s'.format(status, seconds) for status, seconds in self.durations.items()
+                         if status != 'online')
+
+
+class DeployTimings(object):
+    '''Wall time and bytes in and out of each deploy phase'''
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        '''Time a phase. The yielded dict takes bytes_in and bytes_out.'''
+        record = OrderedDict([('phase', name), ('seconds', None), ('bytes_in', None), ('bytes_out', None)])
+        started = self.clock()
+        try:
+            yield record
+        finally:
+            record['seconds'] = self.clock() - started
+            self.phases.append(record)
+
+    def to_list(self):
+        '''Return the phases with compression ratio and throughput in bytes per second'''
+        result = []
+        for record in self.phases:
+            record = OrderedDict(record)
+            bytes_in, bytes_out, seconds = record['bytes_in'], record['bytes_out'], record['seconds']
+            record['ratio'] = bytes_out / bytes_in if bytes_in and bytes_out is not None else None
+            processed = bytes_in if bytes_in is not None else bytes_out
+            record['throughput'] = processed / seconds if processed is not None and seconds > 0 else None
+            result.append(record)
+        return result
+
+    @property
+    def total(self):
+        return sum(record['seconds'] for record in self.phases)
+
+
+class CountingIterator(object):
+    '''Count the bytes of the chunks passing through an iterator'''
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.size = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        chunk = next(self.chunks)
+        self.size += len(chunk)
+        return chunk
+
+    next = __next__
+
+
+class DeployOptions(object):
+    '''Options of Cli.deploy.
+
+    force deploys unchanged code. stream uploads a dist package while it is
+    made, in package_format. timeout and max_retries bound the wait for the
+    bot to be online. bytecode is the path of an interpreter matching the
+    bot runtime to compile .pyc files with, dependency_layer a
+    layers.LayerTarget to put wheels of requirements.txt in a layer for, and
+    minimal deploys only the files of the allow-list of trace_bundle.'''
+
+    def __init__(self, force=False, stream=False, package_format=compress.GZIP, timeout=DEPLOY_TIMEOUT,
+                 max_retries=None, bytecode=None, dependency_layer=None, minimal=False):
+        compress.check_format(package_format)
+        self.force = force
+        self.stream = stream
+        self.package_format = package_format
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.bytecode = bytecode
+        self.dependency_layer = dependency_layer
+        self.minimal = minimal
+
+
+class DeployTarget(object):
+    '''A project to deploy to, on the API server at base_url or the default one'''
+    def __init__(self, project_id, base_url=None):
+        self.project_id = project_id
+        self.base_url = base_url
+
+    @classmethod
+    def parse(cls, spec):
+        '''Parse a PROJECT_ID or PROJECT_ID@BASE_URL target'''
+        project_id, at, base_url = spec.strip().partition('@')
+        base_url = base_url.rstrip('/')
+        if not project_id.isdigit() or (at and not base_url):
+            raise exc.InvalidDeployTarget(spec)
+        return cls(int(project_id), base_url or None)
+
+    @property
+    def name(self):
+        return '{}@{}'.format(self.project_id, self.base_url) if self.base_url else str(self.project_id)
+
+
+class DeployProgress(object):
+    '''Print deploy progress dots to a console'''
+    def __init__(self, console=None):
+        self.console = console
+        self.first_deploying_dot = True
+
+    def update(self, status):
+        if not self.console:
+            return
+        if status == 'deploying' and self.first_deploying_dot:
+            self.console('.')
+            self.console('Restarting container', nl=False)
+            self.first_deploying_dot = False
+        self.console('.', nl=False)
+
+    def done(self, timer):
+        if not self.console:
+            return
+        self.console('.')
+        summary = timer.format()
+        if summary:
+            self.console('Online after {:.1f}s: {}'.format(timer.elapsed, summary))
+
 
 class Cli(object):
     '''A CLI class represents '''
     def __init__(self, api=None, config=None, project_config=None, project_meta=None, print_error=None, print_message=None):
-        self.api = api or Api()
+        self.api = api or Api(response_cache=get_default_response_cache())
         self.config = config or Config()
         self.project_config = project_config or ProjectConfig()
         self.project_meta = project_meta or ProjectMeta()
@@ -56,10 +239,30 @@ class Cli(object):
 
         self.print_error = print_error or print
         self.print_message = print_message or print
-
-    def authenticate(self, username, password):
-        token = self.api.authenticate(username, password)
-        self.config.set('auth_token', token)
+        self.timings = None
+        # dist packages larger than this are uploaded in chunks of this size
+        self.chunk_size = DEFAULT_CHUNK_SIZE
+        # made on the first deploy with a dependency layer
+        self.layer_cache = None
+
+    def authenticate(self, username, password, base_url=None):
+        '''Log in and save the auth token, or with base_url, the token of
+        another API server for deploys to targets on it'''
+        base_url = base_url.rstrip('/') if base_url else None
+        if not base_url or base_url == self.api.base_url:
+            token = self.api.authenticate(username, password)
+            self.config.set('auth_token', token)
+        else:
+            api = self._make_server_api(base_url)
+            try:
+                token = api.authenticate(username, password)
+            finally:
+                api.close()
+            if self.config.is_exists():
+                self.config.load()
+            servers = self.config.get('servers') or {}
+            servers[base_url] = {'auth_token': token}
+            self.config.set('servers', servers)
         self.config.save()
 
     def init(self, name, description, target_dir=None):
@@ -95,40 +298,499 @@ class Cli(object):
         result = tabulate_dict(projects, *args)
         return result
 
-    def rm(self, name):
+    def rm(self, name, match='exact', dry_run=False, jobs=DEFAULT_JOBS):
+        '''Delete projects whose name matches an exact name, a glob pattern or a
+        regular expression, on up to jobs threads. Returns a result dict per
+        project with an error message for the failed ones.'''
+        matches = make_name_matcher(name, match)
         self._load_auth()
         projects = self.api.list_projects()
-        _projects = [p for p in projects if p['name'] == name]
+        _projects = [p for p in projects if matches(p['name'])]
         if not _projects:
             raise exc.ProjectNameNotFound(name)
-        for project in _projects:
+        if dry_run:
+            return [{'id': p['id'], 'name': p['name'], 'deleted': False, 'error': None} for p in _projects]
+
+        self.api.reserve_connections(jobs)
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(self._delete_project, project) for project in _projects]
+            return [future.result() for future in as_completed(futures)]
+
+    def _delete_project(self, project):
+        result = {'id': project['id'], 'name': project['name'], 'deleted': True, 'error': None}
+        try:
             self.api.delete_project(project['id'])
+        except exc.NotFound:
+            # already deleted, e.g. by a retried request
+            pass
+        except (exc.CliException, requests.exceptions.RequestException) as ex:
+            result['deleted'] = False
+            result['error'] = '{}: {}'.format(ex.__class__.__name__, ex)
+        return result
 
-    def deploy(self, console=None, source_dir='.', max_retries=30):
+    def deploy(self, console=None, source_dir='.', project_dir='.', targets=None, **kwargs):
+        '''Deploy the bot with the DeployOptions given as keywords. Only
+        files missing on the server are uploaded along with a manifest, or a
+        whole dist package if the server does not support it, and nothing if
+        the code is unchanged since the last deploy. Returns the StatusTimer
+        of the deploy, or None if it is skipped, and leaves the time and bytes
+        of each phase in self.timings. With targets, a list of DeployTarget,
+        deploys to them instead and returns a result dict per target.
+
+        .bothubignore, requirements.txt and dist are looked up in project_dir.'''
+        options = DeployOptions(**kwargs)
+        self.timings = DeployTimings()
         self._load_auth()
         self.project_config.load()
 
-        safe_mkdir('dist')
-        dist_file_path = os.path.join('dist', 'bot.tgz')
+        project_id = self._get_current_project_id() if not targets else None
+        # made first, to refuse targets on servers without credentials
+        target_apis = [(target, self._get_target_api(target)) for target in targets] if targets else None
+        ignores = self._load_ignores(project_dir)
+        files = self._load_minimal_files(source_dir, ignores, project_dir) if options.minimal else None
+        snapshot_path = self._get_meta_path('snapshot.json')
+        snapshot = Snapshot.load(snapshot_path)
+        requirements_path = os.path.join(project_dir, 'requirements.txt')
+        layer_key = None
+        if options.dependency_layer and os.path.isfile(requirements_path):
+            if self.layer_cache is None:
+                self.layer_cache = LayerCache()
+            with self.timings.phase('build dependency') as record:
+                layer_key, layer_path = self.layer_cache.build(requirements_path, options.dependency_layer)
+                record['bytes_out'] = os.path.getsize(layer_path)
+        with self.timings.phase('scan') as record:
+            manifest = Manifest.from_dir(
+                source_dir,
+                ignores=ignores,
+                snapshot=snapshot,
+                paths=files,
+                language=self.project_config.get('programming-language'),
+                dependency=read_content_from_file(requirements_path) or 'bothub',
+                project_id=project_id,
+                bytecode=options.bytecode,
+                dependency_layer=layer_key
+            )
+            record['bytes_in'] = sum(manifest.sizes.values())
+            snapshot.save(snapshot_path)
+        if targets:
+            return self._deploy_targets(target_apis, manifest, snapshot, source_dir, project_dir, console, options)
+        manifest_path = self._get_meta_path('manifest.json')
+        deployed_manifest = Manifest.load(manifest_path)
+        deployed_digest = deployed_manifest.digest \
+            if deployed_manifest and deployed_manifest.project_id == project_id else None
+        if not options.force and self._is_deployed(project_id, manifest, deployed_digest):
+            if console:
+                console('Code is not changed since the last deploy. Skip uploading.')
+            return
+
+        def send_dist_package(package_format):
+            self._send_dist_package(project_id, manifest, source_dir, project_dir, snapshot, console, options,
+                                    package_format)
+
+        timer = self._deploy_manifest(project_id, manifest, source_dir, send_dist_package, console, options)
+        manifest.save(manifest_path)
+        return timer
+
+    def _deploy_manifest(self, project_id, manifest, source_dir, send_dist_package, console, options):
+        '''Deploy a scanned manifest to a project with self.api and wait until
+        it is online. Its dependency layer is uploaded first, or dropped from
+        the manifest if the server does not support layers. Only files missing
+        on the server are uploaded, or, if the server does not support that,
+        send_dist_package is called with a package format, and again with
+        gzip if the server refuses the format. Returns the StatusTimer.'''
+        if manifest.dependency_layer and not self._upload_dependency_layer(manifest.dependency_layer, console):
+            manifest.dependency_layer = None
+
+        # .pyc files are made while packaging, so they only go in dist packages
+        incremental = not manifest.bytecode
+        if incremental:
+            try:
+                self._upload_manifest(project_id, manifest, source_dir, console)
+            except exc.NotFound:
+                incremental = False
+            else:
+                if console and (options.stream or options.package_format != compress.GZIP):
+                    console('')
+                    console('Server takes changed files, so no dist package is sent and --stream and --format '
+                            'are ignored.')
+        if not incremental:
+            try:
+                send_dist_package(options.package_format)
+            except exc.UnsupportedMediaType:
+                if options.package_format == compress.GZIP:
+                    raise
+                if console:
+                    console('')
+                    console('Server does not support {} packages. Retry with gzip.'.format(options.package_format))
+                send_dist_package(compress.GZIP)
+        with self.timings.phase('wait') as record:
+            timer = self._wait_deploy_completion(project_id, console, max_retries=options.max_retries,
+                                                 timeout=options.timeout)
+            record['statuses'] = dict(timer.durations)
+        return timer
+
+    def _is_deployed(self, project_id, manifest, deployed_digest):
+        '''Return whether manifest is what was last deployed from here, by
+        the digest recorded then, and is still what the server has committed,
+        so a deploy from elsewhere or a rollback is not mistaken for unchanged
+        code. Dist package deploys are not committed as manifests, so they are
+        only checked locally.'''
+        if deployed_digest != manifest.digest:
+            return False
+        if manifest.bytecode:
+            return True
+        try:
+            committed = Manifest.from_dict(self.api.get_manifest(project_id))
+        except exc.NotFound:
+            return True
+        return committed is not None and committed.digest == manifest.digest
+
+    def deploy_watch(self, console=None, source_dir='.', project_dir='.', debounce=None, poll_interval=None,
+                     stop=None, watcher=None, close_timeout=None, **kwargs):
+        '''Deploy, then deploy again after each burst of changes to the
+        package files until the stop event is set, with the options of
+        deploy. Changes are watched with inotify, or polled every
+        poll_interval seconds without it, and a burst ends after debounce
+        quiet seconds; both default to the values of the watch module. Deploys run one at a time on this Cli, so they share
+        its authenticated session, and changes during a deploy queue at most
+        one more. When watching stops, a running deploy is waited for up to
+        close_timeout seconds, watch.CLOSE_TIMEOUT by default; a
+        KeyboardInterrupt stops the wait.'''
+        from bothub_cli import watch
+
+        debounce = watch.DEBOUNCE if debounce is None else debounce
+        poll_interval = watch.POLL_INTERVAL if poll_interval is None else poll_interval
+        close_timeout = watch.CLOSE_TIMEOUT if close_timeout is None else close_timeout
+        console = console or self.print_message
+        self._load_auth()
+        watcher = watcher or watch.make_watcher(source_dir, self._load_ignores(project_dir), poll_interval)
+
+        def deploy():
+            self.deploy(console=console, source_dir=source_dir, project_dir=project_dir, **kwargs)
+
+        def on_error(ex):
+            console('{}: {}'.format(ex.__class__.__name__, ex))
+
+        def on_change(changes):
+            console('Changed: {}'.format(', '.join(sorted(path or '(overflow)' for path in changes))))
+            queue.request()
+
+        queue = watch.DeployQueue(deploy, on_error)
+        queue.request()
+        try:
+            watch.watch_changes(watcher, on_change, debounce, stop)
+        finally:
+            watcher.close()
+            if queue.running:
+                console('Waiting up to {}s for the running deploy. Press Ctrl+C again to quit now.'.format(
+                    close_timeout))
+            if not queue.close(close_timeout):
+                console('Stopped waiting. The deploy may still be in progress on the server.')
+
+    @staticmethod
+    def _load_ignores(project_dir='.'):
+        ignore_file_path = os.path.join(project_dir, '.bothubignore')
+        return IgnoreMatcher.from_ignore_file(ignore_file_path) if os.path.isfile(ignore_file_path) else None
+
+    def trace_bundle(self, warmup_messages=(), target_dir='.', project_dir='.'):
+        '''Load the bot like test mode does and let it handle warm-up
+        messages while tracing the project files it imports or opens. Saves
+        the package files it needs to the allow-list of project_dir and
+        returns them.'''
+        self._load_auth()
+        package_files = list_package_files(target_dir, self._load_ignores(project_dir))
+        with FileTracer(target_dir) as tracer:
+            bot = self._load_bot(target_dir)['bot']
+            for message in warmup_messages:
+                bot.handle_message(make_event(message), {})
+        allow_list = make_allow_list(tracer.paths, package_files)
+        save_allow_list(os.path.join(project_dir, ALLOW_LIST_FILE), allow_list)
+        return allow_list
+
+    def _load_minimal_files(self, source_dir, ignores, project_dir='.'):
+        allow_list_path = os.path.join(project_dir, ALLOW_LIST_FILE)
+        if not os.path.isfile(allow_list_path):
+            raise exc.AllowListNotFound(allow_list_path)
+        allowed = load_allow_list(allow_list_path)
+        return [path for path in list_package_files(source_dir, ignores) if path in allowed]
+
+    def analyze_package(self, source_dir='.', project_dir='.'):
+        '''Measure the files a deploy would package, with the .bothubignore
+        of project_dir. See analyze.analyze_package for the result.'''
+        return analyze_package(source_dir, ignores=self._load_ignores(project_dir))
+
+    def deploy_all(self, root='.', jobs=DEFAULT_JOBS, console=None, **kwargs):
+        '''Deploy every project found under root, up to jobs at once, with
+        the options of deploy. Calls console with a progress line as each
+        project finishes and returns a result dict per project.'''
+        project_dirs = find_projects(root)
+        if not project_dirs:
+            raise exc.ProjectNotFound(root)
+        self._load_auth()
+
+        # every project uploads its files on UPLOAD_JOBS threads of the shared session
+        self.api.reserve_connections(jobs * UPLOAD_JOBS)
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(self._deploy_project, d, **kwargs) for d in project_dirs]
+            results = self._collect_deploy_results(futures, console)
+        return sorted(results, key=lambda r: r['path'])
+
+    @staticmethod
+    def _collect_deploy_results(futures, console=None):
+        '''Return the result dicts of deploy futures as they finish, calling
+        console with a progress line for each'''
+        results = []
+        for index, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            if console:
+                console('[{}/{}] {}: {}'.format(index, len(futures), result['path'],
+                                                result['error'] or result['status']))
+        return results
+
+    @staticmethod
+    def _run_deploy(name, cli, deploy):
+        '''Call deploy, which deploys with cli, and return a result dict of
+        its status, time, error and phase timings. A failed deploy is
+        recorded in the result instead of raised.'''
+        result = {'path': name, 'status': 'deployed', 'elapsed': None, 'error': None}
+        started = time.time()
+        try:
+            if deploy() is None:
+                result['status'] = 'skipped'
+        except DEPLOY_ERRORS as ex:
+            result['status'] = 'failed'
+            result['error'] = '{}: {}'.format(ex.__class__.__name__, ex)
+        result['elapsed'] = time.time() - started
+        result['timings'] = cli.timings.to_list() if cli.timings else []
+        return result
+
+    def _deploy_project(self, project_dir, **kwargs):
+        cli = Cli(
+            api=self.api,
+            config=self.config,
+            project_config=ProjectConfig([os.path.join(project_dir, n) for n in ('bothub.yml', 'bothub.yaml')]),
+            project_meta=ProjectMeta(os.path.join(project_dir, '.bothub-meta', 'meta.yml'))
+        )
+        return self._run_deploy(project_dir, cli,
+                                lambda: cli.deploy(source_dir=project_dir, project_dir=project_dir, **kwargs))
+
+    def _deploy_targets(self, target_apis, manifest, snapshot, source_dir, project_dir, console, options):
+        '''Deploy a scanned manifest to every (target, Api) pair of
+        target_apis at once, closing the Apis after. A dist package is made
+        once per format and shared, so it is never streamed. The digest
+        deployed to each server and project is kept in
+        .bothub-meta/targets.json, and a target is skipped when it matches
+        and the server still has it committed. Returns a result dict per
+        target.'''
+        state_path = self._get_meta_path('targets.json')
+        deployed = load_json(state_path) or {}
+        lock = threading.Lock()
+        dist_files = {}
+
+        def get_dist_file(package_format):
+            with lock:
+                if package_format not in dist_files:
+                    dist_files[package_format] = self._make_dist_file(manifest, source_dir, project_dir, snapshot,
+                                                                      package_format)
+                return dist_files[package_format]
+
+        def deploy_target(target, api):
+            cli = Cli(api=api, config=self.config, project_config=self.project_config,
+                      project_meta=self.project_meta)
+            cli.timings = DeployTimings()
+            cli.chunk_size = self.chunk_size
+            cli.layer_cache = self.layer_cache
+
+            key = '{} {}'.format(api.base_url, target.project_id)
+
+            def deploy():
+                if not options.force and cli._is_deployed(target.project_id, manifest, deployed.get(key)):
+                    return None
+                timer = cli._deploy_bundle(target, manifest, source_dir, get_dist_file, options)
+                with lock:
+                    deployed[key] = manifest.digest
+                    save_json(state_path, deployed)
+                return timer
+
+            return self._run_deploy(target.name, cli, deploy)
+
+        shared = sum(1 for _, api in target_apis if api is self.api)
+        self.api.reserve_connections(shared * UPLOAD_JOBS)
+        try:
+            with ThreadPoolExecutor(max_workers=len(target_apis)) as executor:
+                futures = [executor.submit(deploy_target, target, api) for target, api in target_apis]
+                results = dict((result['path'], result) for result in self._collect_deploy_results(futures, console))
+        finally:
+            for _, api in target_apis:
+                if api is not self.api:
+                    api.close()
+        return [results[target.name] for target, _ in target_apis]
+
+    def _deploy_bundle(self, target, manifest, source_dir, get_dist_file, options):
+        '''Deploy a manifest, and a dist package from get_dist_file where
+        needed, to one target of _deploy_targets'''
+        # the manifest is shared by all targets, and dropping a layer changes it
+        manifest = copy.copy(manifest)
+        # each target resumes its own chunked upload
+        state_name = 'upload-{}.json'.format(re.sub(r'[^\w.-]+', '_', target.name))
+
+        def send_dist_package(package_format):
+            self._upload_dist_file(target.project_id, manifest, get_dist_file(package_format), package_format,
+                                   state_name=state_name)
+
+        return self._deploy_manifest(target.project_id, manifest, source_dir, send_dist_package, None, options)
+
+    def _get_target_api(self, target):
+        '''Return the Api of a target: self.api on its own server, and on
+        another one an Api with the token saved for that server, as the
+        token of this one must not be sent there'''
+        if not target.base_url or target.base_url == self.api.base_url:
+            return self.api
+        server = (self.config.get('servers') or {}).get(target.base_url) or {}
+        if not server.get('auth_token'):
+            raise exc.ServerNotAuthenticated(target.base_url)
+        api = self._make_server_api(target.base_url)
+        api.auth_token = server['auth_token']
+        return api
+
+    def _make_server_api(self, base_url):
+        return Api(base_url=base_url, verify_token_expire=self.api.verify_token_expire,
+                   retry_policy=self.api.retry_policy, response_cache=self.api.response_cache)
+
+    def _get_meta_path(self, name):
+        return os.path.join(os.path.dirname(self.project_meta.path), name)
+
+    def _upload_dependency_layer(self, layer_key, console=None):
+        '''Upload a dependency layer of self.layer_cache unless the server has
+        it already. Returns False if the server does not support dependency
+        layers.'''
+        layer_path = self.layer_cache.get_path(layer_key)
+        try:
+            self.api.get_dependency_layer(layer_key)
+            if console:
+                console('Dependency layer is uploaded already.')
+            return True
+        except exc.NotFound:
+            pass
+
         if console:
-            console('Make dist package.')
-        if os.path.isfile('.bothubignore'):
-            make_dist_package(dist_file_path, source_dir, ignores=True)
-        else:
-            make_dist_package(dist_file_path, source_dir)
+            console('Upload dependency layer.')
+        with self.timings.phase('upload dependency') as record:
+            record['bytes_out'] = os.path.getsize(layer_path)
+            try:
+                self.api.upload_dependency_layer(layer_key, layer_path)
+            except exc.NotFound:
+                if console:
+                    console('Server does not support dependency layers. Send requirements.txt instead.')
+                return False
+        return True
+
+    def _upload_manifest(self, project_id, manifest, source_dir, console=None, jobs=UPLOAD_JOBS):
+        blobs = manifest.get_blobs()
+        missing = self.api.get_missing_blobs(project_id, sorted(blobs))
+
+        def upload(digest):
+            with open(os.path.join(source_dir, blobs[digest]), 'rb') as fin:
+                self.api.upload_blob(project_id, digest, fin.read())
 
+        if console:
+            console('Upload {} of {} files'.format(len(missing), len(blobs)), nl=False)
+        with self.timings.phase('upload') as record:
+            record['bytes_out'] = sum(manifest.sizes.get(blobs[digest], 0) for digest in missing)
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                for _ in executor.map(upload, missing):
+                    pass
+            self.api.commit_manifest(project_id, manifest)
+
+    @staticmethod
+    def _get_upload_options(manifest, package_format):
+        # gzip is what every server accepts, so it is sent without a format field
+        options = {} if package_format == compress.GZIP else {'package_format': package_format}
+        if manifest.dependency_layer:
+            options['dependency_layer'] = manifest.dependency_layer
+        return options
+
+    def _send_dist_package(self, project_id, manifest, source_dir, project_dir, snapshot, console, options,
+                           package_format):
+        if options.stream:
+            files = sorted(manifest.files)
+            filename = 'bot.tgz' if package_format == compress.GZIP else 'bot.tar.zst'
+            if console:
+                console('Upload code', nl=False)
+            with self.timings.phase('package+upload') as record:
+                record['bytes_in'] = sum(manifest.sizes.get(path, 0) for path in files)
+                package = stream_dist_package(source_dir, files=files, package_format=package_format,
+                                              bytecode=manifest.bytecode)
+                chunks = CountingIterator(package)
+                try:
+                    self.api.upload_code_stream(project_id, manifest.language, chunks, manifest.dependency,
+                                                filename=filename,
+                                                **self._get_upload_options(manifest, package_format))
+                except Exception:
+                    # a failing body reaches the caller as a transport error
+                    if package.error is not None:
+                        raise exc.PackagingFailed(package.error)
+                    raise
+                record['bytes_out'] = chunks.size
+            return
+
+        dist_file_path = self._make_dist_file(manifest, source_dir, project_dir, snapshot, package_format, console)
+        self._upload_dist_file(project_id, manifest, dist_file_path, package_format, console)
+
+    def _make_dist_file(self, manifest, source_dir, project_dir, snapshot, package_format, console=None):
+        '''Make the dist package of a manifest under the dist directory of
+        project_dir unless the snapshot says it is fresh. Returns its path.'''
+        files = sorted(manifest.files)
+        filename = 'bot.tgz' if package_format == compress.GZIP else 'bot.tar.zst'
+        dist_dir = os.path.join(project_dir, 'dist')
+        safe_mkdir(dist_dir)
+        dist_file_path = os.path.join(dist_dir, filename)
+        with self.timings.phase('package') as record:
+            record['bytes_in'] = sum(manifest.sizes.get(path, 0) for path in files)
+            if snapshot and snapshot.is_archive_fresh(dist_file_path, manifest.digest, package_format):
+                if console:
+                    console('Reuse dist package.')
+            else:
+                if console:
+                    console('Make dist package.')
+                make_dist_package(dist_file_path, source_dir, files=files, package_format=package_format,
+                                  bytecode=manifest.bytecode)
+                if snapshot:
+                    snapshot.set_archive(dist_file_path, manifest.digest, package_format)
+                    snapshot.save(self._get_meta_path('snapshot.json'))
+            record['bytes_out'] = os.path.getsize(dist_file_path)
+        return dist_file_path
+
+    def _upload_dist_file(self, project_id, manifest, dist_file_path, package_format, console=None,
+                          state_name='upload.json'):
+        options = self._get_upload_options(manifest, package_format)
         if console:
             console('Upload code', nl=False)
-        with open(dist_file_path, 'rb') as dist_file:
-            dependency = read_content_from_file('requirements.txt') or 'bothub'
-            project_id = self._get_current_project_id()
-            self.api.upload_code(
-                project_id,
-                self.project_config.get('programming-language'),
-                dist_file,
-                dependency
-            )
-        self._wait_deploy_completion(project_id, console, max_retries=max_retries)
+        with self.timings.phase('upload') as record:
+            record['bytes_out'] = os.path.getsize(dist_file_path)
+            if record['bytes_out'] > self.chunk_size:
+                self._upload_dist_file_chunked(project_id, manifest, dist_file_path, options, state_name)
+            else:
+                with open(dist_file_path, 'rb') as dist_file:
+                    self.api.upload_code(project_id, manifest.language, dist_file, manifest.dependency, **options)
+
+    def _upload_dist_file_chunked(self, project_id, manifest, dist_file_path, options, state_name='upload.json'):
+        '''Upload a dist package in chunks, resuming the upload session of an
+        interrupted deploy of the project recorded in .bothub-meta/upload.json,
+        or state_name'''
+        state_path = self._get_meta_path(state_name)
+        state = load_json(state_path) or {}
+        upload_id = state.get('upload_id') if state.get('project_id') == project_id else None
+
+        def on_start(session):
+            save_json(state_path, {'project_id': project_id, 'upload_id': session['id']})
+
+        self.api.upload_code_chunked(project_id, manifest.language, dist_file_path, manifest.dependency,
+                                     chunk_size=self.chunk_size, upload_id=upload_id, on_start=on_start,
+                                     **options)
+        if os.path.isfile(state_path):
+            os.remove(state_path)
 
     def clone(self, project_name, target_dir=None, create_dir=None):
         _target_dir = target_dir or project_name
@@ -239,6 +901,9 @@ class Cli(object):
         self.print_message()
 
     def test(self):
+        from prompt_toolkit import PromptSession
+        from prompt_toolkit.history import FileHistory
+
         self._load_auth()
         history = FileHistory('.history')
         session = PromptSession(history=history)
@@ -313,27 +978,59 @@ class Cli(object):
                 return p['id']
         raise exc.ProjectNameNotFound(project_name)
 
-    def _wait_deploy_completion(self, project_id, console, wait_interval=1, max_retries=30):
-        first_deploying_dot = True
-        for _ in range(max_retries):
-            project = self.api.get_project(project_id)
-            if project['status'] == 'online':
-                if console:
-                    console('.')
-                return
-
-            if project['status'] == 'deploying' and console:
-                if first_deploying_dot:
-                    console('.')
-                    console('Restarting container', nl=False)
-                    first_deploying_dot = False
-
-            if console:
-                console('.', nl=False)
-            time.sleep(wait_interval)
+    def _wait_deploy_completion(self, project_id, console, wait_interval=POLL_INTERVAL, max_retries=None,
+                                timeout=DEPLOY_TIMEOUT):
+        '''Wait until the project is online, for up to timeout seconds and, if
+        given, max_retries status checks. Follows the status stream of the
+        server if it has one, and otherwise polls with an interval growing
+        from wait_interval while the status stays the same. Returns a
+        StatusTimer of the time spent in each status.'''
+        deadline = time.time() + timeout
+        timer = StatusTimer()
+        progress = DeployProgress(console)
+        checks = 0
+
+        statuses = None
+        try:
+            # a silent stream is given up after the read timeout and polled instead
+            statuses = self.api.watch_project_status(project_id, timeout=min(timeout, STREAM_READ_TIMEOUT))
+            for status in statuses:
+                if status is not None:
+                    checks += 1
+                    timer.update(status)
+                    if status == 'online':
+                        progress.done(timer)
+                        return timer
+                    progress.update(status)
+                if time.time() >= deadline or (max_retries is not None and checks >= max_retries):
+                    raise exc.DeployFailed()
+        except exc.NotFound:
+            logger.debug('Server does not stream project status. Poll it.')
+        finally:
+            if statuses is not None:
+                statuses.close()
+
+        interval = wait_interval
+        while max_retries is None or checks < max_retries:
+            status = self.api.get_project(project_id)['status']
+            checks += 1
+            if timer.update(status):
+                interval = wait_interval
+            if status == 'online':
+                progress.done(timer)
+                return timer
+            progress.update(status)
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            time.sleep(min(interval, remaining))
+            interval = min(interval * POLL_BACKOFF, MAX_POLL_INTERVAL)
         raise exc.DeployFailed()
 
     def _load_bot(self, target_dir='.'):
+        from bothub_client.clients import NluClientFactory
+
         project_id = self._get_current_project_id()
         event = {
             'sender': {
@@ -369,8 +1066,10 @@ class Cli(object):
         return nlu['credentials']
 
     def push_agent(self):
+        import google.api_core.exceptions
+
         agent_id = self.get_credential('dialogflow')['agent_id']
-        client = dialogflow.AgentsClient()
+        client = self._get_agents_client()
         parent = client.project_path(agent_id)
         response = client.get_agent(parent)
         agent_name = response.display_name
@@ -392,10 +1091,13 @@ class Cli(object):
             raise exc.InvalidYamlFormat()
 
     def pull_agent(self, agent_id=None):
+        import google.auth.exceptions
+        import google.api_core.exceptions
+
         try:
             if not agent_id:
                 agent_id = self.get_credential('dialogflow')['agent_id']
-            client = dialogflow.AgentsClient()
+            client = self._get_agents_client()
             parent = client.project_path(agent_id)
             response = client.get_agent(parent)
             agent_name = response.display_name
@@ -409,13 +1111,18 @@ class Cli(object):
         except google.auth.exceptions.DefaultCredentialsError:
             raise exc.InvalidCredentialPath()
 
+    def _get_agents_client(self):
+        '''Dialogflow pulls in gRPC and protobuf, so import it only when an agent is touched'''
+        import dialogflow
+        return dialogflow.AgentsClient()
+
     def isValidAgentId(self, agent_id):
-        client = dialogflow.AgentsClient()
+        client = self._get_agents_client()
         parent = client.project_path(agent_id)
         response = client.get_agent(parent)
 
     def _upload_agent(self, agent_name, agent_id):
-        client = dialogflow.AgentsClient()
+        client = self._get_agents_client()
         parent = client.project_path(agent_id)
 
         in_file = open(os.path.join("./dialogflow", agent_name + ".zip"), "rb")
@@ -423,7 +1130,7 @@ class Cli(object):
         response = client.restore_agent(parent, agent_content=data)
 
     def _download_agent(self, agent_name, agent_id):
-        client = dialogflow.AgentsClient()
+        client = self._get_agents_client()
         parent = client.project_path(agent_id)
 
         agent_folder = os.path.join("./dialogflow", agent_name)
@@ -480,7 +1187,7 @@ class Cli(object):
         make_etc_yml(agent_folder)
 
     def _get_dialogflow_lang(self, agent_id):
-        client = dialogflow.AgentsClient()
+        client = self._get_agents_client()
         parent = client.project_path(agent_id)
         response = client.get_agent(parent)
         lang = response.default_language_code
@@ -15,6 +15,13 @@ except ImportError:
 from bothub_cli import __version__
 from bothub_cli import lib
 from bothub_cli import utils
+from bothub_cli.analyze import estimate_upload_time
+from bothub_cli.api import Api
+from bothub_cli.api import RetryPolicy
+from bothub_cli.httpcache import get_default_response_cache
+from bothub_cli.layers import DEFAULT_PLATFORM
+from bothub_cli.layers import LayerTarget
+from bothub_cli.watch import DEBOUNCE
 from bothub_cli import exceptions as exc
 
 
@@ -30,6 +37,19 @@ def print_message(msg=''):
     click.echo(msg)
 
 
+def api_retries_option(func):
+    return click.option('--api-retries', type=int, default=None,
+                        help='Retries of a failed idempotent API request')(func)
+
+
+def make_cli(api_retries=None, **kwargs):
+    api = None
+    if api_retries is not None:
+        api = Api(retry_policy=RetryPolicy(max_retries=api_retries),
+                  response_cache=get_default_response_cache())
+    return lib.Cli(api=api, **kwargs)
+
+
 def print_introduction(start_line=0):
     commands = [
         ('bothub configure', '-- Configure an account credential'),
@@ -51,9 +71,12 @@ def print_introduction(start_line=0):
 def cli(ctx, version):
     '''Bothub is a command line tool that configure, init,
     and deploy bot codes to BotHub.Studio service'''
+    # not waited for: a check still running at exit is dropped
+    utils.revalidate_latest_versions()
+
     try:
-        utils.check_latest_version()
-        utils.check_latest_version_sdk()
+        utils.check_latest_version(cache_only=True)
+        utils.check_latest_version_sdk(cache_only=True)
     except exc.NotLatestVersion as ex:
         click.secho(str(ex), fg='yellow')
     except exc.NotLatestVersionSdk as ex:
@@ -76,7 +99,9 @@ def introduction():
 
 
 @cli.command()
-def configure():
+@click.option('--api-base-url', metavar='URL',
+              help='Log in to another API server, for deploys to PROJECT_ID@URL targets')
+def configure(api_base_url):
     '''Setup credentials'''
     try:
         click.echo('Please enter your BotHub.Studio login credentials:')
@@ -84,8 +109,10 @@ def configure():
         password = click.prompt('password', hide_input=True)
         click.secho('Connecting to server...', fg='green')
         lib_cli = lib.Cli()
-        lib_cli.authenticate(username, password)
+        lib_cli.authenticate(username, password, base_url=api_base_url)
         click.secho('Identified. Welcome {}.'.format(username), fg='green')
+        if api_base_url:
+            return
         click.echo('')
         print_introduction(1)
     except exc.CliException as ex:
@@ -141,25 +168,228 @@ def new_project():
     print_introduction(2)
 
 
+def parse_deploy_targets(ctx, param, value):
+    try:
+        return [lib.DeployTarget.parse(spec) for spec in value]
+    except exc.InvalidDeployTarget as ex:
+        raise click.BadParameter(str(ex))
+
+
 @cli.command()
-@click.option('--max-retries', default=30)
-def deploy(max_retries):
+@click.option('--timeout', default=lib.DEPLOY_TIMEOUT, show_default=True,
+              help='Seconds to wait for the project to be online')
+@click.option('--max-retries', type=int, default=None, help='Maximum number of deploy status checks')
+@click.option('--force', is_flag=True, default=False, help='Deploy even if the code is not changed')
+@click.option('--stream', is_flag=True, default=False,
+              help='Upload a dist package while making it, without a dist/bot.tgz file. Dist packages are '
+                   'only sent with --bytecode or to servers which do not take changed files alone')
+@click.option('--format', 'package_format', type=click.Choice(['gzip', 'zstd']), default='gzip',
+              help='Compression of a dist package, see --stream; zstd needs the zstandard package',
+              show_default=True)
+@click.option('--bytecode', metavar='PYTHON',
+              help='Ship .pyc files compiled by the PYTHON interpreter, which must match the bot runtime')
+@click.option('--dependency-layer', is_flag=True, default=False,
+              help='Build wheels of requirements.txt locally and upload them once as a dependency layer')
+@click.option('--layer-python', metavar='VERSION',
+              help='Python version of the bot runtime, like 3.7, to download binary wheels of a dependency layer '
+                   'for; without it, wheels are built by the --bytecode interpreter')
+@click.option('--layer-platform', default=DEFAULT_PLATFORM, show_default=True,
+              help='Platform of the bot runtime to download binary wheels of a dependency layer for')
+@click.option('--minimal', is_flag=True, default=False,
+              help="Deploy only the files in the allow-list made by 'bothub package trace'")
+@click.option('--target', 'targets', multiple=True, metavar='PROJECT_ID[@BASE_URL]', callback=parse_deploy_targets,
+              help='Deploy the code built once to this project instead of the current one; repeat for more')
+@click.option('--watch', 'watch_mode', is_flag=True, default=False,
+              help='Deploy again whenever project files change, until interrupted')
+@click.option('--debounce', type=click.FloatRange(0), default=DEBOUNCE, show_default=True,
+              help='Quiet seconds which end a burst of changes with --watch')
+@click.option('--all', 'deploy_all', is_flag=True, default=False,
+              help='Deploy every project found under --root')
+@click.option('--root', default='.', type=click.Path(exists=True, file_okay=False),
+              help='Directory to look for projects in with --all')
+@click.option('-j', '--jobs', type=click.IntRange(1, lib.MAX_JOBS), default=lib.DEFAULT_JOBS,
+              help='Number of projects to deploy at once with --all', show_default=True)
+@click.option('--timings', 'print_timings', is_flag=True, default=False,
+              help='Print time and bytes of each deploy phase')
+@click.option('--timings-json', type=click.Path(dir_okay=False, writable=True),
+              help='Write time and bytes of each deploy phase to a JSON file')
+@api_retries_option
+def deploy(timeout, max_retries, force, stream, package_format, bytecode, dependency_layer, layer_python,
+           layer_platform, minimal, targets, watch_mode, debounce, deploy_all, root, jobs, print_timings, timings_json,
+           api_retries):
     '''Deploy project'''
+    try:
+        lib_cli = make_cli(api_retries)
+        layer_target = make_layer_target(bytecode, layer_python, layer_platform) if dependency_layer else None
+        options = dict(max_retries=max_retries, force=force, stream=stream,
+                       package_format=package_format, timeout=timeout, bytecode=bytecode,
+                       dependency_layer=layer_target, minimal=minimal)
+        if targets:
+            if deploy_all:
+                raise click.UsageError('--target cannot be used with --all')
+            options['targets'] = targets
+        if watch_mode:
+            if deploy_all:
+                raise click.UsageError('--watch cannot be used with --all')
+            click.secho('Watching for changes. Press Ctrl+C to stop.')
+            try:
+                lib_cli.deploy_watch(console=click.echo, debounce=debounce, **options)
+            except KeyboardInterrupt:
+                click.echo('')
+            return
+        if deploy_all:
+            results = lib_cli.deploy_all(root, jobs=jobs, console=click.echo, **options)
+            print_deploy_results(results)
+            timings = [{'path': r['path'], 'phases': r['timings']} for r in results]
+        elif targets:
+            results = lib_cli.deploy(console=click.echo, **options)
+            print_deploy_results(results)
+            # phases before the fan-out are shared by every target
+            results = [{'path': 'build', 'timings': lib_cli.timings.to_list()}] + results
+            timings = [{'path': r['path'], 'phases': r['timings']} for r in results]
+        else:
+            try:
+                if lib_cli.deploy(console=click.echo, **options) is None:
+                    click.secho('Project is up to date, skipped deploy.', fg='green')
+                else:
+                    click.secho('Project is deployed.', fg='green')
+            finally:
+                timings = lib_cli.timings.to_list() if lib_cli.timings else []
+                results = [{'path': '.', 'timings': timings}]
+
+        if print_timings:
+            for result in results:
+                print_phase_timings(result['path'], result['timings'])
+        if timings_json:
+            with open(timings_json, 'w') as fout:
+                json.dump(timings, fout, indent=2)
+    except exc.CliException as ex:
+        click.secho('{}: {}'.format(ex.__class__.__name__, ex), fg='red')
+
+
+def make_layer_target(bytecode, layer_python, layer_platform):
+    if layer_python:
+        return LayerTarget(python_version=layer_python, platform=layer_platform)
+    if bytecode:
+        return LayerTarget(python=bytecode)
+    raise click.UsageError('--dependency-layer needs the bot runtime: give --layer-python VERSION, '
+                           'or --bytecode PYTHON to build wheels with')
+
+
+def print_phase_timings(path, phases):
+    def size(value):
+        return utils.format_size(value) if value is not None else ''
+
+    data = [['Phase', 'Time', 'In', 'Out', 'Ratio', 'Throughput']]
+    for record in phases:
+        data.append([
+            record['phase'],
+            '{:.2f}s'.format(record['seconds']),
+            size(record['bytes_in']),
+            size(record['bytes_out']),
+            '{:.3f}'.format(record['ratio']) if record['ratio'] is not None else '',
+            size(record['throughput']) + '/s' if record['throughput'] is not None else '',
+        ])
+    data.append(['total', '{:.2f}s'.format(sum(r['seconds'] for r in phases)), '', '', '', ''])
+    table = Table(data)
+    table.title = path
+    click.secho(table.table)
+
+
+def print_deploy_results(results):
+    data = [['Project', 'Status', 'Time', 'Error']]
+    for result in results:
+        data.append([result['path'], result['status'], '{:.1f}s'.format(result['elapsed']), result['error'] or ''])
+    click.secho(Table(data).table)
+
+    counts = dict((status, len([r for r in results if r['status'] == status]))
+                  for status in ('deployed', 'skipped', 'failed'))
+    click.secho('Deployed {deployed}, skipped {skipped}, failed {failed} of {total} projects'.format(
+        total=len(results), **counts), fg='red' if counts['failed'] else 'green')
+
+
+@cli.group()
+def package():
+    '''Inspect dist packages of current project'''
+    pass
+
+
+@package.command(name='analyze')
+@click.option('--top', type=click.IntRange(1), default=10, show_default=True,
+              help='Number of largest directories and files to list')
+@click.option('--bandwidth', type=click.FloatRange(0.001), default=10.0, show_default=True,
+              help='Upload bandwidth in Mbit/s to estimate upload time with')
+def analyze_package(top, bandwidth):
+    '''Report what makes up the dist package of current project'''
+    try:
+        lib_cli = lib.Cli()
+        report = lib_cli.analyze_package()
+        print_package_report(report, top, bandwidth)
+    except exc.CliException as ex:
+        click.secho('{}: {}'.format(ex.__class__.__name__, ex), fg='red')
+
+
+@package.command(name='trace')
+@click.option('--warmup', type=click.File('r'),
+              help='File of messages, one per line, for the bot to handle while tracing')
+def trace_package(warmup):
+    '''Make an allow-list of the files the bot imports or opens'''
     try:
         lib_cli = lib.Cli()
-        lib_cli.deploy(console=click.echo, max_retries=max_retries)
-        click.secho('Project is deployed.', fg='green')
+        messages = [line.rstrip('\n') for line in warmup if line.strip()] if warmup else []
+        allow_list = lib_cli.trace_bundle(messages)
+        for path in allow_list:
+            click.echo(path)
+        click.secho('Saved {} files to {}. Review it before deploying with --minimal.'.format(
+            len(allow_list), lib.ALLOW_LIST_FILE), fg='green')
     except exc.CliException as ex:
         click.secho('{}: {}'.format(ex.__class__.__name__, ex), fg='red')
 
 
+def print_package_report(report, top, bandwidth):
+    def ratio(stat):
+        return '{:.3f}'.format(stat['compressed_size'] / stat['size']) if stat['size'] else ''
+
+    data = [['Directory', 'Files', 'Size', 'Compressed', 'Ratio']]
+    for stat in report['dirs'][:top]:
+        data.append([stat['path'] + '/', stat['files'], utils.format_size(stat['size']),
+                     utils.format_size(stat['compressed_size']), ratio(stat)])
+    table = Table(data)
+    table.title = 'Largest directories'
+    click.secho(table.table)
+
+    data = [['File', 'Size', 'Compressed', 'Ratio', 'Note']]
+    for stat in report['files'][:top]:
+        data.append([stat['path'], utils.format_size(stat['size']), utils.format_size(stat['compressed_size']),
+                     ratio(stat), 'already compressed' if stat['incompressible'] else ''])
+    table = Table(data)
+    table.title = 'Largest files'
+    click.secho(table.table)
+
+    if report['duplicates']:
+        data = [['Files', 'Size', 'Wasted']]
+        for duplicate in report['duplicates'][:top]:
+            data.append(['\n'.join(duplicate['paths']), utils.format_size(duplicate['size']),
+                         utils.format_size(duplicate['wasted'])])
+        table = Table(data)
+        table.title = 'Duplicate files'
+        click.secho(table.table)
+
+    click.secho('{} files, {} raw, {} compressed ({} already compressed)'.format(
+        len(report['files']), utils.format_size(report['size']), utils.format_size(report['compressed_size']),
+        utils.format_size(report['incompressible_size'])))
+    click.secho('Estimated upload time at {:g} Mbit/s: {:.1f}s'.format(
+        bandwidth, estimate_upload_time(report['compressed_size'], bandwidth)))
+
+
 @cli.command()
 @click.argument('project-name')
-def clone(project_name):
+@api_retries_option
+def clone(project_name, api_retries):
     '''Clone existing project'''
 
     try:
-        lib_cli = lib.Cli()
+        lib_cli = make_cli(api_retries)
         lib_cli.clone(project_name, create_dir=True)
         click.secho('Project {} is cloned.'.format(project_name), fg='green')
     except exc.CliException as ex:
@@ -168,10 +398,11 @@ def clone(project_name):
 
 @cli.command()
 @click.option('-l', '--long', count=True)
-def ls(long=False):
+@api_retries_option
+def ls(long=False, api_retries=None):
     '''List projects'''
     try:
-        lib_cli = lib.Cli()
+        lib_cli = make_cli(api_retries)
         projects = lib_cli.ls(long)
         header = ['Project']
         if long:
@@ -186,12 +417,33 @@ def ls(long=False):
 
 @cli.command()
 @click.argument('name')
-def rm(name):
-    '''Delete a project'''
+@click.option('--glob', 'match', flag_value='glob', help='Match NAME as a glob pattern, e.g. "test-*"')
+@click.option('--regex', 'match', flag_value='regex', help='Match NAME as a regular expression')
+@click.option('--dry-run', is_flag=True, default=False, help='List matching projects without deleting them')
+@click.option('-j', '--jobs', type=click.IntRange(1, lib.MAX_JOBS), default=lib.DEFAULT_JOBS,
+              help='Number of projects to delete at once', show_default=True)
+@api_retries_option
+def rm(name, match, dry_run, jobs, api_retries):
+    '''Delete projects by name'''
     try:
-        lib_cli = lib.Cli()
-        lib_cli.rm(name)
-        click.secho('Deleted a project: {}'.format(name))
+        lib_cli = make_cli(api_retries)
+        results = lib_cli.rm(name, match=match or 'exact', dry_run=dry_run, jobs=jobs)
+        if dry_run:
+            click.secho('Would delete {} projects:'.format(len(results)))
+            for result in results:
+                click.secho('  {} ({})'.format(result['name'], result['id']))
+            return
+
+        failures = [r for r in results if not r['deleted']]
+        for result in results:
+            if result['deleted']:
+                click.secho('Deleted a project: {}'.format(result['name']))
+            else:
+                click.secho('Failed to delete a project: {} - {}'.format(result['name'], result['error']), fg='red')
+        if len(results) > 1 or failures:
+            click.secho('Deleted {} of {} projects, {} failed'.format(
+                len(results) - len(failures), len(results), len(failures)),
+                fg='red' if failures else None)
     except exc.CliException as ex:
         click.secho('{}: {}'.format(ex.__class__.__name__, ex), fg='red')
     except ValueError as err:
@@ -490,10 +742,11 @@ def test():
 
 
 @cli.command(name='logs')
-def logs():
+@api_retries_option
+def logs(api_retries):
     '''Show error logs'''
     try:
-        lib_cli = lib.Cli()
+        lib_cli = make_cli(api_retries)
         log_entries = lib_cli.logs()
         for log_entry in log_entries:
             try:
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import json
+import stat
+import time
+import hashlib
+
+from bothub_cli.utils import list_package_files
+
+
+BLOCK_SIZE = 1024 * 1024
+# files modified this close to a snapshot may change again within the same
+# mtime tick, so their digests are not trusted
+RACY_WINDOW_NS = 2 * 10 ** 9
+
+
+def hash_file(path):
+    '''Return the sha256 hex digest of a file content'''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fin:
+        for block in iter(lambda: fin.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_json(path, data):
+    parent_dir = os.path.dirname(path)
+    if parent_dir and not os.path.isdir(parent_dir):
+        os.makedirs(parent_dir)
+    temp_path = '{}.tmp'.format(path)
+    with open(temp_path, 'w') as fout:
+        json.dump(data, fout, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def load_json(path):
+    try:
+        with open(path, 'r') as fin:
+            return json.load(fin)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+class Snapshot(object):
+    '''Stats and digests of packaged files as of the last scan, and the dist
+    package made from them.
+
+    entries maps a path to [size, mtime_ns, inode, digest]; a file whose
+    stat is unchanged keeps its digest without being read again. archive
+    records the stat of the last dist package and the manifest digest it
+    was made for.'''
+
+    def __init__(self, entries=None, archive=None, timestamp=0):
+        self.entries = entries or {}
+        self.archive = archive
+        self.timestamp = timestamp
+
+    @staticmethod
+    def _key(file_stat):
+        return [file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino]
+
+    def get_digest(self, path, file_stat):
+        entry = self.entries.get(path)
+        if not entry or entry[:3] != self._key(file_stat):
+            return None
+        if file_stat.st_mtime_ns >= self.timestamp - RACY_WINDOW_NS:
+            return None
+        return entry[3]
+
+    def is_archive_fresh(self, path, digest, package_format):
+        try:
+            file_stat = os.stat(path)
+        except OSError:
+            return False
+        return self.archive == {
+            'path': path,
+            'stat': self._key(file_stat),
+            'digest': digest,
+            'format': package_format,
+        }
+
+    def set_archive(self, path, digest, package_format):
+        self.archive = {
+            'path': path,
+            'stat': self._key(os.stat(path)),
+            'digest': digest,
+            'format': package_format,
+        }
+
+    @classmethod
+    def load(cls, path):
+        data = load_json(path)
+        if not isinstance(data, dict):
+            return cls()
+        return cls(data.get('entries'), data.get('archive'), data.get('timestamp', 0))
+
+    def save(self, path):
+        save_json(path, {'entries': self.entries, 'archive': self.archive, 'timestamp': self.timestamp})
+
+
+class Manifest(object):
+    '''Content hashes of the files of a bot package.
+
+    files maps a "/"-separated relative path to a dict of its sha256 digest
+    and file mode. The digest of a manifest covers the files, the language,
+    the dependency, its layer key and the bytecode interpreter, so equal
+    digests mean there is nothing to upload.'''
+
+    def __init__(self, files, language=None, dependency=None, project_id=None, sizes=None, bytecode=None,
+                 dependency_layer=None):
+        self.files = files
+        self.language = language
+        self.dependency = dependency
+        self.project_id = project_id
+        self.bytecode = bytecode
+        self.dependency_layer = dependency_layer
+        # file sizes of a scanned manifest, for reporting only
+        self.sizes = sizes or {}
+
+    @classmethod
+    def from_dir(cls, source_dir='.', ignores=None, snapshot=None, paths=None, **kwargs):
+        '''Hash the files to package, or the given paths. With a snapshot,
+        only files whose stat changed are read, and the snapshot is updated
+        to the current files.'''
+        timestamp = int(time.time() * 1e9)
+        if paths is None:
+            paths = list_package_files(source_dir, ignores)
+        files = {}
+        sizes = {}
+        entries = {}
+        for path in paths:
+            file_path = os.path.join(source_dir, path)
+            file_stat = os.stat(file_path)
+            digest = snapshot.get_digest(path, file_stat) if snapshot else None
+            if digest is None:
+                digest = hash_file(file_path)
+            files[path] = {'digest': digest, 'mode': stat.S_IMODE(file_stat.st_mode)}
+            sizes[path] = file_stat.st_size
+            entries[path] = Snapshot._key(file_stat) + [digest]
+        if snapshot is not None:
+            snapshot.entries = entries
+            snapshot.timestamp = timestamp
+        return cls(files, sizes=sizes, **kwargs)
+
+    @property
+    def digest(self):
+        fields = [self.files, self.language, self.dependency]
+        if self.bytecode or self.dependency_layer:
+            fields.append(self.bytecode)
+        if self.dependency_layer:
+            fields.append(self.dependency_layer)
+        content = json.dumps(fields, sort_keys=True)
+        return hashlib.sha256(content.encode('utf8')).hexdigest()
+
+    def get_blobs(self):
+        '''Return a dict of digest to a path of a file with that content'''
+        return dict((entry['digest'], path) for path, entry in sorted(self.files.items()))
+
+    def to_dict(self):
+        return {
+            'project_id': self.project_id,
+            'language': self.language,
+            'dependency': self.dependency,
+            'files': self.files,
+            'bytecode': self.bytecode,
+            'dependency_layer': self.dependency_layer,
+        }
+
+    @classmethod
+    def load(cls, path):
+        '''Load a saved manifest, or return None if there is no valid one'''
+        return cls.from_dict(load_json(path))
+
+    @classmethod
+    def from_dict(cls, data):
+        '''Make a manifest of a dict like to_dict returns, or return None if
+        it is not valid'''
+        try:
+            return cls(data['files'], language=data.get('language'),
+                       dependency=data.get('dependency'), project_id=data.get('project_id'),
+                       bytecode=data.get('bytecode'), dependency_layer=data.get('dependency_layer'))
+        except (KeyError, TypeError, AttributeError):
+            return None
+
+    def save(self, path):
+        save_json(path, self.to_dict())
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import sys
+import logging
+import threading
+import importlib.util
+
+
+logger = logging.getLogger('bothub.cli.trace')
+
+ALLOW_LIST_FILE = '.bothub-allowlist'
+# files a bot package needs whether or not the bot opens them
+ALWAYS_ALLOWED = frozenset(['bothub.yml', 'bothub.yaml', 'requirements.txt'])
+
+_lock = threading.Lock()
+_tracers = []
+_hook_installed = False
+
+
+def _audit(event, args):
+    if event != 'open' or not _tracers or not args or not isinstance(args[0], (str, bytes)):
+        return
+    path = os.fsdecode(args[0])
+    for tracer in list(_tracers):
+        tracer.record(path)
+
+
+class FileTracer(object):
+    '''Record the files under root which are imported or opened while it is
+    active, as "/"-separated paths relative to root.
+
+    Opened files are seen through an "open" audit hook (Python 3.8+), which
+    also sees module sources and .pyc files read by imports; a .pyc file is
+    recorded as its source. Modules imported while tracing are recorded by
+    their __file__ as well, which is all that is seen without audit hooks.
+    Audit hooks cannot be removed, so one hook is installed per process and
+    does nothing while no tracer is active.'''
+
+    def __init__(self, root='.'):
+        self.root = os.path.abspath(root)
+        self.paths = set()
+        self._modules = None
+
+    def record(self, path):
+        path = os.path.abspath(path)
+        if os.path.basename(os.path.dirname(path)) == '__pycache__' and path.endswith('.pyc'):
+            try:
+                path = importlib.util.source_from_cache(path)
+            except ValueError:
+                return
+        relative_path = os.path.relpath(path, self.root)
+        if relative_path.split(os.sep)[0] in (os.curdir, os.pardir):
+            return
+        self.paths.add(relative_path.replace(os.sep, '/'))
+
+    def __enter__(self):
+        global _hook_installed
+        with _lock:
+            if not _hook_installed and hasattr(sys, 'addaudithook'):
+                sys.addaudithook(_audit)
+                _hook_installed = True
+            _tracers.append(self)
+        self._modules = set(sys.modules)
+        return self
+
+    def __exit__(self, *args):
+        with _lock:
+            _tracers.remove(self)
+        for name in set(sys.modules) - self._modules:
+            module_file = getattr(sys.modules[name], '__file__', None)
+            if module_file:
+                self.record(module_file)
+
+
+def make_allow_list(traced, package_files):
+    '''Return the package files a bot needs: the traced ones and the
+    project files in ALWAYS_ALLOWED, in package order'''
+    return [path for path in package_files if path in traced or path in ALWAYS_ALLOWED]
+
+
+def save_allow_list(path, allow_list):
+    with open(path, 'w') as fout:
+        fout.write('# Files of the minimal bot package, made by "bothub package trace".\n')
+        fout.write('# Review it, and add files the warm-up did not touch.\n')
+        for item in allow_list:
+            fout.write('{}\n'.format(item))
+
+
+def load_allow_list(path):
+    '''Return the set of paths of an allow-list file'''
+    with open(path) as fin:
+        lines = [line.strip() for line in fin]
+    return set(line for line in lines if line and not line.startswith('#'))
@@ -5,16 +5,20 @@ from __future__ import (absolute_import, division, print_function, unicode_liter
 import os
 import re
 import sys
+import fnmatch
 import time
+import threading
 from datetime import datetime
 from datetime import timedelta
 import yaml
 import requests
 import tarfile
-import pathspec
 import json
 import shutil
-from ruamel.yaml import YAML
+import tempfile
+import subprocess
+
+from six.moves import queue
 
 from bothub_cli import __version__
 from bothub_client import __version__ as sdk_version
@@ -23,6 +27,8 @@ from bothub_cli import template
 
 PYPI_VERSION_PATTERN = re.compile(r'bothub_cli-(.+?)-py2.py3-none-any.whl')
 PYPI_VERSION_PATTERN_SDK = re.compile(r'bothub-(.+?)-py2.py3-none-any.whl')
+# seconds before a failed PyPI version check is tried again
+FAILED_VERSION_CHECK_TTL = 600
 PACKAGE_IGNORE_PATTERN = [
     re.compile('.bothub-meta'),
     re.compile('dist'),
@@ -32,13 +38,17 @@ PACKAGE_IGNORE_PATTERN = [
 
 
 class Cache(object):
+    _lock = threading.Lock()
+
     def __init__(self, path=None):
         self.cache_path = path or os.path.expanduser(os.path.join('~', '.bothub', 'caches.yml'))
         parent_path = os.path.dirname(self.cache_path)
         if not os.path.isdir(parent_path):
             os.makedirs(parent_path)
 
-    def get(self, key):
+    def get(self, key, allow_stale=False):
+        '''Return a cached value, or None if it is missing or expired.
+        With allow_stale, an expired value is returned as well.'''
         if not os.path.isfile(self.cache_path):
             return None
         content = read_content_from_file(self.cache_path)
@@ -47,22 +57,25 @@ class Cache(object):
             return None
         entry = cache_entry[key]
         now = datetime.now()
-        if now > entry['expires']:
+        if now > entry['expires'] and not allow_stale:
             return None
         return entry['value']
 
     def set(self, key, value, ttl=3600):
-        if not os.path.isfile(self.cache_path):
-            cache_obj = {}
-        else:
-            content = read_content_from_file(self.cache_path)
-            cache_obj = yaml.load(content)
-            if not cache_obj:
+        with self._lock:
+            if not os.path.isfile(self.cache_path):
                 cache_obj = {}
-        cache_entry = cache_obj.setdefault(key, {})
-        cache_entry['value'] = value
-        cache_entry['expires'] = datetime.now() + timedelta(seconds=ttl)
-        write_content_to_file(self.cache_path, yaml.dump(cache_obj, default_flow_style=False))
+            else:
+                content = read_content_from_file(self.cache_path)
+                cache_obj = yaml.load(content)
+                if not cache_obj:
+                    cache_obj = {}
+            cache_entry = cache_obj.setdefault(key, {})
+            cache_entry['value'] = value
+            cache_entry['expires'] = datetime.now() + timedelta(seconds=ttl)
+            temp_path = '{}.{}.tmp'.format(self.cache_path, os.getpid())
+            write_content_to_file(temp_path, yaml.dump(cache_obj, default_flow_style=False))
+            os.replace(temp_path, self.cache_path)
 
 
 def safe_mkdir(path):
@@ -102,34 +115,84 @@ def get_latest_version(versions):
     return sorted_versions[0]
 
 
-def get_latest_version_from_pypi(use_cache=True, cache=None, sdk=False):
-    catch_label = 'latest_pypi_version'
-    url = 'https://pypi.python.org/simple/bothub-cli'
+def _get_pypi_version_source(sdk=False):
     if sdk:
-        catch_label = 'sdk_latest_pypi_version'
-        url = 'https://pypi.python.org/simple/bothub'
+        return 'sdk_latest_pypi_version', 'https://pypi.python.org/simple/bothub'
+    return 'latest_pypi_version', 'https://pypi.python.org/simple/bothub-cli'
 
-    try:
-        if use_cache:
-            _cache = cache or Cache()
-            latest_version = _cache.get(catch_label)
-            if latest_version:
-                return latest_version
 
+def fetch_latest_version_from_pypi(sdk=False):
+    _, url = _get_pypi_version_source(sdk)
+    try:
         response = requests.get(url, timeout=2)
         content = response.content.decode('utf8')
         versions = find_versions(content, sdk)
-        latest_version = get_latest_version(versions)
-        if use_cache:
-            _cache.set(catch_label, latest_version)
-        return latest_version
+        return get_latest_version(versions)
     except requests.exceptions.Timeout:
         raise exc.Timeout()
 
 
-def check_latest_version():
+def get_latest_version_from_pypi(use_cache=True, cache=None, sdk=False):
+    cache_label, _ = _get_pypi_version_source(sdk)
+    if use_cache:
+        _cache = cache or Cache()
+        latest_version = _cache.get(cache_label)
+        if latest_version:
+            return latest_version
+
+    latest_version = fetch_latest_version_from_pypi(sdk)
+    if use_cache:
+        _cache.set(cache_label, latest_version)
+    return latest_version
+
+
+def get_cached_latest_version(cache=None, sdk=False):
+    '''Return the last known PyPI version, even if its cache entry is stale'''
+    cache_label, _ = _get_pypi_version_source(sdk)
+    _cache = cache or Cache()
+    return _cache.get(cache_label, allow_stale=True)
+
+
+def _revalidate_latest_version(cache, sdk):
+    cache_label, _ = _get_pypi_version_source(sdk)
     try:
-        pypi_version = get_latest_version_from_pypi()
+        cache.set(cache_label, fetch_latest_version_from_pypi(sdk))
+    except (exc.Timeout, requests.exceptions.RequestException, ValueError, IndexError):
+        cache.set('{}_failed'.format(cache_label), True, ttl=FAILED_VERSION_CHECK_TTL)
+
+
+def revalidate_latest_versions(cache=None):
+    '''Refresh missing or expired PyPI version entries of the CLI and the SDK
+    concurrently on daemon threads and return the started threads. A failed
+    check is not retried for FAILED_VERSION_CHECK_TTL seconds.'''
+    _cache = cache or Cache()
+    threads = []
+    for sdk in (False, True):
+        cache_label, _ = _get_pypi_version_source(sdk)
+        if _cache.get(cache_label) or _cache.get('{}_failed'.format(cache_label)):
+            continue
+        thread = threading.Thread(target=_revalidate_latest_version, args=(_cache, sdk))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def join_threads(threads, timeout):
+    '''Wait for threads to finish, sharing a single timeout among them'''
+    deadline = time.time() + timeout
+    for thread in threads:
+        thread.join(max(deadline - time.time(), 0))
+
+
+def check_latest_version(cache_only=False):
+    try:
+        if cache_only:
+            pypi_version = get_cached_latest_version()
+        else:
+            pypi_version = get_latest_version_from_pypi()
+        if not pypi_version:
+            return
         is_latest = cmp_versions(__version__, pypi_version) >= 0
         if not is_latest:
             raise exc.NotLatestVersion(__version__, pypi_version)
@@ -137,9 +200,14 @@ def check_latest_version():
     except exc.Timeout:
         pass
 
-def check_latest_version_sdk():
+def check_latest_version_sdk(cache_only=False):
     try:
-        pypi_version = get_latest_version_from_pypi(sdk=True)
+        if cache_only:
+            pypi_version = get_cached_latest_version(sdk=True)
+        else:
+            pypi_version = get_latest_version_from_pypi(sdk=True)
+        if not pypi_version:
+            return
         is_latest = cmp_versions(sdk_version, pypi_version) >= 0
         if not is_latest:
             raise exc.NotLatestVersionSdk(sdk_version, pypi_version)
@@ -152,40 +220,273 @@ def timestamp(dt=None):
     return int(time.mktime(dt.timetuple()))
 
 
+class IgnoreMatcher(object):
+    '''Match "/"-separated relative paths to leave out of a dist package.
+
+    Patterns are compiled once into a single regex. A directory is matched
+    as its path with a trailing "/", so ignored directories are pruned
+    without descending into them; like git, files under an ignored
+    directory cannot be re-included.'''
+
+    def __init__(self, regex=None, spec=None):
+        self.regex = regex
+        self.spec = spec
+
+    @classmethod
+    def from_regexes(cls, regexes):
+        pattern = '|'.join('(?:{})'.format(regex.pattern) for regex in regexes)
+        return cls(regex=re.compile(pattern or '(?!)'))
+
+    @classmethod
+    def from_ignore_file(cls, path='.bothubignore'):
+        import pathspec
+
+        with open(path, 'r') as fh:
+            spec = pathspec.PathSpec.from_lines('gitignore', fh)
+        patterns = [p for p in spec.patterns if p.include is not None]
+        # negated patterns need last-match-wins, which a single regex can't express
+        if all(p.include for p in patterns):
+            try:
+                return cls.from_regexes([p.regex for p in patterns])
+            except re.error:
+                pass
+        return cls(spec=spec)
+
+    def match_file(self, path):
+        if self.spec is not None:
+            return self.spec.match_file(path)
+        return self.regex.match(path) is not None
+
+    def match_dir(self, path):
+        return self.match_file(path + '/')
+
+
+DEFAULT_IGNORE_MATCHER = IgnoreMatcher.from_regexes(PACKAGE_IGNORE_PATTERN)
+
+
 def check_ignore_pattern(name):
-    for pattern in PACKAGE_IGNORE_PATTERN:
-        if pattern.match(name):
-            raise exc.IgnorePatternMatched()
+    if DEFAULT_IGNORE_MATCHER.match_file(name):
+        raise exc.IgnorePatternMatched()
+
+
+def list_package_files(source_dir='.', ignores=None):
+    '''List files to package as sorted "/"-separated paths relative to source_dir.
+    With ignores, files are matched against .bothubignore, or ignores itself
+    if it is an IgnoreMatcher, instead of the default ignore patterns. The
+    dist and .bothub-meta dirs are never included. Symlinked dirs are
+    followed unless they link to a dir above them.'''
+    if isinstance(ignores, IgnoreMatcher):
+        matcher = ignores
+    else:
+        matcher = IgnoreMatcher.from_ignore_file() if ignores else DEFAULT_IGNORE_MATCHER
+
+    result = []
+    # real paths of each dir to walk and its parents, to stop at symlink cycles
+    parents = {source_dir: frozenset([os.path.realpath(source_dir)])}
+    for dirname, dirnames, filenames in os.walk(source_dir, followlinks=True):
+        reldir = os.path.relpath(dirname, source_dir)
+        prefix = '' if reldir == '.' else '/'.join(reldir.split(os.sep)) + '/'
+        dirnames[:] = [
+            d for d in dirnames
+            if not (prefix == '' and d in ('dist', '.bothub-meta')) and not matcher.match_dir(prefix + d)
+        ]
+        seen = parents.pop(dirname)
+        for d in list(dirnames):
+            path = os.path.join(dirname, d)
+            realpath = os.path.realpath(path)
+            if realpath in seen:
+                dirnames.remove(d)
+            else:
+                parents[path] = seen | frozenset([realpath])
+        result.extend(prefix + f for f in filenames if not matcher.match_file(prefix + f))
+    return sorted(result)
+
+
+PROJECT_CONFIG_FILES = ('bothub.yml', 'bothub.yaml')
+PROJECT_SEARCH_SKIP_DIRS = ('node_modules', 'venv', 'env', 'dist', '__pycache__')
+
+
+def find_projects(root='.'):
+    '''Return sorted dirs under root with a project config, without looking
+    into projects, hidden dirs or virtualenv and build dirs'''
+    result = []
+    for dirname, dirnames, filenames in os.walk(root):
+        if any(name in filenames for name in PROJECT_CONFIG_FILES):
+            result.append(dirname)
+            dirnames[:] = []
+            continue
+        dirnames[:] = [d for d in dirnames if not d.startswith('.') and d not in PROJECT_SEARCH_SKIP_DIRS]
+    return sorted(result)
 
 
-def make_dist_package(dist_file_path, source_dir='.', ignores=None):
+def make_dist_package(dist_file_path, source_dir='.', ignores=None, files=None,
+                      package_format='gzip', workers=None, bytecode=None):
     '''Make dist package file of current project directory.
     Includes all files of current dir, bothub dir and tests dir.
-    Dist file is compressed with tar+gzip.'''
+    Dist file is compressed with tar+gzip on all cores, or with zstd.
+    With bytecode, the path of a python interpreter, the package also
+    carries hash-based .pyc files of the modules compiled by it.'''
+    from bothub_cli.compress import open_compressor
+
     if os.path.isfile(dist_file_path):
         os.remove(dist_file_path)
 
-    if ignores:
-        with open('.bothubignore', 'r') as fh:
-            spec = pathspec.PathSpec.from_lines('gitignore', fh)
-            
-        with tarfile.open(dist_file_path, 'w:gz') as tout:
-            for dirname, dirnames, filenames in os.walk(source_dir):
-                for filename in filenames:
-                    file = os.path.join(dirname, filename)
-                    if not spec.match_file(file):
-                        tout.add(file)
-    else:
-        with tarfile.open(dist_file_path, 'w:gz') as tout:
-            for fname in os.listdir(source_dir):
-                try:
-                    check_ignore_pattern(fname)
-                    if os.path.isfile(fname):
-                        tout.add(fname)
-                    elif os.path.isdir(fname):
-                        tout.add(fname)
-                except exc.IgnorePatternMatched:
-                    pass
+    if files is None:
+        files = list_package_files(source_dir, ignores)
+
+    bytecode_dir = tempfile.mkdtemp(prefix='bothub-bytecode') if bytecode else None
+    try:
+        bytecode_files = compile_bytecode(source_dir, files, bytecode_dir, bytecode) if bytecode else []
+        with open(dist_file_path, 'wb') as fout:
+            with open_compressor(fout, package_format, workers) as compressor:
+                _write_tar(compressor, source_dir, files, bytecode_dir, bytecode_files)
+    finally:
+        if bytecode_dir:
+            shutil.rmtree(bytecode_dir, ignore_errors=True)
+
+
+def _write_tar(fileobj, source_dir, files, bytecode_dir=None, bytecode_files=()):
+    with tarfile.open(fileobj=fileobj, mode='w|') as tout:
+        for path in files:
+            tout.add(os.path.join(source_dir, path), arcname=path)
+        for path in bytecode_files:
+            tarinfo = tout.gettarinfo(os.path.join(bytecode_dir, path), arcname=path)
+            # hash-based .pyc files do not depend on mtime, so pin it
+            tarinfo.mtime = 0
+            with open(os.path.join(bytecode_dir, path), 'rb') as fin:
+                tout.addfile(tarinfo, fin)
+
+
+COMPILE_BYTECODE_SCRIPT = '''
+import os, sys, json, py_compile, importlib.util
+source_dir, target_dir = sys.argv[1:3]
+result = []
+for path in json.load(sys.stdin):
+    cfile = importlib.util.cache_from_source(path)
+    py_compile.compile(os.path.join(source_dir, path), os.path.join(target_dir, cfile), dfile=path,
+                       doraise=True, invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH)
+    result.append(cfile.replace(os.sep, '/'))
+json.dump(result, sys.stdout)
+'''
+
+
+def compile_bytecode(source_dir, files, target_dir, python=None):
+    '''Compile the .py files among files into target_dir with a python
+    interpreter, sys.executable by default, as the version of the bot
+    runtime must match it. .pyc files are checked-hash based (PEP 552), so
+    they are reproducible and stay valid after extraction. Returns their
+    "/"-separated paths relative to target_dir.'''
+    python = python or sys.executable
+    modules = [path for path in files if path.endswith('.py')]
+    if not modules:
+        return []
+    try:
+        process = subprocess.Popen([python, '-c', COMPILE_BYTECODE_SCRIPT, source_dir, target_dir],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as ex:
+        raise exc.BytecodeCompileFailed(python, ex)
+    stdout, stderr = process.communicate(json.dumps(modules).encode('utf8'))
+    if process.returncode != 0:
+        lines = stderr.decode('utf8', 'replace').strip().splitlines()
+        raise exc.BytecodeCompileFailed(python, lines[-1] if lines else process.returncode)
+    return json.loads(stdout.decode('utf8'))
+
+
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_MAX_CHUNKS = 16
+
+
+class ChunkPipe(object):
+    '''A file-like sink whose written bytes are read back as an iterator of
+    chunks from another thread. At most max_chunks chunks are buffered, so
+    a writer blocks until the reader catches up. error is the exception
+    a writer failed with, if any.'''
+
+    def __init__(self, chunk_size=STREAM_CHUNK_SIZE, max_chunks=STREAM_MAX_CHUNKS):
+        self.chunk_size = chunk_size
+        self.queue = queue.Queue(max_chunks)
+        self.buffer = bytearray()
+        self.aborted = False
+        self.error = None
+
+    def _put(self, item):
+        while True:
+            if self.aborted:
+                raise IOError('Reader of the stream is gone')
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.chunk_size:
+            self._put(bytes(self.buffer[:self.chunk_size]))
+            del self.buffer[:self.chunk_size]
+        return len(data)
+
+    def close(self):
+        if self.buffer:
+            self._put(bytes(self.buffer))
+            del self.buffer[:]
+        self._put(None)
+
+    def fail(self, error):
+        self.error = error
+        try:
+            self._put(error)
+        except IOError:
+            pass
+
+    def __iter__(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.aborted = True
+
+
+def stream_dist_package(source_dir='.', ignores=None, files=None, package_format='gzip', workers=None,
+                        chunk_size=STREAM_CHUNK_SIZE, max_chunks=STREAM_MAX_CHUNKS, bytecode=None):
+    '''Make a dist package like make_dist_package on a background thread and
+    return a ChunkPipe to iterate its bytes from. Packaging runs while the
+    chunks are consumed, and memory use is bounded by chunk_size *
+    max_chunks. A packaging error is raised by the iteration and kept in
+    the error of the pipe.'''
+    from bothub_cli.compress import open_compressor
+
+    if files is None:
+        files = list_package_files(source_dir, ignores)
+    bytecode_dir = tempfile.mkdtemp(prefix='bothub-bytecode') if bytecode else None
+    try:
+        bytecode_files = compile_bytecode(source_dir, files, bytecode_dir, bytecode) if bytecode else []
+    except Exception:
+        shutil.rmtree(bytecode_dir, ignore_errors=True)
+        raise
+    pipe = ChunkPipe(chunk_size, max_chunks)
+    compressor = open_compressor(pipe, package_format, workers)
+
+    def produce():
+        try:
+            with compressor:
+                _write_tar(compressor, source_dir, files, bytecode_dir, bytecode_files)
+            pipe.close()
+        except Exception as ex:
+            pipe.fail(ex)
+        finally:
+            if bytecode_dir:
+                shutil.rmtree(bytecode_dir, ignore_errors=True)
+
+    thread = threading.Thread(target=produce)
+    thread.daemon = True
+    thread.start()
+    return pipe
 
 
 def extract_dist_package(dist_file_path, target_dir=None):
@@ -220,6 +521,15 @@ def make_event(message):
     return data
 
 
+def format_size(size):
+    '''Format a number of bytes in B, KB, MB or GB'''
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return '{:.1f} {}'.format(size, unit) if unit != 'B' else '{} B'.format(int(size))
+        size /= 1024.0
+    return '{:.1f} GB'.format(size)
+
+
 def tabulate_dict(lst, *fields):
     result = [None] * len(lst)
     for row_idx, row in enumerate(lst):
@@ -230,6 +540,21 @@ def tabulate_dict(lst, *fields):
     return result
 
 
+def make_name_matcher(pattern, match='exact'):
+    '''Return a function matching a whole name with an exact name, a glob
+    pattern or a regular expression. Raises InvalidNamePattern for an
+    invalid regular expression.'''
+    if match == 'glob':
+        return lambda name: fnmatch.fnmatchcase(name, pattern)
+    if match == 'regex':
+        try:
+            regex = re.compile('(?:{})\\Z'.format(pattern))
+        except re.error as ex:
+            raise exc.InvalidNamePattern(pattern, ex)
+        return lambda name: regex.match(name) is not None
+    return lambda name: name == pattern
+
+
 def get_bot_class(target_dir='.'):
     try:
         sys.path.append(target_dir)
@@ -292,6 +617,8 @@ def make_etc_json(agent_folder):
 
 
 def make_intents_yml(agent_folder, lang):
+    from ruamel.yaml import YAML
+
     path = os.path.join(agent_folder, "intents")
     intent_dic = {}
 
@@ -321,6 +648,8 @@ def make_intents_yml(agent_folder, lang):
 
 
 def make_entities_yml(agent_folder, lang):
+    from ruamel.yaml import YAML
+
     path = os.path.join(agent_folder, "entities")
     try:
         entity_dic = {}
@@ -350,6 +679,8 @@ def make_entities_yml(agent_folder, lang):
 
 
 def make_etc_yml(agent_folder):
+    from ruamel.yaml import YAML
+
     agent_file = os.path.join(agent_folder, "agent.json")
     package_file = os.path.join(agent_folder, "package.json")
 
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import time
+import errno
+import select
+import struct
+import logging
+import threading
+
+from bothub_cli.utils import DEFAULT_IGNORE_MATCHER
+from bothub_cli.utils import list_package_files
+
+
+logger = logging.getLogger('bothub.cli.watch')
+
+DEBOUNCE = 0.5
+POLL_INTERVAL = 1.0
+# longest a watch loop blocks before checking whether it should stop
+WAIT_SLICE = 0.5
+# longest a stopped watch waits for the deploy in flight
+CLOSE_TIMEOUT = 30
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+# made by deploys themselves, so changes there must not trigger one
+GENERATED_DIRS = frozenset(['dist', '.bothub-meta'])
+
+
+def _is_generated(path):
+    return path.split('/', 1)[0] in GENERATED_DIRS
+
+
+def _load_libc():
+    # ctypes is only loaded when a watch starts, not on every CLI start
+    import ctypes.util
+
+    name = ctypes.util.find_library('c')
+    if not name:
+        return None
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, 'inotify_init1'):
+        return None
+    return libc
+
+
+def _get_errno():
+    import ctypes
+    return ctypes.get_errno()
+
+
+class InotifyWatcher(object):
+    '''Watch a source tree for changes with Linux inotify.
+
+    Every directory which is not ignored gets a watch, and directories made
+    later get one as they appear. wait returns the "/"-separated paths of
+    files changed since the last call, or an empty set after timeout.'''
+
+    def __init__(self, root='.', ignores=None, libc=None):
+        self.root = root
+        self.ignores = ignores or DEFAULT_IGNORE_MATCHER
+        self.libc = libc or _load_libc()
+        if self.libc is None:
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(_get_errno(), 'inotify_init1 failed')
+        self.dirs = {}
+        self._add_tree('')
+
+    def _add_watch(self, path):
+        full_path = os.path.join(self.root, path) if path else self.root
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(full_path), WATCH_MASK)
+        if wd < 0:
+            logger.debug('Cannot watch %s: %s', full_path, os.strerror(_get_errno()))
+            return
+        self.dirs[wd] = path
+
+    def _add_tree(self, path):
+        self._add_watch(path)
+        top = os.path.join(self.root, path) if path else self.root
+        for dirpath, dirnames, _ in os.walk(top):
+            relative_dir = os.path.relpath(dirpath, self.root).replace(os.sep, '/')
+            relative_dir = '' if relative_dir == '.' else relative_dir
+            kept = []
+            for dirname in dirnames:
+                dir_path = '{}/{}'.format(relative_dir, dirname) if relative_dir else dirname
+                if _is_generated(dir_path) or self.ignores.match_dir(dir_path):
+                    continue
+                kept.append(dirname)
+                self._add_watch(dir_path)
+            dirnames[:] = kept
+
+    def _read_events(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as ex:
+            if ex.errno == errno.EAGAIN:
+                return set()
+            raise
+        changes = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                changes.add('')
+                continue
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            parent = self.dirs.get(wd)
+            if parent is None or not name:
+                continue
+            path = '{}/{}'.format(parent, name) if parent else name
+            if _is_generated(path):
+                continue
+            if mask & IN_ISDIR:
+                if self.ignores.match_dir(path):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(path)
+            elif self.ignores.match_file(path):
+                continue
+            changes.add(path)
+        return changes
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.time())
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                return set()
+            changes = self._read_events()
+            if changes:
+                return changes
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher(object):
+    '''Watch a source tree for changes by comparing stats of its package
+    files every interval seconds, where inotify is not available'''
+
+    def __init__(self, root='.', ignores=None, interval=POLL_INTERVAL, sleep=time.sleep):
+        self.root = root
+        self.ignores = ignores
+        self.interval = interval
+        self.sleep = sleep
+        self.stats = self._scan()
+
+    def _scan(self):
+        stats = {}
+        for path in list_package_files(self.root, self.ignores):
+            try:
+                file_stat = os.stat(os.path.join(self.root, path))
+            except OSError:
+                continue
+            stats[path] = (file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino)
+        return stats
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            stats = self._scan()
+            changes = set(path for path in set(stats) | set(self.stats) if stats.get(path) != self.stats.get(path))
+            self.stats = stats
+            if changes:
+                return changes
+            if deadline is not None and time.time() >= deadline:
+                return set()
+            self.sleep(self.interval if deadline is None else min(self.interval, max(0, deadline - time.time())))
+
+    def close(self):
+        pass
+
+
+def make_watcher(root='.', ignores=None, poll_interval=POLL_INTERVAL):
+    '''Return an inotify watcher of root, or a polling one without inotify'''
+    try:
+        return InotifyWatcher(root, ignores)
+    except OSError as ex:
+        logger.debug('Poll for changes: %s', ex)
+        return PollingWatcher(root, ignores, poll_interval)
+
+
+def watch_changes(watcher, on_change, debounce=DEBOUNCE, stop=None):
+    '''Call on_change with the set of changed paths after each burst of
+    changes, once the tree has been quiet for debounce seconds, until the
+    stop event is set'''
+    while stop is None or not stop.is_set():
+        changes = watcher.wait(WAIT_SLICE)
+        if not changes:
+            continue
+        while True:
+            more = watcher.wait(debounce)
+            if not more:
+                break
+            changes |= more
+        on_change(changes)
+
+
+class DeployQueue(object):
+    '''Run deploys on a worker thread, one at a time.
+
+    A request while a deploy is running queues one more deploy, and further
+    requests coalesce into that queued one, so at most one deploy is in
+    flight and one is waiting. Exceptions of a deploy are passed to
+    on_error and do not stop the queue.'''
+
+    def __init__(self, deploy, on_error=None):
+        self.deploy = deploy
+        self.on_error = on_error
+        self.condition = threading.Condition()
+        self.queued = False
+        self.running = False
+        self.closed = False
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def request(self):
+        with self.condition:
+            self.queued = True
+            self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.queued and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                self.queued = False
+                self.running = True
+            try:
+                self.deploy()
+            except Exception as ex:
+                if self.on_error:
+                    self.on_error(ex)
+                else:
+                    logger.exception('Deploy failed')
+            finally:
+                with self.condition:
+                    self.running = False
+                    self.condition.notify_all()
+
+    def wait_idle(self, timeout=None):
+        '''Wait until no deploy is running or queued. Returns whether it is idle.'''
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while self.queued or self.running:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        '''Stop after the running deploy, dropping a queued one. Returns
+        whether the worker stopped within timeout.'''
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
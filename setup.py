@@ -41,7 +41,13 @@ setup(
         'pathspec',
         'dialogflow',
         'ruamel.yaml',
+        'futures; python_version < "3"',
     ],
+    extras_require={
+        'orjson': ['orjson'],
+        'async': ['aiohttp'],
+        'zstd': ['zstandard'],
+    },
     setup_requires=[
         'pytest-runner',
     ],
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import re
+import json
+import hashlib
+import threading
+
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+
+
+class StubRequest(object):
+    def __init__(self, method, path, headers, body, match):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+        self.match = match
+
+    def json(self):
+        return json.loads(self.body.decode('utf8'))
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def _make_handler(server):
+    class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+        wbufsize = -1
+
+        def setup(self):
+            BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+            with server.lock:
+                server.connections += 1
+
+        def log_message(self, *args):
+            pass
+
+        def _read_body(self):
+            if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                chunks = []
+                while True:
+                    size = int(self.rfile.readline().strip(), 16)
+                    if size == 0:
+                        self.rfile.readline()
+                        break
+                    chunks.append(self.rfile.read(size))
+                    self.rfile.readline()
+                return b''.join(chunks)
+            length = int(self.headers.get('Content-Length') or 0)
+            return self.rfile.read(length) if length else b''
+
+        def _dispatch(self):
+            body = self._read_body()
+            path = self.path.split('?')[0]
+            for method, pattern, handler in server.routes:
+                match = pattern.match(path)
+                if method == self.command and match:
+                    break
+            else:
+                return self._respond(404, {'cause': 'no such route'})
+            request = StubRequest(self.command, self.path, self.headers, body, match)
+            with server.lock:
+                server.requests.append(request)
+            result = handler(request)
+            self._respond(*result)
+
+        def _respond(self, status, body=None, headers=None):
+            headers = dict(headers or {})
+            if hasattr(body, '__next__') or hasattr(body, 'next'):
+                return self._respond_stream(status, body, headers)
+            if isinstance(body, bytes):
+                payload = body
+            elif body is None:
+                payload = b''
+            else:
+                payload = json.dumps(body).encode('utf8')
+                headers.setdefault('Content-Type', 'application/json')
+            if self.headers.get('Connection', '').lower() == 'close':
+                headers['Connection'] = 'close'
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(payload)
+            self.wfile.flush()
+
+        def _respond_stream(self, status, chunks, headers):
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for chunk in chunks:
+                self.wfile.write('{:x}\r\n'.format(len(chunk)).encode('ascii') + chunk + b'\r\n')
+                self.wfile.flush()
+            self.wfile.write(b'0\r\n\r\n')
+            self.wfile.flush()
+
+        do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _dispatch
+
+    return StubHandler
+
+
+class StubServer(object):
+    '''A local HTTP/1.1 server standing in for the BotHub.Studio API.
+
+    Handlers take a StubRequest and return (status, body[, headers]). A dict
+    body is sent as JSON, bytes as is, and an iterator of bytes as a chunked
+    stream.'''
+
+    def __init__(self):
+        self.routes = []
+        self.requests = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.httpd = _ThreadingHTTPServer(('127.0.0.1', 0), _make_handler(self))
+        self.thread = threading.Thread(target=self.httpd.serve_forever, kwargs={'poll_interval': 0.05})
+        self.thread.daemon = True
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:{}/api'.format(self.httpd.server_address[1])
+
+    def route(self, method, path, handler):
+        pattern = re.compile('^/api{}$'.format(path))
+        self.routes.append((method.upper(), pattern, handler))
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class StubBotStore(object):
+    '''Receiving side of bot deploys on a StubServer.
+
+    Stores content-addressed blobs and committed manifests per project, and
+    reports every project online. With incremental=False, only whole dist
+    package uploads are supported, like servers before incremental deploys.
+    Dist packages in formats other than those in formats are answered 415.
+    With chunked, dist packages can also be uploaded in chunks through upload
+    sessions; the indexes in fail_chunks are answered 400 once each. With
+    layers, dependency layers are stored by key.'''
+
+    def __init__(self, server, incremental=True, formats=('gzip', 'zstd'), chunked=True, layers=True):
+        self.formats = formats
+        self.blobs = {}
+        self.manifests = {}
+        self.uploads = {}
+        self.sessions = {}
+        self.packages = {}
+        self.fail_chunks = set()
+        self.layers = {}
+        server.route('GET', r'/projects/(\d+)', self.get_project)
+        server.route('POST', r'/projects/(\d+)/bot', self.upload_code)
+        if incremental:
+            server.route('POST', r'/projects/(\d+)/bot/blobs/missing', self.get_missing_blobs)
+            server.route('PUT', r'/projects/(\d+)/bot/blobs/([0-9a-f]{64})', self.put_blob)
+            server.route('POST', r'/projects/(\d+)/bot/manifest', self.commit_manifest)
+            server.route('GET', r'/projects/(\d+)/bot/manifest', self.get_manifest)
+        if chunked:
+            server.route('POST', r'/projects/(\d+)/bot/uploads', self.start_upload)
+            server.route('GET', r'/projects/(\d+)/bot/uploads/(\w+)', self.get_upload)
+            server.route('PUT', r'/projects/(\d+)/bot/uploads/(\w+)/chunks/(\d+)', self.put_chunk)
+            server.route('POST', r'/projects/(\d+)/bot/uploads/(\w+)/complete', self.complete_upload)
+        if layers:
+            server.route('GET', r'/dependency-layers/([0-9a-f]{64})', self.get_layer)
+            server.route('PUT', r'/dependency-layers/([0-9a-f]{64})', self.put_layer)
+
+    def get_project(self, request):
+        return 200, {'data': {'id': int(request.match.group(1)), 'status': 'online'}}
+
+    def upload_code(self, request):
+        match = re.search(br'name="format"\r\n\r\n(\w+)\r\n', request.body)
+        package_format = match.group(1).decode('ascii') if match else 'gzip'
+        if package_format not in self.formats:
+            return 415, {'cause': 'unsupported format: {}'.format(package_format)}
+        self.uploads[int(request.match.group(1))] = request.body
+        return 200, {'data': True}
+
+    def _session_data(self, upload_id):
+        session = self.sessions[upload_id]
+        return {'data': {'id': upload_id, 'digest': session['digest'], 'chunk_size': session['chunk_size'],
+                         'received': sorted(session['chunks'])}}
+
+    def start_upload(self, request):
+        data = request.json()
+        if data.get('format', 'gzip') not in self.formats:
+            return 415, {'cause': 'unsupported format: {}'.format(data['format'])}
+        upload_id = 'u{}'.format(len(self.sessions) + 1)
+        self.sessions[upload_id] = dict(data, project_id=int(request.match.group(1)), chunks={})
+        return 200, self._session_data(upload_id)
+
+    def get_upload(self, request):
+        upload_id = request.match.group(2)
+        if upload_id not in self.sessions:
+            return 404, {'cause': 'no such upload'}
+        return 200, self._session_data(upload_id)
+
+    def put_chunk(self, request):
+        upload_id, index = request.match.group(2), int(request.match.group(3))
+        if index in self.fail_chunks:
+            self.fail_chunks.discard(index)
+            return 400, {'cause': 'interrupted'}
+        if hashlib.sha256(request.body).hexdigest() != request.headers.get('X-Chunk-Sha256'):
+            return 400, {'cause': 'digest mismatch'}
+        self.sessions[upload_id]['chunks'][index] = request.body
+        return 200, {'data': True}
+
+    def complete_upload(self, request):
+        session = self.sessions[request.match.group(2)]
+        chunks = session['chunks']
+        package = b''.join(chunks[index] for index in sorted(chunks))
+        if len(package) != session['size'] or hashlib.sha256(package).hexdigest() != session['digest']:
+            return 400, {'cause': 'package is incomplete'}
+        self.packages[session['project_id']] = package
+        return 200, {'data': True}
+
+    def get_missing_blobs(self, request):
+        blobs = self.blobs.setdefault(int(request.match.group(1)), {})
+        return 200, {'data': [d for d in request.json()['digests'] if d not in blobs]}
+
+    def put_blob(self, request):
+        project_id, digest = int(request.match.group(1)), request.match.group(2)
+        if hashlib.sha256(request.body).hexdigest() != digest:
+            return 400, {'cause': 'digest mismatch'}
+        self.blobs.setdefault(project_id, {})[digest] = request.body
+        return 200, {'data': True}
+
+    def commit_manifest(self, request):
+        project_id = int(request.match.group(1))
+        manifest = request.json()
+        blobs = self.blobs.get(project_id, {})
+        missing = [p for p, entry in manifest['files'].items() if entry['digest'] not in blobs]
+        if missing:
+            return 400, {'cause': 'missing blobs: {}'.format(', '.join(missing))}
+        self.manifests[project_id] = manifest
+        return 200, {'data': True}
+
+    def get_manifest(self, request):
+        project_id = int(request.match.group(1))
+        if project_id not in self.manifests:
+            return 404, {'cause': 'no manifest'}
+        return 200, {'data': self.manifests[project_id]}
+
+    def get_layer(self, request):
+        key = request.match.group(1)
+        if key not in self.layers:
+            return 404, {'cause': 'no such layer'}
+        return 200, {'data': {'key': key, 'size': len(self.layers[key])}}
+
+    def put_layer(self, request):
+        if hashlib.sha256(request.body).hexdigest() != request.headers.get('X-Content-Sha256'):
+            return 400, {'cause': 'digest mismatch'}
+        self.layers[request.match.group(1)] = request.body
+        return 200, {'data': True}
+
+    def get_files(self, project_id):
+        '''Return the committed bot code of a project as a dict of path to content'''
+        blobs = self.blobs[project_id]
+        files = self.manifests[project_id]['files']
+        return dict((path, blobs[entry['digest']]) for path, entry in files.items())
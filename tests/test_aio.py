@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import io
+import time
+import asyncio
+import threading
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from bothub_cli import exceptions as exc
+from bothub_cli.aio import AsyncApi
+from bothub_cli.api import RetryPolicy
+from .stubserver import StubServer
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def fixture_api(server, **kwargs):
+    return AsyncApi(base_url=server.base_url, auth_token='testtoken', verify_token_expire=False, **kwargs)
+
+
+def test_list_projects_should_return_data():
+    with StubServer() as server:
+        server.route('GET', '/users/self/projects', lambda request: (200, {'data': [{'id': 1}]}))
+
+        async def scenario():
+            async with fixture_api(server) as api:
+                return await api.list_projects()
+
+        assert run(scenario()) == [{'id': 1}]
+        assert server.requests[0].headers['Authorization'] == 'Bearer testtoken'
+
+
+def test_create_project_should_send_json():
+    with StubServer() as server:
+        server.route('POST', '/projects', lambda request: (201, {'data': request.json()}))
+
+        async def scenario():
+            async with fixture_api(server) as api:
+                return await api.create_project('testproject', '')
+
+        assert run(scenario()) == {'name': 'testproject', 'short_name': 'testproject', 'description': ''}
+
+
+def test_upload_code_should_send_multipart_form():
+    with StubServer() as server:
+        server.route('POST', r'/projects/(\d+)/bot', lambda request: (200, {'data': True}))
+
+        async def scenario():
+            async with fixture_api(server) as api:
+                return await api.upload_code(3, 'python3', io.BytesIO(b'tgzcontent'), 'bothub')
+
+        assert run(scenario()) is True
+        body = server.requests[0].body
+        assert b'tgzcontent' in body
+        assert b'python3' in body
+        assert b'name="dependency"' in body
+
+
+def test_errors_should_map_like_sync_api():
+    with StubServer() as server:
+        server.route('GET', r'/projects/(\d+)', lambda request: (404, {'cause': 'not found'}))
+        server.route('POST', '/projects', lambda request: (409, {'cause': 'duplicated'}))
+        server.route('GET', r'/projects/(\d+)/channels', lambda request: (401, {'cause': 'expired'}))
+
+        async def scenario():
+            async with fixture_api(server) as api:
+                with pytest.raises(exc.ProjectIdNotFound):
+                    await api.get_project(3)
+                with pytest.raises(exc.ProjectNameDuplicated):
+                    await api.create_project('testproject', '')
+                with pytest.raises(exc.InvalidCredential):
+                    await api.get_project_channels(3)
+
+        run(scenario())
+
+
+def test_requests_should_be_retried_on_5xx():
+    responses = [(502, {'cause': 'bad gateway'}), (200, {'data': {'id': 3}})]
+    with StubServer() as server:
+        server.route('GET', r'/projects/(\d+)', lambda request: responses.pop(0))
+
+        async def scenario():
+            policy = RetryPolicy(backoff_factor=0)
+            async with fixture_api(server, retry_policy=policy) as api:
+                project = await api.get_project(3)
+                return project, api.request_retries[-1][2]
+
+        assert run(scenario()) == ({'id': 3}, 1)
+
+
+def test_concurrency_should_be_bounded():
+    lock = threading.Lock()
+    state = {'in_flight': 0, 'max_in_flight': 0}
+
+    def slow_handler(request):
+        with lock:
+            state['in_flight'] += 1
+            state['max_in_flight'] = max(state['max_in_flight'], state['in_flight'])
+        time.sleep(0.05)
+        with lock:
+            state['in_flight'] -= 1
+        return 200, {'data': {'id': int(request.match.group(1))}}
+
+    with StubServer() as server:
+        server.route('GET', r'/projects/(\d+)', slow_handler)
+
+        async def scenario():
+            async with fixture_api(server, max_concurrency=3) as api:
+                return await asyncio.gather(*[api.get_project(index) for index in range(12)])
+
+        projects = run(scenario())
+        assert [p['id'] for p in projects] == list(range(12))
+        assert state['max_in_flight'] == 3
+
+
+def test_backoff_should_not_hold_a_concurrency_slot():
+    responses = [(503, {'cause': 'busy'}, {'Retry-After': '0.3'}), (200, {'data': {'id': 1}})]
+
+    def get_project(request):
+        if request.match.group(1) == '1':
+            return responses.pop(0)
+        return 200, {'data': {'id': 2}}
+
+    with StubServer() as server:
+        server.route('GET', r'/projects/(\d+)', get_project)
+
+        async def scenario():
+            async with fixture_api(server, max_concurrency=1) as api:
+                first = asyncio.ensure_future(api.get_project(1))
+                await asyncio.sleep(0.1)
+                second = await api.get_project(2)
+                return second, first.done(), await first
+
+        assert run(scenario()) == ({'id': 2}, False, {'id': 1})
+        paths = [request.path for request in server.requests]
+        assert paths == ['/api/projects/1', '/api/projects/2', '/api/projects/1']
+
+
+def test_connection_error_should_record_retries():
+    async def scenario():
+        api = AsyncApi(base_url='http://127.0.0.1:1/api', auth_token='testtoken', verify_token_expire=False,
+                       retry_policy=RetryPolicy(max_retries=1, backoff_factor=0))
+        async with api:
+            with pytest.raises(aiohttp.ClientConnectionError):
+                await api.get_project(3)
+            return api.request_retries[-1]
+
+    assert run(scenario()) == ('get', 'http://127.0.0.1:1/api/projects/3', 1)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import shutil
+
+from bothub_cli.analyze import analyze_package
+from bothub_cli.analyze import estimate_upload_time
+
+from .testutils import make_tree
+
+SOURCE_DIR = os.path.join('test_result', 'src')
+
+
+def teardown_function():
+    shutil.rmtree('test_result', ignore_errors=True)
+
+
+def test_analyze_package_should_measure_files_and_dirs():
+    random = os.urandom(64 * 1024)
+    source_dir = make_tree(SOURCE_DIR, {
+        'bot.py': b'print(1)\n' * 1000,
+        'data/model.bin': random,
+        'data/nested/words.txt': b'hello world ' * 1000,
+        'dist/bot.tgz': b'old package',
+        'lib/__pycache__/a.pyc': b'pyc',
+    })
+    report = analyze_package(source_dir, workers=2)
+    assert sorted(f['path'] for f in report['files']) == ['bot.py', 'data/model.bin', 'data/nested/words.txt']
+    assert report['size'] == 9000 + 64 * 1024 + 12000
+    assert report['compressed_size'] == sum(f['compressed_size'] for f in report['files'])
+
+    model = report['files'][0]
+    assert model['path'] == 'data/model.bin'
+    assert model['incompressible']
+    assert report['incompressible_size'] == 64 * 1024
+    assert not any(f['incompressible'] for f in report['files'][1:])
+
+    dirs = dict((d['path'], d) for d in report['dirs'])
+    assert sorted(dirs) == ['data', 'data/nested']
+    assert dirs['data']['files'] == 2
+    assert dirs['data']['size'] == 64 * 1024 + 12000
+    assert report['duplicates'] == []
+
+
+def test_analyze_package_should_find_duplicate_files():
+    source_dir = make_tree(SOURCE_DIR, {'a/x.json': b'{"a": 1}', 'b/x.json': b'{"a": 1}', 'c.json': b'{"a": 1}',
+                                     'd.json': b'{}'})
+    report = analyze_package(source_dir)
+    [duplicate] = report['duplicates']
+    assert duplicate['paths'] == ['a/x.json', 'b/x.json', 'c.json']
+    assert duplicate['size'] == 8
+    files = dict((f['path'], f) for f in report['files'])
+    assert duplicate['wasted'] == 2 * files['c.json']['compressed_size']
+
+
+def test_estimate_upload_time_should_convert_megabits():
+    assert estimate_upload_time(10 * 1000 * 1000, 8) == 10
@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 
 import os
+
+import pytest
+
+from bothub_cli import exceptions as exc
 from bothub_cli.api import Api
+from bothub_cli.api import iter_events
 from .testutils import MockResponse
 from .testutils import MockTransport
+from .stubserver import StubServer
+from .stubserver import StubBotStore
 
 
 def fixture_api():
@@ -319,3 +326,93 @@ def test_get_project_execution_logs_should_construct_request():
             'headers': {'Authorization': 'Bearer testtoken'}
         }
     )
+
+
+def test_upload_code_stream_should_send_chunked_multipart():
+    with StubServer() as server:
+        server.route('POST', r'/projects/(\d+)/bot', lambda request: (200, {'data': True}))
+        api = Api(base_url=server.base_url, auth_token='testtoken', verify_token_expire=False)
+        response = api.upload_code_stream(1, 'python3', iter([b'tgz', b'content']), 'bothub')
+        assert response is True
+
+        request = server.requests[0]
+        assert request.headers['Transfer-Encoding'] == 'chunked'
+        boundary = request.headers['Content-Type'].split('boundary=')[1]
+        parts = request.body.split('--{}'.format(boundary).encode('ascii'))
+        assert parts[0] == b'' and parts[-1] == b'--\r\n'
+        assert parts[1].endswith(b'name="language"\r\n\r\npython3\r\n')
+        assert parts[2].endswith(b'name="dependency"\r\n\r\nbothub\r\n')
+        assert b'filename="bot.tgz"' in parts[3]
+        assert parts[3].endswith(b'\r\n\r\ntgzcontent\r\n')
+
+
+def fixture_package_file(size):
+    if not os.path.isdir('test_result'):
+        os.makedirs('test_result')
+    path = os.path.join('test_result', 'bot.tgz')
+    with open(path, 'wb') as fout:
+        fout.write(os.urandom(size))
+    with open(path, 'rb') as fin:
+        return path, fin.read()
+
+
+def test_upload_code_chunked_should_upload_chunks_in_a_session():
+    with StubServer() as server:
+        store = StubBotStore(server)
+        api = Api(base_url=server.base_url, auth_token='testtoken', verify_token_expire=False)
+        path, content = fixture_package_file(10 * 1024 + 1)
+        sessions = []
+        response = api.upload_code_chunked(1, 'python3', path, 'bothub', chunk_size=1024, jobs=4,
+                                           on_start=sessions.append)
+        assert response is True
+        assert store.packages[1] == content
+        assert [s['id'] for s in sessions] == ['u1']
+        assert len([r for r in server.requests if r.method == 'PUT']) == 11
+
+
+def test_upload_code_chunked_should_resume_interrupted_session():
+    with StubServer() as server:
+        store = StubBotStore(server)
+        api = Api(base_url=server.base_url, auth_token='testtoken', verify_token_expire=False)
+        path, content = fixture_package_file(4 * 1024)
+        store.fail_chunks.add(2)
+        sessions = []
+        with pytest.raises(exc.CliException):
+            api.upload_code_chunked(1, 'python3', path, chunk_size=1024, jobs=1, on_start=sessions.append)
+        assert 1 not in store.packages
+
+        del server.requests[:]
+        api.upload_code_chunked(1, 'python3', path, chunk_size=1024, upload_id=sessions[0]['id'])
+        assert store.packages[1] == content
+        puts = [r.path for r in server.requests if r.method == 'PUT']
+        assert puts == ['/api/projects/1/bot/uploads/u1/chunks/2']
+
+
+def test_upload_code_chunked_should_start_new_session_for_changed_package():
+    with StubServer() as server:
+        store = StubBotStore(server)
+        api = Api(base_url=server.base_url, auth_token='testtoken', verify_token_expire=False)
+        fixture_package_file(2048)
+        store.fail_chunks.add(1)
+        with pytest.raises(exc.CliException):
+            api.upload_code_chunked(1, 'python3', os.path.join('test_result', 'bot.tgz'), chunk_size=1024, jobs=1)
+
+        path, content = fixture_package_file(2048)
+        api.upload_code_chunked(1, 'python3', path, chunk_size=1024, upload_id='u1')
+        assert sorted(store.sessions) == ['u1', 'u2']
+        assert store.packages[1] == content
+
+
+def test_upload_code_chunked_should_fall_back_to_single_post():
+    with StubServer() as server:
+        store = StubBotStore(server, chunked=False)
+        api = Api(base_url=server.base_url, auth_token='testtoken', verify_token_expire=False)
+        path, content = fixture_package_file(4096)
+        assert api.upload_code_chunked(1, 'python3', path, chunk_size=1024) is True
+        assert content in store.uploads[1]
+        assert store.packages == {}
+
+
+def test_iter_events_should_join_data_lines_of_each_event():
+    lines = [': keep-alive', '', 'event: status', 'data: {"status":', 'data: "online"}', '', 'data: x']
+    assert list(iter_events(lines)) == [None, '{"status":\n"online"}']
@@ -8,12 +8,19 @@ import logging
 from datetime import datetime
 
 import pytest
+import requests
 
 from bothub_cli import exceptions as exc
 from bothub_cli.api import ApiBase
+from bothub_cli.api import Api
+from bothub_cli.api import RetryPolicy
+from bothub_cli.api import ApiResponse
+from bothub_cli.api import DEFAULT_MAX_RETRIES
+from bothub_cli.api import get_default_retry_policy
 from bothub_cli.utils import timestamp
 from .testutils import MockTransport
 from .testutils import MockResponse
+from .stubserver import StubServer
 
 
 def test_send_request_should_invoke_function():
@@ -114,3 +121,211 @@ def test_check_response_should_raise_exception_with_4xx():
 def test_get_auth_headers_should_returns_bearer_header():
     base = ApiBase(auth_token='testtoken', verify_token_expire=False)
     assert base._get_auth_headers() == {'Authorization': 'Bearer testtoken'}
+
+
+def test_api_base_should_own_pooled_session():
+    base = ApiBase(pool_connections=2, pool_maxsize=3, pool_block=True)
+    assert isinstance(base.transport, requests.Session)
+    adapter = base.transport.get_adapter('https://api.bothub.studio/api')
+    assert adapter._pool_connections == 2
+    assert adapter._pool_maxsize == 3
+    assert adapter._pool_block is True
+
+
+def test_reserve_connections_should_only_grow_the_pool():
+    base = ApiBase(pool_maxsize=3)
+    base.reserve_connections(2)
+    assert base.transport.get_adapter('https://api.bothub.studio/api')._pool_maxsize == 3
+    base.reserve_connections(16)
+    assert base.transport.get_adapter('https://api.bothub.studio/api')._pool_maxsize == 16
+    assert base.transport.get_adapter('http://127.0.0.1/api')._pool_maxsize == 16
+
+
+def fixture_stub_server():
+    server = StubServer()
+    server.route('GET', '/users/self/projects', lambda request: (200, {'data': []}))
+    return server
+
+
+def test_api_should_reuse_connection_between_calls():
+    with fixture_stub_server() as server:
+        api = Api(base_url=server.base_url, auth_token='testtoken', verify_token_expire=False)
+        for _ in range(3):
+            assert api.list_projects() == []
+        api.close()
+        assert server.connections == 1
+
+
+def test_api_should_reconnect_each_call_without_keep_alive():
+    with fixture_stub_server() as server:
+        api = Api(base_url=server.base_url, auth_token='testtoken', verify_token_expire=False,
+                  keep_alive=False)
+        for _ in range(3):
+            assert api.list_projects() == []
+        api.close()
+        assert server.connections == 3
+
+
+class FailingTransport(MockTransport):
+    def __init__(self, failures):
+        super(FailingTransport, self).__init__()
+        self.failures = failures
+
+    def get(self, *args, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            self.called.append(('get', args, kwargs))
+            raise requests.exceptions.ConnectionError('connection reset')
+        return super(FailingTransport, self).get(*args, **kwargs)
+
+
+def fixture_retry_policy(max_retries=3):
+    slept = []
+    return slept, RetryPolicy(max_retries=max_retries, sleep=slept.append)
+
+
+def test_send_request_should_retry_idempotent_request_on_5xx():
+    transport = MockTransport()
+    transport.record(MockResponse('', status_code=502))
+    transport.record(MockResponse('', status_code=429))
+    transport.record(MockResponse({'data': True}))
+    slept, policy = fixture_retry_policy()
+    base = ApiBase(transport=transport, retry_policy=policy)
+    response = base._send_request('/projects')
+    assert response.status_code == 200
+    assert len(transport.called) == 3
+    assert len(slept) == 2
+    assert base.request_retries[-1] == ('get', '/projects', 2)
+
+
+def test_send_request_should_not_retry_non_idempotent_request():
+    transport = MockTransport()
+    transport.record(MockResponse('', status_code=502))
+    slept, policy = fixture_retry_policy()
+    base = ApiBase(transport=transport, retry_policy=policy)
+    response = base._send_request('/projects', method='post')
+    assert response.status_code == 502
+    assert slept == []
+    assert base.request_retries[-1] == ('post', '/projects', 0)
+
+
+def test_send_request_should_retry_request_marked_idempotent():
+    transport = MockTransport()
+    transport.record(MockResponse('', status_code=503))
+    transport.record(MockResponse('', status_code=201))
+    slept, policy = fixture_retry_policy()
+    base = ApiBase(transport=transport, retry_policy=policy)
+    response = base._send_request('/projects/1/bot', method='post', idempotent=True)
+    assert response.status_code == 201
+    assert len(slept) == 1
+
+
+def test_send_request_should_give_up_after_max_retries():
+    transport = MockTransport()
+    for _ in range(3):
+        transport.record(MockResponse('', status_code=500))
+    slept, policy = fixture_retry_policy(max_retries=2)
+    base = ApiBase(transport=transport, retry_policy=policy)
+    response = base._send_request('/projects')
+    assert response.status_code == 500
+    assert len(transport.called) == 3
+
+
+def test_send_request_should_retry_connection_error():
+    transport = FailingTransport(failures=2)
+    transport.record(MockResponse({'data': True}))
+    slept, policy = fixture_retry_policy()
+    base = ApiBase(transport=transport, retry_policy=policy)
+    assert base._send_request('/projects').status_code == 200
+    assert len(slept) == 2
+
+    transport = FailingTransport(failures=4)
+    base = ApiBase(transport=transport, retry_policy=policy)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        base._send_request('/projects')
+    assert base.request_retries[-1] == ('get', '/projects', 3)
+
+
+def test_default_retry_policy_should_ignore_invalid_max_retries(monkeypatch, caplog):
+    monkeypatch.setenv('BOTHUB_API_MAX_RETRIES', '5')
+    assert get_default_retry_policy().max_retries == 5
+    monkeypatch.setenv('BOTHUB_API_MAX_RETRIES', 'many')
+    with caplog.at_level(logging.WARNING, logger='bothub.cli.api'):
+        assert get_default_retry_policy().max_retries == DEFAULT_MAX_RETRIES
+    assert 'BOTHUB_API_MAX_RETRIES' in caplog.text
+
+
+def test_send_request_should_honour_retry_after():
+    transport = MockTransport()
+    transport.record(MockResponse('', status_code=429, headers={'Retry-After': '7'}))
+    transport.record(MockResponse({'data': True}))
+    slept, policy = fixture_retry_policy()
+    base = ApiBase(transport=transport, retry_policy=policy)
+    base._send_request('/projects')
+    assert slept == [7]
+
+
+def test_retry_policy_backoff_should_grow_exponentially_within_cap():
+    policy = RetryPolicy(backoff_factor=1, max_backoff=5)
+    for retries in range(6):
+        backoff = policy.get_backoff(retries)
+        assert 0 <= backoff <= min(5, 2 ** retries)
+
+
+def test_check_auth_token_expired_should_decode_token_once(monkeypatch):
+    decoded = []
+    decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        decoded.append(args[0])
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(jwt, 'decode', counting_decode)
+    auth_token = jwt.encode({'exp': timestamp()+10}, key='testkey')
+    base = Api(auth_token=auth_token)
+    for _ in range(3):
+        base._get_auth_headers()
+    assert len(decoded) == 1
+
+    new_auth_token = jwt.encode({'exp': timestamp()-10}, key='testkey')
+    base.load_auth({'auth_token': new_auth_token})
+    with pytest.raises(exc.AuthTokenExpired):
+        base._get_auth_headers()
+    assert len(decoded) == 2
+
+    base.load_auth({'auth_token': new_auth_token})
+    with pytest.raises(exc.AuthTokenExpired):
+        base._check_auth_token_expired()
+    assert len(decoded) == 2
+
+
+class CountingResponse(object):
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+        self.parsed = 0
+
+    def json(self):
+        self.parsed += 1
+        raise AssertionError('body should be parsed by the codec')
+
+
+def test_api_response_should_parse_body_once():
+    response = ApiResponse(CountingResponse(b'{"data": {"id": 1}, "cause": "none"}'))
+    assert response.data == {'id': 1}
+    assert response.body['cause'] == 'none'
+    assert response.json() is response.body
+    assert response.response.parsed == 0
+
+
+def test_check_response_should_tolerate_non_json_error_body():
+    base = ApiBase()
+    with pytest.raises(exc.CliException):
+        base._check_response(CountingResponse(b'<html>Bad Gateway</html>', status_code=502))
+    assert base._get_response_cause(CountingResponse(b'')) is None
+
+
+def test_data_should_raise_value_error_on_non_json_success_body():
+    for content in [b'<html>Login</html>', b'']:
+        with pytest.raises(ValueError):
+            ApiResponse(CountingResponse(content, status_code=200)).data
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import pytest
+
+from bothub_cli import codec
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+requires_orjson = pytest.mark.skipif(orjson is None, reason='orjson is not installed')
+CODEC_NAMES = ['json', pytest.param('orjson', marks=requires_orjson)]
+
+
+@pytest.mark.parametrize('name', CODEC_NAMES)
+def test_codec_should_roundtrip_payload(name):
+    _codec = codec.make_codec(name)
+    payload = {'data': [{'id': 1, 'name': u'봇', 'online': True, 'score': None}]}
+    encoded = _codec.dumps(payload)
+    assert isinstance(encoded, bytes)
+    assert _codec.loads(encoded) == payload
+    assert _codec.loads(encoded.decode('utf8')) == payload
+
+
+@pytest.mark.parametrize('name', CODEC_NAMES)
+def test_codec_loads_should_raise_value_error_on_invalid_content(name):
+    with pytest.raises(ValueError):
+        codec.make_codec(name).loads(b'<html>Bad Gateway</html>')
+
+
+def test_make_codec_should_follow_environment(monkeypatch):
+    monkeypatch.setenv('BOTHUB_JSON_BACKEND', 'json')
+    assert codec.make_codec().name == 'json'
+
+
+@requires_orjson
+def test_make_codec_should_prefer_orjson(monkeypatch):
+    monkeypatch.delenv('BOTHUB_JSON_BACKEND', raising=False)
+    assert codec.make_codec().name == 'orjson'
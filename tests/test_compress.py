@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import io
+import os
+import gzip
+import shutil
+import tarfile
+import subprocess
+
+import pytest
+
+from bothub_cli import compress
+from bothub_cli import exceptions as exc
+from bothub_cli.utils import make_dist_package
+
+from .testutils import make_tree
+
+
+def teardown_function():
+    shutil.rmtree('test_result', ignore_errors=True)
+
+
+def fixture_content(size):
+    words = [os.urandom(4).hex() for _ in range(256)]
+    return ' '.join(words[index % 251] + words[index % 13] for index in range(size // 18)).encode('ascii')
+
+
+def compress_gzip(content, **kwargs):
+    output = io.BytesIO()
+    with compress.ParallelGzipWriter(output, **kwargs) as writer:
+        for offset in range(0, len(content), 10000):
+            writer.write(content[offset:offset + 10000])
+    return output.getvalue()
+
+
+def test_parallel_gzip_writer_should_make_standard_gzip():
+    content = fixture_content(1024 * 1024)
+    compressed = compress_gzip(content, block_size=64 * 1024, workers=4)
+    assert gzip.decompress(compressed) == content
+    assert len(compressed) < len(content) / 2
+
+
+def test_parallel_gzip_writer_should_handle_empty_content():
+    assert gzip.decompress(compress_gzip(b'')) == b''
+
+
+def test_parallel_gzip_writer_output_should_be_read_by_gunzip():
+    if not shutil.which('gzip'):
+        pytest.skip('gzip is not installed')
+    content = fixture_content(300 * 1024)
+    process = subprocess.run(['gzip', '-dc'], input=compress_gzip(content, block_size=32 * 1024),
+                             stdout=subprocess.PIPE, check=True)
+    assert process.stdout == content
+
+
+def fixture_source_dir():
+    return make_tree(os.path.join('test_result', 'src'), {'bot.py': b'print(1)'})
+
+
+def test_make_dist_package_should_make_zstd_tar():
+    zstandard = pytest.importorskip('zstandard')
+    dist_file_path = os.path.join('test_result', 'bot.tar.zst')
+    make_dist_package(dist_file_path, fixture_source_dir(), package_format='zstd')
+    with open(dist_file_path, 'rb') as fin:
+        content = zstandard.ZstdDecompressor().stream_reader(fin).read()
+    with tarfile.open(fileobj=io.BytesIO(content)) as tin:
+        assert tin.extractfile('bot.py').read() == b'print(1)'
+
+
+def test_check_format_should_reject_unknown_format():
+    with pytest.raises(exc.PackageFormatNotSupported):
+        compress.check_format('bzip2')
@@ -5,6 +5,8 @@ from __future__ import (absolute_import, division, print_function, unicode_liter
 import os
 import codecs
 import shutil
+
+import yaml
 from bothub_cli.config import ConfigBase
 from bothub_cli.config import ProjectMeta
 
@@ -96,6 +98,53 @@ def test_config_del_should_remove_entry():
     assert 'auth_token' not in config
 
 
+def fixture_counting_yaml_load(monkeypatch):
+    loaded = []
+    load = yaml.load
+
+    def counting_load(*args, **kwargs):
+        loaded.append(args)
+        return load(*args, **kwargs)
+
+    monkeypatch.setattr(yaml, 'load', counting_load)
+    return loaded
+
+
+def test_config_load_should_parse_unchanged_file_once(monkeypatch):
+    config = fixture_config('test3.yml')
+    config.set('auth_token', 'testtoken')
+    config.save()
+    loaded = fixture_counting_yaml_load(monkeypatch)
+
+    for _ in range(3):
+        config.load()
+    assert loaded == []
+    assert config['auth_token'] == 'testtoken'
+
+
+def test_config_load_should_parse_changed_file_again(monkeypatch):
+    config = fixture_config('test3.yml')
+    config.save()
+    loaded = fixture_counting_yaml_load(monkeypatch)
+
+    with codecs.open(config.path, 'wb', encoding='utf8') as fout:
+        fout.write('auth_token: newtoken')
+    config.load()
+    config.load()
+    assert len(loaded) == 1
+    assert config['auth_token'] == 'newtoken'
+
+
+def test_config_load_should_discard_unsaved_changes():
+    config = fixture_config('test3.yml')
+    config.set('auth_token', 'testtoken')
+    config.save()
+
+    config.set('auth_token', 'unsaved')
+    config.load()
+    assert config['auth_token'] == 'testtoken'
+
+
 def test_migrate_should_move_some_entries():
     project_meta_path = os.path.join('test_result', 'test_lib_project_meta.yml')
     project_meta = ProjectMeta(project_meta_path)
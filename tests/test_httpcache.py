@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import time
+import shutil
+
+from bothub_cli.api import Api
+from bothub_cli.httpcache import ResponseCache
+from .stubserver import StubServer
+
+
+CACHE_DIR = os.path.join('test_result', 'http-cache')
+
+
+def setup_function():
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+
+def teardown_function():
+    shutil.rmtree('test_result', ignore_errors=True)
+
+
+def test_set_should_store_entry_with_validators():
+    cache = ResponseCache(CACHE_DIR)
+    cache.set('https://a.com/projects', 'token', {'ETag': '"v1"'}, b'{"data": []}')
+    entry = cache.get('https://a.com/projects', 'token')
+    assert entry == {'etag': '"v1"', 'last_modified': None, 'content': b'{"data": []}'}
+
+
+def test_set_should_skip_response_without_validators():
+    cache = ResponseCache(CACHE_DIR)
+    cache.set('https://a.com/projects', 'token', {}, b'{"data": []}')
+    assert cache.get('https://a.com/projects', 'token') is None
+
+
+def test_entries_should_be_separated_by_token_and_never_store_it():
+    cache = ResponseCache(CACHE_DIR)
+    cache.set('https://a.com/projects', 'secrettoken', {'ETag': '"v1"'}, b'{}')
+    assert cache.get('https://a.com/projects', 'othertoken') is None
+    for name in os.listdir(CACHE_DIR):
+        with open(os.path.join(CACHE_DIR, name), 'rb') as fin:
+            assert b'secrettoken' not in fin.read()
+
+
+def test_entries_should_be_compressed():
+    cache = ResponseCache(CACHE_DIR)
+    content = b'{"data": [' + b'{"name": "bot", "status": "online"},' * 1000 + b'{}]}'
+    cache.set('https://a.com/projects', 'token', {'ETag': '"v1"'}, content)
+    sizes = [os.path.getsize(os.path.join(CACHE_DIR, name)) for name in os.listdir(CACHE_DIR)]
+    assert sizes[0] < len(content) / 10
+
+
+def test_evict_should_remove_least_recently_used_entries():
+    cache = ResponseCache(CACHE_DIR, max_size=3500)
+    content = os.urandom(1000)
+    for index in range(3):
+        cache.set('https://a.com/{}'.format(index), 'token', {'ETag': '"v1"'}, content)
+        past = time.time() - 100 + index
+        os.utime(cache._get_entry_path('https://a.com/{}'.format(index), 'token'), (past, past))
+    cache.get('https://a.com/0', 'token')
+    cache.set('https://a.com/3', 'token', {'ETag': '"v1"'}, content)
+
+    assert cache.get('https://a.com/0', 'token') is not None
+    assert cache.get('https://a.com/1', 'token') is None
+    assert cache.get('https://a.com/2', 'token') is not None
+    assert cache.get('https://a.com/3', 'token') is not None
+
+
+def test_set_should_scan_the_directory_only_over_the_limit(monkeypatch):
+    cache = ResponseCache(CACHE_DIR, max_size=3500)
+    content = os.urandom(1000)
+    scans = []
+    listdir = os.listdir
+    monkeypatch.setattr(os, 'listdir', lambda path: scans.append(path) or listdir(path))
+    for index in range(3):
+        cache.set('https://a.com/{}'.format(index), 'token', {'ETag': '"v1"'}, content)
+    cache.set('https://a.com/0', 'token', {'ETag': '"v2"'}, content)
+    assert len(scans) == 1
+
+    cache.set('https://a.com/3', 'token', {'ETag': '"v1"'}, content)
+    assert len(scans) == 2
+    assert cache.size <= 3500
+
+
+def test_api_should_revalidate_cached_response():
+    def get_projects(request):
+        if request.headers.get('If-None-Match') == '"v1"':
+            return 304, None, {'ETag': '"v1"'}
+        return 200, {'data': [{'id': 1, 'name': 'mybot'}]}, {'ETag': '"v1"'}
+
+    with StubServer() as server:
+        server.route('GET', '/users/self/projects', get_projects)
+        api = Api(base_url=server.base_url, auth_token='testtoken', verify_token_expire=False,
+                  response_cache=ResponseCache(CACHE_DIR))
+        assert api.list_projects() == [{'id': 1, 'name': 'mybot'}]
+        assert api.list_projects() == [{'id': 1, 'name': 'mybot'}]
+        api.close()
+
+        assert 'If-None-Match' not in server.requests[0].headers
+        assert server.requests[1].headers['If-None-Match'] == '"v1"'
+
+
+def test_api_should_replace_cached_response_when_modified():
+    versions = [
+        (200, {'data': {'status': 'deploying'}}, {'Last-Modified': 'Mon, 04 Jun 2018 10:00:00 GMT'}),
+        (200, {'data': {'status': 'online'}}, {'Last-Modified': 'Mon, 04 Jun 2018 10:00:05 GMT'}),
+    ]
+    with StubServer() as server:
+        server.route('GET', r'/projects/(\d+)', lambda request: versions.pop(0))
+        api = Api(base_url=server.base_url, auth_token='testtoken', verify_token_expire=False,
+                  response_cache=ResponseCache(CACHE_DIR))
+        assert api.get_project(3) == {'status': 'deploying'}
+        assert api.get_project(3) == {'status': 'online'}
+        api.close()
+
+        assert server.requests[1].headers['If-Modified-Since'] == 'Mon, 04 Jun 2018 10:00:00 GMT'
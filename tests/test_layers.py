@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import shutil
+import tarfile
+
+import pytest
+
+from bothub_cli import exceptions as exc
+from bothub_cli.layers import LayerCache
+from bothub_cli.layers import get_layer_key
+from bothub_cli.layers import LayerTarget
+from bothub_cli.layers import build_wheels
+
+
+def teardown_function():
+    shutil.rmtree('test_result', ignore_errors=True)
+
+
+def fixture_requirements(content):
+    if not os.path.isdir('test_result'):
+        os.makedirs('test_result')
+    path = os.path.join('test_result', 'requirements.txt')
+    with open(path, 'w') as fout:
+        fout.write(content)
+    return path
+
+
+def fake_builder(built):
+    def build(requirements_path, wheel_dir, target):
+        built.append(requirements_path)
+        for name in ['six-1.0-py2.py3-none-any.whl', 'bothub-1.0-py3-none-any.whl']:
+            with open(os.path.join(wheel_dir, name), 'wb') as fout:
+                fout.write(name.encode('ascii'))
+    return build
+
+
+def test_get_layer_key_should_ignore_comments_and_blank_lines():
+    key = get_layer_key('six==1.0\nbothub\n', 'cpython-37')
+    assert get_layer_key('# deps\nsix==1.0  # pinned\n\nbothub\n', 'cpython-37') == key
+    assert get_layer_key('six==1.1\nbothub\n', 'cpython-37') != key
+    assert get_layer_key('six==1.0\nbothub\n', 'cpython-38') != key
+
+
+def test_get_layer_key_should_keep_url_fragments():
+    key = get_layer_key('git+https://example.com/a.git#egg=a\n', 'cpython-37')
+    assert get_layer_key('git+https://example.com/a.git#egg=b\n', 'cpython-37') != key
+    assert get_layer_key('git+https://example.com/a.git#egg=a  # fork\n', 'cpython-37') == key
+
+
+def test_layer_cache_should_build_layer_once():
+    built = []
+    cache = LayerCache(os.path.join('test_result', 'layers'), builder=fake_builder(built))
+    requirements_path = fixture_requirements('six==1.0\n')
+    target = LayerTarget(python_version='3.7')
+    key, layer_path = cache.build(requirements_path, target)
+    assert layer_path == cache.get_path(key)
+    with tarfile.open(layer_path) as tin:
+        assert tin.getnames() == ['bothub-1.0-py3-none-any.whl', 'six-1.0-py2.py3-none-any.whl']
+        assert all(member.mtime == 0 for member in tin.getmembers())
+
+    assert cache.build(requirements_path, target) == (key, layer_path)
+    assert built == [requirements_path]
+
+    other_key, _ = cache.build(requirements_path, LayerTarget(python_version='3.8'))
+    assert other_key != key
+    assert built == [requirements_path, requirements_path]
+
+
+def test_layer_cache_should_make_same_layer_of_same_wheels():
+    requirements_path = fixture_requirements('six==1.0\n')
+    first = LayerCache(os.path.join('test_result', 'a'), builder=fake_builder([]))
+    second = LayerCache(os.path.join('test_result', 'b'), builder=fake_builder([]))
+    target = LayerTarget(python_version='3.7')
+    with open(first.build(requirements_path, target)[1], 'rb') as fin:
+        content = fin.read()
+    with open(second.build(requirements_path, target)[1], 'rb') as fin:
+        assert fin.read() == content
+
+
+def test_build_wheels_should_raise_if_pip_fails():
+    requirements_path = fixture_requirements('no-such-package-at-all===0\n')
+    with pytest.raises(exc.DependencyBuildFailed):
+        build_wheels(requirements_path, os.path.join('test_result', 'wheels'), LayerTarget(python='no-such-python'))
+
+
+def test_layer_target_should_tag_python_version_and_platform():
+    assert LayerTarget(python_version='3.7').get_tag() == 'cpython-37-manylinux2014_x86_64'
+    assert LayerTarget(python_version='3.8', platform='manylinux2014_aarch64').get_tag() == \
+        'cpython-38-manylinux2014_aarch64'
+    with pytest.raises(ValueError):
+        LayerTarget()
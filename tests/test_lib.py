@@ -3,21 +3,34 @@
 from __future__ import (absolute_import, division, print_function, unicode_literals)
 
 import os
+import sys
+import time
 import shutil
+import tarfile
+import threading
 
 import pytest
+import requests
 
 from bothub_cli import lib
 from bothub_cli import exceptions as exc
 from bothub_cli.api import Api
+from bothub_cli.api import RetryPolicy
 from bothub_cli.config import Config
 from bothub_cli.config import ProjectConfig
 from bothub_cli.config import ProjectMeta
+from bothub_cli.layers import LayerCache
+from bothub_cli.layers import LayerTarget
 from bothub_cli.utils import make_dist_package
 
 from .testutils import MockResponse
 from .testutils import MockTransport
 from .testutils import MockApi
+from .testutils import make_tree
+from .stubserver import StubServer
+from .stubserver import StubBotStore
+
+SOURCE_DIR = os.path.join('test_result', 'src')
 
 
 def teardown_function():
@@ -231,6 +244,79 @@ def test_rm_shoud_raise_not_found():
         assert executed == ('list_project', )
 
 
+def test_rm_with_glob_should_delete_all_matched_projects():
+    api = MockApi()
+    record_api_projects(api)
+    api.responses.extend([True, True])
+
+    cli = lib.Cli(project_config=fixture_project_config(), api=api, config=fixture_config(),
+                  project_meta=fixture_project_meta())
+    results = cli.rm('my*bot', match='glob', jobs=2)
+    assert sorted(r['id'] for r in results) == [10, 20]
+    assert all(r['deleted'] for r in results)
+    assert sorted(api.executed[1:]) == [('delete_project', 10), ('delete_project', 20)]
+
+
+def test_rm_with_regex_should_match_whole_name():
+    api = MockApi()
+    record_api_projects(api)
+    api.responses.append(True)
+
+    cli = lib.Cli(project_config=fixture_project_config(), api=api, config=fixture_config(),
+                  project_meta=fixture_project_meta())
+    results = cli.rm('my(first|third)bot', match='regex')
+    assert [r['name'] for r in results] == ['myfirstbot']
+
+    record_api_projects(api)
+    with pytest.raises(exc.ProjectNameNotFound):
+        cli.rm('first', match='regex')
+
+
+def test_rm_with_dry_run_should_not_delete():
+    api = MockApi()
+    record_api_projects(api)
+
+    cli = lib.Cli(project_config=fixture_project_config(), api=api, config=fixture_config(),
+                  project_meta=fixture_project_meta())
+    results = cli.rm('my*', match='glob', dry_run=True)
+    assert [r['name'] for r in results] == ['myfirstbot', 'mysecondbot']
+    assert not any(r['deleted'] for r in results)
+    assert api.executed == [('list_project', )]
+
+
+def test_rm_should_report_failed_projects():
+    api = MockApi()
+    record_api_projects(api)
+    api.responses.extend([exc.InvalidCredential(), exc.InvalidCredential()])
+
+    cli = lib.Cli(project_config=fixture_project_config(), api=api, config=fixture_config(),
+                  project_meta=fixture_project_meta())
+    results = cli.rm('my*bot', match='glob', jobs=1)
+    assert [r['deleted'] for r in results] == [False, False]
+    assert all(r['error'].startswith('InvalidCredential') for r in results)
+
+
+def test_rm_should_report_connection_errors_as_failed_projects():
+    api = MockApi()
+    record_api_projects(api)
+    api.responses.extend([requests.exceptions.ConnectionError('refused'), True])
+
+    cli = lib.Cli(project_config=fixture_project_config(), api=api, config=fixture_config(),
+                  project_meta=fixture_project_meta())
+    results = cli.rm('my*bot', match='glob', jobs=1)
+    assert sorted(r['deleted'] for r in results) == [False, True]
+    assert [r['error'] for r in results if not r['deleted']] == ['ConnectionError: refused']
+
+
+def test_rm_with_invalid_regex_should_raise_before_listing_projects():
+    api = MockApi()
+    cli = lib.Cli(project_config=fixture_project_config(), api=api, config=fixture_config(),
+                  project_meta=fixture_project_meta())
+    with pytest.raises(exc.InvalidNamePattern):
+        cli.rm('my(bot', match='regex')
+    assert api.executed == []
+
+
 def test_deploy_should_execute_upload_api():
     api = MockApi()
     config = fixture_config()
@@ -264,6 +350,489 @@ def test_deploy_should_execute_upload_api():
     assert executed == ('upload_code', 3, 'python3', tar_content, 'bothub')
 
 
+def fixture_deploy_cli(server):
+    project_config = fixture_project_config()
+    shutil.copyfile(
+        os.path.join('fixtures', 'test_bothub.yml'),
+        os.path.join('test_result', 'test_lib_project_config.yml')
+    )
+    api = Api(base_url=server.base_url, verify_token_expire=False)
+    return lib.Cli(project_config=project_config, api=api, config=fixture_config(),
+                   project_meta=fixture_project_meta())
+
+
+def test_deploy_should_upload_only_missing_blobs():
+    with StubServer() as server:
+        store = StubBotStore(server)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)', 'data/a.txt': b'a', 'data/b.txt': b'a'})
+        cli = fixture_deploy_cli(server)
+        cli.deploy(source_dir=source_dir)
+        assert store.get_files(3) == {'bot.py': b'print(1)', 'data/a.txt': b'a', 'data/b.txt': b'a'}
+        assert len([r for r in server.requests if r.method == 'PUT']) == 2
+
+        with open(os.path.join(source_dir, 'bot.py'), 'wb') as fout:
+            fout.write(b'print(2)')
+        del server.requests[:]
+        cli.deploy(source_dir=source_dir)
+        puts = [r for r in server.requests if r.method == 'PUT']
+        assert [r.body for r in puts] == [b'print(2)']
+        assert store.get_files(3)['bot.py'] == b'print(2)'
+
+
+def test_deploy_should_skip_unchanged_code():
+    with StubServer() as server:
+        StubBotStore(server)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_deploy_cli(server)
+        cli.deploy(source_dir=source_dir)
+
+        del server.requests[:]
+        assert cli.deploy(source_dir=source_dir) is None
+        assert [(r.method, r.path) for r in server.requests] == [('GET', '/api/projects/3/bot/manifest')]
+
+        del server.requests[:]
+        cli.deploy(source_dir=source_dir, force=True)
+        assert [r.method for r in server.requests if 'manifest' in r.path] == ['POST']
+
+
+def test_deploy_should_redeploy_if_server_has_other_code():
+    with StubServer() as server:
+        store = StubBotStore(server)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_deploy_cli(server)
+        cli.deploy(source_dir=source_dir)
+
+        store.manifests[3] = dict(store.manifests[3], files={})
+        assert cli.deploy(source_dir=source_dir) is not None
+        assert store.get_files(3)['bot.py'] == b'print(1)'
+
+
+def test_deploy_should_fall_back_to_dist_package():
+    with StubServer() as server:
+        store = StubBotStore(server, incremental=False)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_deploy_cli(server)
+        cli.deploy(source_dir=source_dir)
+        assert b'name="code"' in store.uploads[3]
+        assert os.path.isfile(os.path.join('dist', 'bot.tgz'))
+
+
+def test_deploy_with_stream_should_upload_without_dist_file():
+    with StubServer() as server:
+        store = StubBotStore(server, incremental=False)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_deploy_cli(server)
+        shutil.rmtree('dist', ignore_errors=True)
+        cli.deploy(source_dir=source_dir, stream=True)
+        assert b'name="code"' in store.uploads[3]
+        assert server.requests[0].headers['Transfer-Encoding'] == 'chunked'
+        assert not os.path.isfile(os.path.join('dist', 'bot.tgz'))
+
+
+def test_deploy_with_stream_should_warn_that_changed_files_are_sent_instead():
+    with StubServer() as server:
+        store = StubBotStore(server)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_deploy_cli(server)
+        lines = []
+
+        def console(message, nl=True):
+            lines.append(message)
+
+        cli.deploy(console=console, source_dir=source_dir, stream=True)
+        assert any('--stream and --format are ignored' in line for line in lines)
+        assert store.uploads == {}
+
+
+def test_deploy_with_stream_should_raise_error_of_packaging(monkeypatch):
+    stream_dist_package = lib.stream_dist_package
+
+    def remove_then_stream(source_dir, **kwargs):
+        os.remove(os.path.join(source_dir, 'data', 'model.bin'))
+        return stream_dist_package(source_dir, **kwargs)
+
+    monkeypatch.setattr(lib, 'stream_dist_package', remove_then_stream)
+    with StubServer() as server:
+        StubBotStore(server, incremental=False)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)', 'data/model.bin': os.urandom(1024 * 1024)})
+        cli = fixture_deploy_cli(server)
+        with pytest.raises(exc.PackagingFailed):
+            cli.deploy(source_dir=source_dir, stream=True)
+
+
+def test_deploy_should_fall_back_to_gzip_if_format_is_not_supported():
+    pytest.importorskip('zstandard')
+    with StubServer() as server:
+        store = StubBotStore(server, incremental=False, formats=('gzip', ))
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_deploy_cli(server)
+        cli.deploy(source_dir=source_dir, package_format='zstd')
+        assert [r.path.endswith('/bot') for r in server.requests[:2]] == [True, True]
+        assert b'filename="bot.tgz"' in store.uploads[3]
+
+
+def test_deploy_should_reuse_unchanged_dist_package(monkeypatch):
+    with StubServer() as server:
+        store = StubBotStore(server, incremental=False)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_deploy_cli(server)
+        shutil.rmtree('dist', ignore_errors=True)
+        cli.deploy(source_dir=source_dir)
+        with open(os.path.join('dist', 'bot.tgz'), 'rb') as fin:
+            dist_package = fin.read()
+
+        made = []
+        monkeypatch.setattr(lib, 'make_dist_package', lambda *args, **kwargs: made.append(args))
+        cli.deploy(source_dir=source_dir, force=True)
+        assert made == []
+        assert dist_package in store.uploads[3]
+
+
+def test_deploy_with_bytecode_should_upload_dist_package():
+    with StubServer() as server:
+        store = StubBotStore(server)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_deploy_cli(server)
+        cli.deploy(source_dir=source_dir)
+        assert 3 not in store.uploads
+
+        cli.deploy(source_dir=source_dir, bytecode=sys.executable)
+        assert b'name="code"' in store.uploads[3]
+        with tarfile.open(os.path.join('dist', 'bot.tgz'), 'r:gz') as tin:
+            assert '__pycache__/bot.{}.pyc'.format(sys.implementation.cache_tag) in tin.getnames()
+
+
+def fixture_layer_cli(server):
+    cli = fixture_deploy_cli(server)
+    with open(os.path.join('test_result', 'requirements.txt'), 'w') as fout:
+        fout.write('six==1.0\n')
+
+    def build(requirements_path, wheel_dir, target):
+        with open(os.path.join(wheel_dir, 'six-1.0-py2.py3-none-any.whl'), 'wb') as fout:
+            fout.write(b'wheel')
+
+    cli.layer_cache = LayerCache(os.path.join('test_result', 'layers'), builder=build)
+    return cli
+
+
+def test_deploy_with_dependency_layer_should_upload_layer_once():
+    with StubServer() as server:
+        store = StubBotStore(server)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_layer_cli(server)
+        target = LayerTarget(python_version='3.7')
+        cli.deploy(source_dir=source_dir, project_dir='test_result', dependency_layer=target)
+        [key] = list(store.layers)
+        assert store.manifests[3]['dependency_layer'] == key
+        assert store.manifests[3]['dependency'] == 'six==1.0\n'
+
+        del server.requests[:]
+        cli.deploy(source_dir=source_dir, project_dir='test_result', dependency_layer=target, force=True)
+        assert [r.method for r in server.requests if 'dependency-layers' in r.path] == ['GET']
+        assert store.manifests[3]['dependency_layer'] == key
+
+
+def test_deploy_with_dependency_layer_should_fall_back_to_requirements():
+    with StubServer() as server:
+        store = StubBotStore(server, layers=False)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_layer_cli(server)
+        target = LayerTarget(python_version='3.7')
+        cli.deploy(source_dir=source_dir, project_dir='test_result', dependency_layer=target)
+        assert 'dependency_layer' not in store.manifests[3]
+        assert store.manifests[3]['dependency'] == 'six==1.0\n'
+
+
+TRACED_BOT = b"""
+import os
+import traced_helpers
+
+
+class Bot(object):
+    def __init__(self, channel_client=None, storage_client=None, nlu_client_factory=None, event=None):
+        pass
+
+    def handle_message(self, event, context):
+        path = os.path.join(os.path.dirname(__file__), '..', 'data', 'answers.txt')
+        with open(path) as fin:
+            return traced_helpers.pick(fin.read(), event['content'])
+"""
+
+
+def fixture_traced_project(monkeypatch):
+    monkeypatch.setattr(sys, 'path', [path for path in sys.path if path != 'fixtures'])
+    for name in ['bothub', 'bothub.bot', 'traced_helpers']:
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    return make_tree(SOURCE_DIR, {
+        'bothub/__init__.py': b'',
+        'bothub/bot.py': TRACED_BOT,
+        'traced_helpers.py': b'def pick(text, key):\n    return text\n',
+        'data/answers.txt': b'hi',
+        'data/unused.csv': b'a,b',
+        'vendor/unused.py': b'X = 1',
+        'requirements.txt': b'six',
+    })
+
+
+def test_trace_bundle_should_save_allow_list_of_used_files(monkeypatch):
+    source_dir = fixture_traced_project(monkeypatch)
+    api = MockApi()
+    api.responses.append([])
+    cli = lib.Cli(project_config=fixture_project_config(), api=api, config=fixture_config(),
+                  project_meta=fixture_project_meta())
+    allow_list = cli.trace_bundle(['hello'], target_dir=source_dir, project_dir=source_dir)
+    assert allow_list == ['bothub/__init__.py', 'bothub/bot.py', 'data/answers.txt', 'requirements.txt',
+                          'traced_helpers.py']
+    with open(os.path.join(source_dir, '.bothub-allowlist')) as fin:
+        assert [line for line in fin.read().splitlines() if not line.startswith('#')] == allow_list
+
+
+def test_deploy_with_minimal_should_deploy_allow_listed_files():
+    with StubServer() as server:
+        store = StubBotStore(server)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)', 'unused.py': b'', '.bothub-allowlist': b'# x\nbot.py\n'})
+        cli = fixture_deploy_cli(server)
+        cli.deploy(source_dir=source_dir, project_dir=source_dir, minimal=True)
+        assert sorted(store.get_files(3)) == ['bot.py']
+
+        os.remove(os.path.join(source_dir, '.bothub-allowlist'))
+        with pytest.raises(exc.AllowListNotFound):
+            cli.deploy(source_dir=source_dir, project_dir=source_dir, minimal=True)
+
+
+def test_deploy_should_resume_chunked_upload_of_large_package():
+    with StubServer() as server:
+        store = StubBotStore(server, incremental=False)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)', 'model.bin': os.urandom(8192)})
+        cli = fixture_deploy_cli(server)
+        cli.chunk_size = 1024
+        store.fail_chunks.add(3)
+        with pytest.raises(exc.CliException):
+            cli.deploy(source_dir=source_dir)
+        assert os.path.isfile(os.path.join('test_result', 'upload.json'))
+
+        del server.requests[:]
+        cli.deploy(source_dir=source_dir)
+        with open(os.path.join('dist', 'bot.tgz'), 'rb') as fin:
+            assert store.packages[3] == fin.read()
+        resumed = [int(r.path.rsplit('/', 1)[1]) for r in server.requests if r.method == 'PUT']
+        assert 3 in resumed
+        assert not set(resumed) & set([0, 1, 2])
+        assert not os.path.isfile(os.path.join('test_result', 'upload.json'))
+
+
+class ScriptedWatcher(object):
+    def __init__(self, source_dir, steps, stop, done):
+        self.source_dir = source_dir
+        self.steps = list(steps)
+        self.stop = stop
+        self.done = done
+        self.closed = False
+
+    def wait(self, timeout=None):
+        if not self.steps:
+            deadline = time.time() + 5
+            while not self.done() and time.time() < deadline:
+                time.sleep(0.01)
+            self.stop.set()
+            return set()
+        step = self.steps.pop(0)
+        if step:
+            path, content = step
+            with open(os.path.join(self.source_dir, path), 'wb') as fout:
+                fout.write(content)
+            return set([path])
+        return set()
+
+    def close(self):
+        self.closed = True
+
+
+def test_deploy_watch_should_redeploy_after_changes():
+    with StubServer() as server:
+        store = StubBotStore(server)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_deploy_cli(server)
+        stop = threading.Event()
+
+        def deployed():
+            return 3 in store.manifests and store.get_files(3)['bot.py'] == b'print(2)'
+
+        watcher = ScriptedWatcher(source_dir, [None, ('bot.py', b'print(2)'), None], stop, deployed)
+        lines = []
+
+        def console(message, nl=True):
+            lines.append(message)
+
+        cli.deploy_watch(console=console, source_dir=source_dir, project_dir=source_dir,
+                         debounce=0, stop=stop, watcher=watcher)
+
+        assert watcher.closed
+        assert 'Changed: bot.py' in lines
+        assert store.get_files(3)['bot.py'] == b'print(2)'
+
+
+def test_deploy_target_should_parse_project_id_and_base_url():
+    target = lib.DeployTarget.parse('3')
+    assert (target.project_id, target.base_url, target.name) == (3, None, '3')
+    target = lib.DeployTarget.parse('4@http://staging/api/')
+    assert (target.project_id, target.base_url, target.name) == (4, 'http://staging/api', '4@http://staging/api')
+    for spec in ['', 'bot', '3@']:
+        with pytest.raises(exc.InvalidDeployTarget):
+            lib.DeployTarget.parse(spec)
+
+
+def test_deploy_with_targets_should_deploy_to_every_target():
+    with StubServer() as server, StubServer() as other_server:
+        store = StubBotStore(server)
+        other_store = StubBotStore(other_server)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_deploy_cli(server)
+        cli.config.set('servers', {other_server.base_url: {'auth_token': 'othertoken'}})
+        cli.config.save()
+        targets = [lib.DeployTarget(3), lib.DeployTarget(4), lib.DeployTarget(5, other_server.base_url)]
+        lines = []
+        results = cli.deploy(console=lines.append, source_dir=source_dir, targets=targets)
+
+        assert [(r['path'], r['status']) for r in results] == [
+            ('3', 'deployed'), ('4', 'deployed'), ('5@{}'.format(other_server.base_url), 'deployed')]
+        assert store.get_files(3)['bot.py'] == b'print(1)'
+        assert store.get_files(4)['bot.py'] == b'print(1)'
+        assert other_store.get_files(5)['bot.py'] == b'print(1)'
+        assert set(r.headers['Authorization'] for r in other_server.requests) == set(['Bearer othertoken'])
+        assert 'Bearer othertoken' not in set(r.headers['Authorization'] for r in server.requests)
+        assert sorted(lines)[-1].startswith('[3/3] ')
+        assert [record['phase'] for record in cli.timings.phases] == ['scan']
+        assert [record['phase'] for record in results[0]['timings']] == ['upload', 'wait']
+
+        results = cli.deploy(source_dir=source_dir, targets=targets + [lib.DeployTarget(6)])
+        assert [r['status'] for r in results] == ['skipped', 'skipped', 'skipped', 'deployed']
+
+
+def test_deploy_with_targets_should_redeploy_targets_changed_elsewhere():
+    with StubServer() as server:
+        store = StubBotStore(server)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_deploy_cli(server)
+        targets = [lib.DeployTarget(3), lib.DeployTarget(4)]
+        cli.deploy(source_dir=source_dir, targets=targets)
+        store.manifests[3] = dict(store.manifests[3], files={})
+
+        results = cli.deploy(source_dir=source_dir, targets=targets)
+        assert [r['status'] for r in results] == ['deployed', 'skipped']
+        assert store.get_files(3)['bot.py'] == b'print(1)'
+
+
+def test_deploy_with_targets_should_report_unreachable_target_as_failed():
+    with StubServer() as server:
+        store = StubBotStore(server)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_deploy_cli(server)
+        cli.api.retry_policy = RetryPolicy(max_retries=0)
+        cli.config.set('servers', {'http://127.0.0.1:1/api': {'auth_token': 'othertoken'}})
+        cli.config.save()
+        targets = [lib.DeployTarget(3), lib.DeployTarget(4, 'http://127.0.0.1:1/api')]
+        results = cli.deploy(source_dir=source_dir, targets=targets)
+
+        assert [r['status'] for r in results] == ['deployed', 'failed']
+        assert results[1]['error'].startswith('ConnectionError')
+        assert store.get_files(3)['bot.py'] == b'print(1)'
+
+
+def test_deploy_with_targets_should_refuse_servers_without_credentials():
+    with StubServer() as server, StubServer() as other_server:
+        StubBotStore(server)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_deploy_cli(server)
+        targets = [lib.DeployTarget(3), lib.DeployTarget(5, other_server.base_url)]
+        with pytest.raises(exc.ServerNotAuthenticated):
+            cli.deploy(source_dir=source_dir, targets=targets)
+        assert server.requests == []
+        assert other_server.requests == []
+
+
+def test_authenticate_with_base_url_should_save_token_of_that_server():
+    with StubServer() as server:
+        server.route('POST', '/users/access-token', lambda request: (200, {'data': {'access_token': 'othertoken'}}))
+        config = fixture_config()
+        api = Api(base_url='http://127.0.0.1:1/api', verify_token_expire=False)
+        cli = lib.Cli(config=config, api=api, project_meta=fixture_project_meta())
+        cli.authenticate('testuser', 'testpw', base_url=server.base_url + '/')
+        assert config.get('auth_token') == 'testtoken'
+        assert config.get('servers') == {server.base_url: {'auth_token': 'othertoken'}}
+
+
+def test_deploy_with_targets_should_share_one_dist_package():
+    with StubServer() as server:
+        store = StubBotStore(server, incremental=False)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)'})
+        cli = fixture_deploy_cli(server)
+        results = cli.deploy(source_dir=source_dir, targets=[lib.DeployTarget(3), lib.DeployTarget(4)],
+                             stream=True)
+
+        assert [r['status'] for r in results] == ['deployed', 'deployed']
+        assert [record['phase'] for record in cli.timings.phases] == ['scan', 'package']
+        assert os.path.isfile(os.path.join('dist', 'bot.tgz'))
+        assert sorted(store.uploads) == [3, 4]
+
+
+def fixture_workspace(projects):
+    root = os.path.join('test_result', 'workspace')
+    for name, project_id in projects:
+        project_dir = make_tree(os.path.join(root, name), {
+            '.bothub-meta/meta.yml': 'id: {}\n'.format(project_id) if project_id else '{}\n',
+            'bot.py': '# {}\n'.format(name),
+        })
+        shutil.copyfile(os.path.join('fixtures', 'test_bothub.yml'), os.path.join(project_dir, 'bothub.yml'))
+    return root
+
+
+def test_deploy_all_should_deploy_every_project():
+    with StubServer() as server:
+        store = StubBotStore(server)
+        root = fixture_workspace([('first', 3), ('second', 4), ('broken', None)])
+        cli = fixture_deploy_cli(server)
+        lines = []
+        results = cli.deploy_all(root, jobs=3, console=lines.append)
+
+        assert [(os.path.basename(r['path']), r['status']) for r in results] == [
+            ('broken', 'failed'), ('first', 'deployed'), ('second', 'deployed')]
+        assert results[0]['error'].startswith('ImproperlyConfigured')
+        assert sorted(store.get_files(3)) == ['bot.py', 'bothub.yml']
+        assert store.get_files(3)['bot.py'] == b'# first\n'
+        assert store.get_files(4)['bot.py'] == b'# second\n'
+        assert len(lines) == 3 and lines[-1].startswith('[3/3] ')
+        assert cli.api.pool_maxsize == 3 * lib.UPLOAD_JOBS
+
+        results = cli.deploy_all(root, jobs=3)
+        assert [r['status'] for r in results] == ['failed', 'skipped', 'skipped']
+
+
+def test_deploy_all_should_report_os_and_connection_errors_as_failed():
+    with StubServer() as server:
+        StubBotStore(server)
+        root = fixture_workspace([('first', 3), ('second', 4)])
+        os.symlink('missing.py', os.path.join(root, 'second', 'dangling.py'))
+        cli = fixture_deploy_cli(server)
+        results = cli.deploy_all(root, jobs=2)
+        assert [r['status'] for r in results] == ['deployed', 'failed']
+        assert results[1]['error'].startswith('FileNotFoundError')
+
+    cli.api = Api(base_url='http://127.0.0.1:1/api', verify_token_expire=False,
+                  retry_policy=RetryPolicy(max_retries=0))
+    results = cli.deploy_all(root, jobs=2, force=True)
+    assert [r['status'] for r in results] == ['failed', 'failed']
+    assert results[0]['error'].startswith('ConnectionError')
+
+
+def test_deploy_all_should_raise_without_projects():
+    os.makedirs(os.path.join('test_result', 'empty'))
+    cli = lib.Cli(project_config=fixture_project_config(), api=MockApi(), config=fixture_config(),
+                  project_meta=fixture_project_meta())
+    with pytest.raises(exc.ProjectNotFound):
+        cli.deploy_all(os.path.join('test_result', 'empty'))
+
+
 def test_clone_should_extract_code():
     api = MockApi()
     config = fixture_config()
@@ -567,6 +1136,138 @@ def test_wait_deploy_completion_should_raise_failed():
         cli._wait_deploy_completion(3, None, wait_interval=0, max_retries=4)
 
 
+def test_wait_deploy_completion_should_back_off_while_status_is_unchanged(monkeypatch):
+    api = MockApi()
+    cli = lib.Cli(project_config=fixture_project_config(), api=api, config=fixture_config(),
+                  project_meta=fixture_project_meta())
+    for status in ['offline', 'offline', 'offline', 'deploying', 'deploying', 'online']:
+        api.responses.append({'status': status})
+    slept = []
+    monkeypatch.setattr(lib.time, 'sleep', slept.append)
+
+    timer = cli._wait_deploy_completion(3, None, wait_interval=1)
+    assert slept == [1, 1.5, 2.25, 1, 1.5]
+    assert list(timer.durations) == ['offline', 'deploying', 'online']
+
+
+def test_wait_deploy_completion_should_fail_after_deadline():
+    api = MockApi()
+    cli = lib.Cli(project_config=fixture_project_config(), api=api, config=fixture_config(),
+                  project_meta=fixture_project_meta())
+    api.responses.append({'status': 'deploying'})
+
+    with pytest.raises(exc.DeployFailed):
+        cli._wait_deploy_completion(3, None, timeout=0)
+
+
+def iter_status_events(statuses, delay=0.05):
+    for status in statuses:
+        time.sleep(delay)
+        yield 'data: {{"status": "{}"}}\n\n'.format(status).encode('utf8')
+
+
+def test_wait_deploy_completion_should_follow_status_stream():
+    with StubServer() as server:
+        server.route('GET', r'/projects/(\d+)/status', lambda request: (
+            200, iter_status_events(['deploying', 'deploying', 'online']), {'Content-Type': 'text/event-stream'}))
+        cli = fixture_deploy_cli(server)
+        cli._load_auth()
+        timer = cli._wait_deploy_completion(3, None)
+        assert [r.path for r in server.requests] == ['/api/projects/3/status']
+        assert server.requests[0].headers['Accept'] == 'text/event-stream'
+        assert list(timer.durations) == ['deploying', 'online']
+        assert timer.durations['deploying'] >= 0.05
+
+
+def iter_heartbeats(count=100, delay=0.05):
+    for _ in range(count):
+        time.sleep(delay)
+        yield b': ping\n\n'
+
+
+def test_wait_deploy_completion_should_fail_after_deadline_on_heartbeats():
+    with StubServer() as server:
+        server.route('GET', r'/projects/(\d+)/status', lambda request: (
+            200, iter_heartbeats(), {'Content-Type': 'text/event-stream'}))
+        cli = fixture_deploy_cli(server)
+        cli._load_auth()
+        started = time.time()
+        with pytest.raises(exc.DeployFailed):
+            cli._wait_deploy_completion(3, None, timeout=0.5)
+        assert time.time() - started < 2
+
+
+def test_wait_deploy_completion_should_count_streamed_statuses_as_checks():
+    with StubServer() as server:
+        server.route('GET', r'/projects/(\d+)/status', lambda request: (
+            200, iter_status_events(['deploying', 'deploying', 'deploying', 'online'], delay=0),
+            {'Content-Type': 'text/event-stream'}))
+        cli = fixture_deploy_cli(server)
+        cli._load_auth()
+        with pytest.raises(exc.DeployFailed):
+            cli._wait_deploy_completion(3, None, max_retries=2)
+
+
+def test_wait_deploy_completion_should_poll_after_status_stream_ends():
+    with StubServer() as server:
+        StubBotStore(server)
+        server.route('GET', r'/projects/(\d+)/status', lambda request: (
+            200, iter_status_events(['deploying'], delay=0), {'Content-Type': 'text/event-stream'}))
+        cli = fixture_deploy_cli(server)
+        cli._load_auth()
+        timer = cli._wait_deploy_completion(3, None)
+        assert [r.path for r in server.requests] == ['/api/projects/3/status', '/api/projects/3']
+        assert timer.status == 'online'
+
+
+def test_status_timer_should_account_time_in_each_status():
+    now = [0]
+    timer = lib.StatusTimer(clock=lambda: now[0])
+    timer.update('offline')
+    now[0] = 2
+    timer.update('deploying')
+    now[0] = 5
+    timer.update('deploying')
+    now[0] = 7
+    timer.update('online')
+    assert timer.durations == {'offline': 2, 'deploying': 5, 'online': 0}
+    assert timer.format() == 'offline 2.0s, deploying 5.0s'
+    assert timer.elapsed == 7
+
+
+def test_deploy_timings_should_report_ratio_and_throughput():
+    now = [0]
+    timings = lib.DeployTimings(clock=lambda: now[0])
+    with timings.phase('package') as record:
+        record['bytes_in'] = 1000
+        record['bytes_out'] = 250
+        now[0] = 2
+    with timings.phase('wait'):
+        now[0] = 5
+    package, wait = timings.to_list()
+    assert package['seconds'] == 2
+    assert package['ratio'] == 0.25
+    assert package['throughput'] == 500
+    assert wait['ratio'] is None
+    assert wait['throughput'] is None
+    assert timings.total == 5
+
+
+def test_deploy_should_record_timings_of_each_phase():
+    with StubServer() as server:
+        StubBotStore(server, incremental=False)
+        source_dir = make_tree(SOURCE_DIR, {'bot.py': b'print(1)' * 100})
+        cli = fixture_deploy_cli(server)
+        cli.deploy(source_dir=source_dir)
+        phases = cli.timings.to_list()
+        assert [p['phase'] for p in phases] == ['scan', 'package', 'upload', 'wait']
+        scan, package, upload, _ = phases
+        assert scan['bytes_in'] == 800
+        assert package['bytes_in'] == 800
+        assert package['bytes_out'] == os.path.getsize(os.path.join('dist', 'bot.tgz'))
+        assert upload['bytes_out'] == package['bytes_out']
+
+
 def test_load_bot_should_passed():
     api = MockApi()
     config = fixture_config()
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import sys
+import subprocess
+
+
+IMPORT_TIME_BUDGET = 0.5
+HEAVY_MODULES = ['dialogflow', 'grpc', 'google.api_core', 'google.auth', 'prompt_toolkit',
+                 'bothub_client.clients', 'pathspec', 'ruamel.yaml']
+
+
+def run_python(code):
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return output.decode('utf8').strip()
+
+
+def test_import_main_should_not_load_heavy_dependencies():
+    code = 'import sys; import bothub_cli.main; ' \
+           'print(",".join(m for m in {!r} if m in sys.modules))'.format(HEAVY_MODULES)
+    assert run_python(code) == ''
+
+
+def test_import_main_should_be_within_time_budget():
+    code = 'import time; t = time.time(); import bothub_cli.main; print(time.time() - t)'
+    elapsed = min(float(run_python(code)) for _ in range(3))
+    assert elapsed < IMPORT_TIME_BUDGET
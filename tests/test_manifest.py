@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import time
+import shutil
+import hashlib
+
+from bothub_cli import manifest as manifest_module
+from bothub_cli.manifest import Manifest
+from bothub_cli.manifest import Snapshot
+
+from .testutils import make_tree
+
+
+def teardown_function():
+    shutil.rmtree('test_result', ignore_errors=True)
+
+
+def fixture_source_dir():
+    return make_tree(os.path.join('test_result', 'src'),
+                     {'bot.py': b'bot', 'lib/util.py': b'util', 'dist/bot.tgz': b'tgz'})
+
+
+def test_from_dir_should_hash_package_files():
+    manifest = Manifest.from_dir(fixture_source_dir())
+    assert sorted(manifest.files) == ['bot.py', 'lib/util.py']
+    assert manifest.files['bot.py']['digest'] == hashlib.sha256(b'bot').hexdigest()
+
+
+def test_from_dir_should_hash_files_of_symlinked_dirs():
+    source_dir = fixture_source_dir()
+    make_tree(os.path.join('test_result', 'common'), {'shared.py': b'shared'})
+    os.symlink(os.path.join('..', 'common'), os.path.join(source_dir, 'shared'))
+    manifest = Manifest.from_dir(source_dir)
+    assert sorted(manifest.files) == ['bot.py', 'lib/util.py', 'shared/shared.py']
+    assert manifest.files['shared/shared.py']['digest'] == hashlib.sha256(b'shared').hexdigest()
+
+
+def test_digest_should_change_with_content_and_dependency():
+    source_dir = fixture_source_dir()
+    manifest = Manifest.from_dir(source_dir, dependency='bothub')
+    assert Manifest.from_dir(source_dir, dependency='bothub').digest == manifest.digest
+    assert Manifest.from_dir(source_dir, dependency='bothub\nrequests').digest != manifest.digest
+
+    with open(os.path.join(source_dir, 'bot.py'), 'wb') as fout:
+        fout.write(b'changed')
+    assert Manifest.from_dir(source_dir, dependency='bothub').digest != manifest.digest
+
+
+def test_get_blobs_should_dedupe_same_contents():
+    manifest = Manifest({'a': {'digest': 'x', 'mode': 420}, 'b': {'digest': 'x', 'mode': 420}})
+    assert manifest.get_blobs() == {'x': 'b'}
+
+
+def test_save_and_load_should_roundtrip():
+    path = os.path.join('test_result', 'manifest.json')
+    manifest = Manifest.from_dir(fixture_source_dir(), language='python3', dependency='bothub', project_id=3)
+    manifest.save(path)
+    loaded = Manifest.load(path)
+    assert loaded.digest == manifest.digest
+    assert loaded.project_id == 3
+
+
+def test_load_should_return_none_without_manifest():
+    assert Manifest.load(os.path.join('test_result', 'manifest.json')) is None
+
+
+def age_files(source_dir, seconds=60):
+    mtime = time.time() - seconds
+    for dirname, _, filenames in os.walk(source_dir):
+        for filename in filenames:
+            os.utime(os.path.join(dirname, filename), (mtime, mtime))
+
+
+def fixture_counting_hash_file(monkeypatch):
+    hashed = []
+    hash_file = manifest_module.hash_file
+    monkeypatch.setattr(manifest_module, 'hash_file', lambda path: hashed.append(path) or hash_file(path))
+    return hashed
+
+
+def test_from_dir_with_snapshot_should_hash_only_changed_files(monkeypatch):
+    source_dir = fixture_source_dir()
+    age_files(source_dir)
+    snapshot_path = os.path.join('test_result', 'snapshot.json')
+    snapshot = Snapshot()
+    manifest = Manifest.from_dir(source_dir, snapshot=snapshot)
+    snapshot.save(snapshot_path)
+
+    hashed = fixture_counting_hash_file(monkeypatch)
+    assert Manifest.from_dir(source_dir, snapshot=Snapshot.load(snapshot_path)).digest == manifest.digest
+    assert hashed == []
+
+    with open(os.path.join(source_dir, 'bot.py'), 'wb') as fout:
+        fout.write(b'changed')
+    changed = Manifest.from_dir(source_dir, snapshot=Snapshot.load(snapshot_path))
+    assert hashed == [os.path.join(source_dir, 'bot.py')]
+    assert changed.files['bot.py']['digest'] == hashlib.sha256(b'changed').hexdigest()
+
+
+def test_from_dir_with_snapshot_should_rehash_racily_clean_files(monkeypatch):
+    source_dir = fixture_source_dir()
+    snapshot = Snapshot()
+    Manifest.from_dir(source_dir, snapshot=snapshot)
+
+    hashed = fixture_counting_hash_file(monkeypatch)
+    Manifest.from_dir(source_dir, snapshot=snapshot)
+    assert len(hashed) == 2
+
+
+def test_snapshot_archive_should_be_fresh_until_archive_changes():
+    path = os.path.join('test_result', 'bot.tgz')
+    os.makedirs('test_result')
+    with open(path, 'wb') as fout:
+        fout.write(b'tgz')
+    snapshot = Snapshot()
+    snapshot.set_archive(path, 'digest', 'gzip')
+    assert snapshot.is_archive_fresh(path, 'digest', 'gzip')
+    assert not snapshot.is_archive_fresh(path, 'other', 'gzip')
+    assert not snapshot.is_archive_fresh(path, 'digest', 'zstd')
+
+    with open(path, 'wb') as fout:
+        fout.write(b'changed')
+    assert not snapshot.is_archive_fresh(path, 'digest', 'gzip')
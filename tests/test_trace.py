@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import shutil
+
+from bothub_cli.trace import FileTracer
+from bothub_cli.trace import make_allow_list
+from bothub_cli.trace import load_allow_list
+from bothub_cli.trace import save_allow_list
+
+
+def teardown_function():
+    shutil.rmtree('test_result', ignore_errors=True)
+
+
+def test_file_tracer_should_record_opened_files_under_root():
+    root = os.path.join('test_result', 'project')
+    os.makedirs(os.path.join(root, 'data'))
+    for name in ['a.txt', 'b.txt']:
+        with open(os.path.join(root, 'data', name), 'w') as fout:
+            fout.write(name)
+    with open(os.path.join('test_result', 'outside.txt'), 'w') as fout:
+        fout.write('outside')
+
+    with FileTracer(root) as tracer:
+        with open(os.path.join(root, 'data', 'a.txt')) as fin:
+            fin.read()
+        with open(os.path.join('test_result', 'outside.txt')) as fin:
+            fin.read()
+        tracer.record(os.path.join(root, 'lib', '__pycache__', 'util.cpython-37.pyc'))
+    with open(os.path.join(root, 'data', 'b.txt')) as fin:
+        fin.read()
+    assert tracer.paths == set(['data/a.txt', 'lib/util.py'])
+
+
+def test_allow_list_should_keep_package_order_and_project_files():
+    allow_list = make_allow_list(set(['lib/a.py', 'bot.py', 'gone.py']),
+                                 ['bot.py', 'bothub.yml', 'lib/a.py', 'lib/b.py', 'requirements.txt'])
+    assert allow_list == ['bot.py', 'bothub.yml', 'lib/a.py', 'requirements.txt']
+
+    os.makedirs('test_result')
+    path = os.path.join('test_result', '.bothub-allowlist')
+    save_allow_list(path, allow_list)
+    assert load_allow_list(path) == set(allow_list)
@@ -1,17 +1,27 @@
 # -*- coding: utf-8 -*-
 
+import io
 import os
+import sys
 import shutil
+import struct
+import tarfile
+import requests
 import requests_mock
 import yaml
+import pytest
 
 from datetime import datetime
 from datetime import timedelta
 
 from bothub_cli import utils
+from bothub_cli import exceptions as exc
+
+from .testutils import make_tree
 
 
 CACHE_DIR = os.path.join('test_result', 'cache')
+BYTECODE_DIR = os.path.join('test_result', 'bytecode')
 CACHE_FILE_PATH = os.path.join('test_result', 'cache', 'test_cache.yml')
 
 
@@ -93,6 +103,17 @@ def test_cache_set_should_work_with_existing_cache_file():
         assert data['mykey2']['value'] is False
 
 
+def test_cache_get_should_return_stale_value_if_allowed():
+    os.mkdir(CACHE_DIR)
+    with open(CACHE_FILE_PATH, 'w') as fout:
+        data = fixture_cache_data()
+        data['mykey']['expires'] -= timedelta(seconds=120)
+        payload = yaml.dump(data, default_flow_style=False)
+        fout.write(payload)
+    cache = utils.Cache(CACHE_FILE_PATH)
+    assert cache.get('mykey', allow_stale=True) == 'myvalue'
+
+
 def test_write_content_to_file_should_write_file():
     path = os.path.join('test_result', 'writetest.txt')
     if os.path.isfile(path):
@@ -152,6 +173,48 @@ def test_check_latest_version_should_passed():
         utils.check_latest_version()
 
 
+def test_revalidate_latest_versions_should_skip_fresh_entries():
+    cache = utils.Cache(CACHE_FILE_PATH)
+    cache.set('latest_pypi_version', '0.1.7')
+    cache.set('sdk_latest_pypi_version', '0.1.7')
+    assert utils.revalidate_latest_versions(cache) == []
+
+
+def test_revalidate_latest_versions_should_refresh_stale_entries_concurrently():
+    with open('fixtures/pypi-versions.txt') as fin:
+        content = fin.read()
+
+    cache = utils.Cache(CACHE_FILE_PATH)
+    cache.set('latest_pypi_version', '0.1.3', ttl=-1)
+    with requests_mock.mock() as m:
+        m.get('https://pypi.python.org/simple/bothub-cli', text=content)
+        m.get('https://pypi.python.org/simple/bothub', text='<a>bothub-0.1.7-py2.py3-none-any.whl</a>')
+        threads = utils.revalidate_latest_versions(cache)
+        assert len(threads) == 2
+        utils.join_threads(threads, 5)
+
+    assert cache.get('latest_pypi_version') == '0.1.7'
+    assert cache.get('sdk_latest_pypi_version') == '0.1.7'
+
+
+def test_revalidate_latest_versions_should_ignore_connection_errors():
+    cache = utils.Cache(CACHE_FILE_PATH)
+    with requests_mock.mock() as m:
+        m.get('https://pypi.python.org/simple/bothub-cli', exc=requests.exceptions.ConnectionError)
+        m.get('https://pypi.python.org/simple/bothub', exc=requests.exceptions.ConnectionError)
+        utils.join_threads(utils.revalidate_latest_versions(cache), 5)
+
+    assert cache.get('latest_pypi_version') is None
+    assert utils.revalidate_latest_versions(cache) == []
+
+
+def test_get_cached_latest_version_should_return_stale_entry():
+    cache = utils.Cache(CACHE_FILE_PATH)
+    cache.set('latest_pypi_version', '0.1.3', ttl=-1)
+    assert utils.get_cached_latest_version(cache) == '0.1.3'
+    assert utils.get_cached_latest_version(cache, sdk=True) is None
+
+
 def test_timestamp_should_return_int():
     assert isinstance(utils.timestamp(), int)
 
@@ -213,3 +276,155 @@ def test_close_readline():
 
 def test_get_bot_class():
     utils.get_bot_class(target_dir='fixtures')
+
+
+def fixture_package_dir():
+    return make_tree(os.path.join('test_result', 'package'),
+                     {'bot.py': os.urandom(10), 'data/model.bin': os.urandom(300 * 1024)})
+
+
+def test_stream_dist_package_should_make_same_package_in_bounded_chunks():
+    source_dir = fixture_package_dir()
+    chunks = list(utils.stream_dist_package(source_dir, chunk_size=16 * 1024, max_chunks=2))
+    assert all(len(chunk) <= 16 * 1024 for chunk in chunks)
+
+    with tarfile.open(fileobj=io.BytesIO(b''.join(chunks)), mode='r:gz') as tin:
+        assert tin.getnames() == ['bot.py', 'data/model.bin']
+        with open(os.path.join(source_dir, 'data', 'model.bin'), 'rb') as fin:
+            assert tin.extractfile('data/model.bin').read() == fin.read()
+    shutil.rmtree('test_result')
+
+
+def test_stream_dist_package_should_raise_error_of_packaging():
+    source_dir = fixture_package_dir()
+    chunks = utils.stream_dist_package(source_dir, files=['bot.py', 'missing.py'])
+    try:
+        with pytest.raises((IOError, OSError)):
+            list(chunks)
+    finally:
+        shutil.rmtree('test_result')
+
+
+def test_chunk_pipe_should_stop_writer_when_reader_is_gone():
+    pipe = utils.ChunkPipe(chunk_size=1024, max_chunks=1)
+    chunks = iter(pipe)
+    pipe.write(b'x' * 1024)
+    next(chunks)
+    chunks.close()
+    with pytest.raises(IOError):
+        pipe.write(b'x' * 4096)
+
+
+def fixture_project_tree(paths):
+    return make_tree(os.path.join('test_result', 'project'), dict((path, b'x') for path in paths))
+
+
+def fixture_ignore_matcher(lines):
+    path = os.path.join('test_result', '.bothubignore')
+    with open(path, 'w') as fout:
+        fout.write('\n'.join(lines))
+    return utils.IgnoreMatcher.from_ignore_file(path)
+
+
+def test_list_package_files_should_prune_ignored_dirs():
+    source_dir = fixture_project_tree(['bot.py', 'venv/lib/six.py', 'venv/bin/python', 'app/.git/HEAD', 'app/a.log'])
+    matcher = fixture_ignore_matcher(['venv/', '.git', '*.log'])
+    matched = []
+    match_file = matcher.match_file
+    matcher.match_file = lambda path: matched.append(path) or match_file(path)
+    try:
+        assert utils.list_package_files(source_dir, matcher) == ['bot.py']
+        assert [path for path in matched if path.startswith('venv/') or '.git/' in path] == ['venv/', 'app/.git/']
+    finally:
+        shutil.rmtree('test_result')
+
+
+def test_list_package_files_should_respect_negated_patterns():
+    source_dir = fixture_project_tree(['a.log', 'keep.log', 'bot.py'])
+    matcher = fixture_ignore_matcher(['*.log', '!keep.log'])
+    try:
+        assert matcher.spec is not None
+        assert utils.list_package_files(source_dir, matcher) == ['bot.py', 'keep.log']
+    finally:
+        shutil.rmtree('test_result')
+
+
+def test_list_package_files_should_apply_default_patterns():
+    source_dir = fixture_project_tree(['bot.py', 'bot.pyc', 'lib/__pycache__/a.pyc', 'lib/a.py', 'dist/bot.tgz'])
+    try:
+        assert utils.list_package_files(source_dir) == ['bot.py', 'lib/a.py']
+    finally:
+        shutil.rmtree('test_result')
+
+
+def fixture_linked_project_tree():
+    source_dir = fixture_project_tree(['bot.py', 'lib/a.py'])
+    make_tree(os.path.join('test_result', 'common'), {'shared.py': b'shared'})
+    os.symlink(os.path.join('..', 'common'), os.path.join(source_dir, 'shared'))
+    os.symlink('..', os.path.join(source_dir, 'lib', 'loop'))
+    return source_dir
+
+
+def test_list_package_files_should_follow_symlinked_dirs_without_cycles():
+    source_dir = fixture_linked_project_tree()
+    try:
+        assert utils.list_package_files(source_dir) == ['bot.py', 'lib/a.py', 'shared/shared.py']
+    finally:
+        shutil.rmtree('test_result')
+
+
+def test_make_dist_package_should_include_files_of_symlinked_dirs():
+    source_dir = fixture_linked_project_tree()
+    dist_file_path = os.path.join('test_result', 'bot.tgz')
+    try:
+        utils.make_dist_package(dist_file_path, source_dir)
+        with tarfile.open(dist_file_path, 'r:gz') as tin:
+            assert tin.extractfile('shared/shared.py').read() == b'shared'
+    finally:
+        shutil.rmtree('test_result')
+
+
+def test_find_projects_should_skip_hidden_and_nested_dirs():
+    root = fixture_project_tree([
+        'a/bothub.yml', 'a/sub/bothub.yml', 'b/c/bothub.yaml', '.git/d/bothub.yml',
+        'node_modules/e/bothub.yml', 'f/bot.py',
+    ])
+    try:
+        assert utils.find_projects(root) == [os.path.join(root, 'a'), os.path.join(root, 'b', 'c')]
+    finally:
+        shutil.rmtree('test_result')
+
+
+def read_dist_package(dist_file_path):
+    with tarfile.open(dist_file_path, 'r:gz') as tin:
+        return dict((name, tin.extractfile(name).read()) for name in tin.getnames())
+
+
+def test_make_dist_package_with_bytecode_should_add_checked_hash_pyc_files():
+    source_dir = make_tree(BYTECODE_DIR, {'bot.py': 'import lib.a\n', 'lib/a.py': 'X = 1\n', 'data.txt': 'x'})
+    dist_file_path = os.path.join('test_result', 'bot.tgz')
+    try:
+        utils.make_dist_package(dist_file_path, source_dir, bytecode=sys.executable)
+        first = read_dist_package(dist_file_path)
+        tag = sys.implementation.cache_tag
+        assert sorted(first) == ['__pycache__/bot.{}.pyc'.format(tag), 'bot.py', 'data.txt',
+                                 'lib/__pycache__/a.{}.pyc'.format(tag), 'lib/a.py']
+        pyc = first['lib/__pycache__/a.{}.pyc'.format(tag)]
+        # flags of PEP 552: hash-based and checked
+        assert struct.unpack('<I', pyc[4:8])[0] == 3
+
+        utils.make_dist_package(dist_file_path, source_dir, bytecode=sys.executable)
+        assert read_dist_package(dist_file_path) == first
+    finally:
+        shutil.rmtree('test_result')
+
+
+def test_compile_bytecode_should_raise_on_syntax_error():
+    source_dir = make_tree(BYTECODE_DIR, {'bot.py': 'def broken(:\n'})
+    try:
+        with pytest.raises(exc.BytecodeCompileFailed):
+            utils.make_dist_package(os.path.join('test_result', 'bot.tgz'), source_dir, bytecode=sys.executable)
+        with pytest.raises(exc.BytecodeCompileFailed):
+            utils.compile_bytecode(source_dir, ['bot.py'], 'test_result', python='no-such-python')
+    finally:
+        shutil.rmtree('test_result')
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import time
+import shutil
+import threading
+
+import pytest
+
+from bothub_cli import watch
+
+from .testutils import make_tree
+
+
+def teardown_function():
+    shutil.rmtree('test_result', ignore_errors=True)
+
+
+def fixture_tree():
+    return make_tree(os.path.join('test_result', 'watched'),
+                     {'bot.py': 'print(1)', 'lib/': None, 'venv/': None, 'dist/': None})
+
+
+def make_inotify_watcher(root, ignores=None):
+    try:
+        return watch.InotifyWatcher(root, ignores)
+    except OSError:
+        pytest.skip('inotify is not available')
+
+
+def test_inotify_watcher_should_report_changed_package_files():
+    root = fixture_tree()
+    watcher = make_inotify_watcher(root)
+    try:
+        assert watcher.wait(0.05) == set()
+        make_tree(root, {'bot.py': 'print(2)', 'dist/bot.tgz': 'x', 'lib/__pycache__.pyc': 'x'})
+        assert watcher.wait(1) == set(['bot.py'])
+
+        make_tree(root, {'lib/new/': None})
+        assert watcher.wait(1) == set(['lib/new'])
+        make_tree(root, {'lib/new/a.py': 'x'})
+        assert watcher.wait(1) == set(['lib/new/a.py'])
+    finally:
+        watcher.close()
+
+
+def test_polling_watcher_should_report_changed_package_files():
+    root = fixture_tree()
+    watcher = watch.PollingWatcher(root, interval=0.01)
+    assert watcher.wait(0.05) == set()
+    make_tree(root, {'lib/a.py': 'x', 'dist/bot.tgz': 'x'})
+    os.remove(os.path.join(root, 'bot.py'))
+    assert watcher.wait(1) == set(['lib/a.py', 'bot.py'])
+
+
+class FakeWatcher(object):
+    def __init__(self, bursts):
+        self.bursts = list(bursts)
+        self.waits = []
+
+    def wait(self, timeout=None):
+        self.waits.append(timeout)
+        return self.bursts.pop(0) if self.bursts else set()
+
+
+def test_watch_changes_should_debounce_bursts():
+    watcher = FakeWatcher([set(['a.py']), set(['b.py']), set(), set(['c.py']), set()])
+    stop = threading.Event()
+    seen = []
+
+    def on_change(changes):
+        seen.append(changes)
+        if len(seen) == 2:
+            stop.set()
+
+    watch.watch_changes(watcher, on_change, debounce=0.3, stop=stop)
+    assert seen == [set(['a.py', 'b.py']), set(['c.py'])]
+    assert watcher.waits[:3] == [watch.WAIT_SLICE, 0.3, 0.3]
+
+
+def test_deploy_queue_should_coalesce_requests_while_deploying():
+    started = threading.Event()
+    release = threading.Event()
+    deploys = []
+
+    def deploy():
+        deploys.append(time.time())
+        started.set()
+        release.wait(1)
+
+    queue = watch.DeployQueue(deploy)
+    try:
+        queue.request()
+        assert started.wait(1)
+        for _ in range(5):
+            queue.request()
+        release.set()
+        assert queue.wait_idle(2)
+        assert len(deploys) == 2
+    finally:
+        queue.close(1)
+
+
+def test_deploy_queue_should_keep_running_after_errors():
+    errors = []
+    calls = []
+
+    def deploy():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ValueError('broken')
+
+    queue = watch.DeployQueue(deploy, on_error=errors.append)
+    try:
+        queue.request()
+        assert queue.wait_idle(1)
+        queue.request()
+        assert queue.wait_idle(1)
+        assert len(calls) == 2
+        assert [str(error) for error in errors] == ['broken']
+    finally:
+        queue.close(1)
+
+
+def test_deploy_queue_close_should_give_up_on_a_long_deploy():
+    started = threading.Event()
+    release = threading.Event()
+
+    def deploy():
+        started.set()
+        release.wait(2)
+
+    queue = watch.DeployQueue(deploy)
+    queue.request()
+    assert started.wait(1)
+    assert not queue.close(0.05)
+    release.set()
+    assert queue.close(1)
@@ -2,6 +2,26 @@
 
 from __future__ import (absolute_import, division, print_function, unicode_literals)
 
+import os
+
+from bothub_cli import exceptions as exc
+
+
+def make_tree(root, files):
+    '''Write files, a dict of "/"-separated paths to bytes or text, under root
+    and return root. A path ending with "/" makes an empty dir.'''
+    if not os.path.isdir(root):
+        os.makedirs(root)
+    for path, content in files.items():
+        file_path = os.path.join(root, *path.rstrip('/').split('/'))
+        dir_path = file_path if path.endswith('/') else os.path.dirname(file_path)
+        if not os.path.isdir(dir_path):
+            os.makedirs(dir_path)
+        if not path.endswith('/'):
+            with open(file_path, 'wb') as fout:
+                fout.write(content if isinstance(content, bytes) else content.encode('utf8'))
+    return root
+
 
 class MockTransport(object):
     def __init__(self):
@@ -29,9 +49,10 @@ class MockTransport(object):
 
 
 class MockResponse(object):
-    def __init__(self, body, status_code=200):
+    def __init__(self, body, status_code=200, headers=None):
         self.body = body
         self.status_code = status_code
+        self.headers = headers or {}
 
     def json(self):
         return self.body
@@ -49,18 +70,32 @@ class MockApi(object):
     def load_auth(self, config):
         pass
 
+    def reserve_connections(self, count):
+        pass
+
     def list_projects(self):
         self.executed.append(('list_project', ))
         return self.responses.pop(0)
 
     def delete_project(self, name):
         self.executed.append(('delete_project', name))
-        return self.responses.pop(0)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
 
     def upload_code(self, project_id, language, dist_file, dependency):
         self.executed.append(('upload_code', project_id, language, dist_file.read(), dependency))
         return self.responses.pop(0)
 
+    def get_missing_blobs(self, project_id, digests):
+        # stands for a server without incremental deploys
+        raise exc.NotFound('Resource not found')
+
+    def watch_project_status(self, project_id, timeout=None):
+        # stands for a server without status streams
+        raise exc.NotFound('Resource not found')
+
     def get_code(self, project_id):
         self.executed.append(('get_code', project_id))
         return self.responses.pop(0)